@@ -1,19 +1,31 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, Response, stream_with_context
 import os
 from dotenv import load_dotenv
-from utils.embeddings import get_embedding
-from utils.pinecone_helper import get_new_index
+from utils.embeddings import get_embedding, embedding_cache
+from utils.vector_backend import get_vector_index, warm_vector_indexes, PROD_INDEX_NAME, VECTOR_BACKEND
 from utils.conversation_manager import ConversationManager
+from utils.turn_pipeline import build_chat_pipeline
+from utils.exchange_queue import ExchangeUpdateQueue
+from utils.response_stream import ResponseStreamFilter, ndjson_event
+from utils.context_provider import get_contextual_info, context_provider
+from utils.response_cache import SemanticResponseCache, catalog_version
+from utils.state_store import ConversationStore, make_state_store
+from utils.write_behind import WriteBehindQueue
+from utils.menu_catalog import MenuCatalog
+from utils.catalog import get_catalog, id_field, listing_lines, MENU_SCHEMA, PROD_SCHEMA
+from utils.attribute_index import AttributeFilter
+from utils.prompt_builder import PromptBuilder
+from utils.local_analyzer import get_local_analyzer
+from utils.lexical_index import HybridRetriever
 import google.generativeai as genai
 import time
 import re
 from datetime import timedelta, datetime
 import json
 from functools import wraps
-from models import db, User, Conversation, Message
+from models import db, User, UserStats, write_chat_turns, query_user_stats, query_history_page, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
 from flask_migrate import Migrate
-import requests
-import pytz
+import atexit
 
 # Load environment variables
 load_dotenv()
@@ -38,14 +50,116 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 migrate = Migrate(app, db)
 
-# Store conversation managers in memory
-conversation_managers = {}
+# Conversation state lives in a shared store (CONVERSATION_STORE) behind a per-worker hot cache
+conversation_store = ConversationStore(
+    make_state_store(),
+    factory=ConversationManager,
+    loader=ConversationManager.from_dict,
+    max_hot=int(os.getenv("CONVERSATION_HOT_SIZE", "256")),
+    idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))
+)
+
+# Post-response learning (preference/state updates) runs in the background, in order per user
+exchange_queue = ExchangeUpdateQueue()
+EXCHANGE_WAIT_TIMEOUT = 15  # seconds a turn waits for the previous turn's updates
+atexit.register(exchange_queue.shutdown)
+
+# Menu catalog, loaded once per worker (before the fork when preloaded) with precompressed bodies
+menu_catalog = MenuCatalog()
+menu_catalog.get()
+# Normalized food records behind every prompt's food lines, plus their BM25 indexes
+food_catalog = get_catalog()
+
+# Vector results are fused with lexical matches: /chat queries the menu index, /recommend the prod feed
+chat_retriever = HybridRetriever(food_catalog, MENU_SCHEMA)
+recommend_retriever = HybridRetriever(food_catalog, PROD_SCHEMA)
+MENU_MAX_AGE = int(os.getenv("MENU_MAX_AGE", "300"))
+# Longest chat message accepted; the message always goes into the prompt whole
+MAX_MESSAGE_CHARS = int(os.getenv("MAX_MESSAGE_CHARS", "2000"))
+
+# Chat turn rows are written in the request (sync) or batched by a background writer (write_behind)
+CHAT_WRITE_MODE = os.getenv("CHAT_WRITE_MODE", "sync").lower()
+
+def write_chat_turns_in_context(turns):
+    with app.app_context():
+        write_chat_turns(turns)
+
+turn_writer = WriteBehindQueue(
+    write_chat_turns_in_context,
+    max_size=int(os.getenv("WRITE_BEHIND_MAX_SIZE", "1000")),
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+)
+atexit.register(turn_writer.shutdown)
+
+def record_chat_turn(turn_record):
+    if CHAT_WRITE_MODE == 'write_behind':
+        if not turn_writer.submit(turn_record):
+            print("Write-behind queue full or closed, wrote turn inline:", turn_writer.get_stats())
+    else:
+        write_chat_turns([turn_record])
+
+def record_unanswered_turn(turn):
+    """Store the user's message for a turn whose response could not be generated"""
+    if turn is None or turn.get('recorded'):
+        return
+    try:
+        record_chat_turn({
+            'user_id': turn['user'].id,
+            'started_at': turn['started_at'],
+            'user_message': turn['user_input'],
+            'bot_message': None,
+            'bot_timestamp': None,
+            'recommended_foods': []
+        })
+        turn['recorded'] = True
+    except Exception as e:
+        print(f"Error storing unanswered turn: {str(e)}")
+
+# Stateless /recommend responses, reused for repeated or near-identical prompts
+recommend_cache = SemanticResponseCache(
+    max_entries=int(os.getenv("RECOMMEND_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RECOMMEND_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("RECOMMEND_CACHE_SIMILARITY", "0.95"))
+)
 
 def get_conversation_manager(username):
     """Get or create a conversation manager for a user"""
-    if username not in conversation_managers:
-        conversation_managers[username] = ConversationManager()
-    return conversation_managers[username]
+    return conversation_store.get(username)
+
+def apply_exchange(username, conversation_manager, user_input, response, foods):
+    """Learn from a finished turn and persist the resulting state for every worker"""
+    conversation_store.update(
+        username, conversation_manager,
+        lambda manager: manager.add_exchange(user_input, response, foods)
+    )
+
+def history_page_args():
+    """Parse ?cursor=&limit= into (cursor, limit), raising ValueError on bad input"""
+    cursor = request.args.get('cursor')
+    limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return (int(cursor) if cursor else None), min(limit, HISTORY_MAX_PAGE_SIZE)
+
+def user_history_response(user):
+    """JSON page of a user's history plus their dashboard counters"""
+    try:
+        cursor, limit = history_page_args()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid cursor or limit'}), 400
+    conversations, next_cursor = query_history_page(user.id, cursor, limit)
+    stats = db.session.get(UserStats, user.id)
+    return jsonify({
+        'success': True,
+        'data': {
+            'login_time': user.login_time.isoformat(),
+            'conversation_count': stats.conversation_count if stats else 0,
+            'total_recommendations': stats.recommendation_count if stats else 0,
+            'conversations': conversations,
+            'next_cursor': next_cursor
+        }
+    })
 
 def admin_required(f):
     @wraps(f)
@@ -77,50 +191,58 @@ def admin_logout():
 @app.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    users = User.query.all()
     users_info = {}
-    for user in users:
-        conversations = Conversation.query.filter_by(user_id=user.id).all()
-        total_recommendations = 0
-        for conv in conversations:
-            messages = Message.query.filter_by(conversation_id=conv.id, sender='bot').all()
-            for msg in messages:
-                if msg.recommended_foods:
-                    total_recommendations += len(msg.recommended_foods)
-        users_info[user.username] = {
-            'login_time': user.login_time.isoformat(),
-            'conversation_count': len(conversations),
-            'total_recommendations': total_recommendations
+    for row in query_user_stats():
+        users_info[row.username] = {
+            'login_time': row.login_time.isoformat(),
+            'conversation_count': row.conversation_count,
+            'total_recommendations': row.recommendation_count,
+            'last_activity': row.last_activity.isoformat() if row.last_activity else None
         }
     return render_template('admin_dashboard.html', users=users_info)
 
+@app.route('/admin/refresh_indexes', methods=['POST'])
+@admin_required
+def admin_refresh_indexes():
+    """Drop cached index handles so they are re-resolved on the control plane"""
+    if VECTOR_BACKEND != 'local':
+        from utils.pinecone_helper import index_registry
+        index_registry.refresh()
+    warm_vector_indexes()
+    return jsonify({'success': True})
+
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    """This worker's cache and queue counters"""
+    return jsonify({
+        'pid': os.getpid(),
+        'chat_write_mode': CHAT_WRITE_MODE,
+        'write_behind': turn_writer.get_stats(),
+        'exchange_queue': dict(exchange_queue.stats, pending=exchange_queue.pending_count()),
+        'conversation_store': conversation_store.get_stats(),
+        'embedding_cache': embedding_cache.get_stats(),
+        'recommend_cache': recommend_cache.get_stats(),
+        'context': context_provider.get_stats(),
+        'local_analyzer': get_local_analyzer().get_stats()
+    })
+
 @app.route('/admin/user/<username>')
 @admin_required
 def admin_user_details(username):
     user = User.query.filter_by(username=username).first()
     if not user:
         return redirect(url_for('admin_dashboard'))
-    conversations = Conversation.query.filter_by(user_id=user.id).all()
-    user_data = {
-        'login_time': user.login_time.isoformat(),
-        'conversations': []
-    }
-    for conv in conversations:
-        messages = Message.query.filter_by(conversation_id=conv.id).all()
-        for i in range(0, len(messages), 2):
-            user_msg = messages[i]
-            bot_msg = messages[i+1] if i+1 < len(messages) else None
-            recommended_foods = []
-            if bot_msg and bot_msg.recommended_foods is not None:
-                recommended_foods = bot_msg.recommended_foods
-            user_data['conversations'].append({
-                'timestamp': user_msg.timestamp.isoformat(),
-                'user_input': user_msg.content,
-                'ai_response': bot_msg.content if bot_msg else '',
-                'recommended_foods': recommended_foods,
-                'is_followup': False
-            })
-    return render_template('admin_user_details.html', username=username, user_data=user_data)
+    # Conversations are fetched page by page from admin_user_history as the admin scrolls
+    return render_template('admin_user_details.html', username=username)
+
+@app.route('/admin/user/<username>/history')
+@admin_required
+def admin_user_history(username):
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        return jsonify({'success': False, 'error': 'No data found for user'}), 404
+    return user_history_response(user)
 
 @app.route('/')
 def home():
@@ -156,297 +278,275 @@ def login():
 def logout():
     try:
         username = session.get('username')
-        if username in conversation_managers:
-            del conversation_managers[username]
+        if username:
+            exchange_queue.wait_for(username, timeout=EXCHANGE_WAIT_TIMEOUT)
+            conversation_store.discard(username)
         session.clear()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def get_contextual_info():
-    """Get weather, time, and holiday information"""
-    context = {}
-    
-    # Get current time
-    ist = pytz.timezone('Asia/Kolkata')
-    current_time = datetime.now(ist)
-    context['time'] = {
-        'hour': current_time.hour,
-        'day': current_time.strftime('%A'),
-        'date': current_time.strftime('%Y-%m-%d')
-    }
-    
-    # Get weather
-    weather_api_key = os.getenv("WEATHER_API_KEY")
-    if weather_api_key:
-        try:
-            response = requests.get(
-                "http://api.openweathermap.org/data/2.5/weather",
-                params={
-                    'q': 'Hyderabad,IN',
-                    'appid': weather_api_key,
-                    'units': 'metric'
-                }
-            )
-            if response.status_code == 200:
-                weather_data = response.json()
-                context['weather'] = {
-                    'temperature': weather_data['main']['temp'],
-                    'description': weather_data['weather'][0]['description'],
-                    'humidity': weather_data['main']['humidity']
-                }
-        except Exception as e:
-            print(f"Warning: Could not fetch weather data: {str(e)}")
-    
-    # Get holidays
-    holiday_api_key = os.getenv("HOLIDAY_API_KEY")
-    if holiday_api_key:
-        try:
-            response = requests.get(
-                "https://calendarific.com/api/v2/holidays",
-                params={
-                    'api_key': holiday_api_key,
-                    'country': 'IN',
-                    'year': current_time.year,
-                    'month': current_time.month
-                }
-            )
-            if response.status_code == 200:
-                holiday_data = response.json()
-                holidays = holiday_data.get('response', {}).get('holidays', [])
-                context['holidays'] = [
-                    {
-                        'name': holiday['name'],
-                        'date': holiday['date']['iso']
-                    }
-                    for holiday in holidays
-                ]
-        except Exception as e:
-            print(f"Warning: Could not fetch holiday data: {str(e)}")
-    
-    return context
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    try:
-        username = session.get('username')
-        if not username:
-            return jsonify({'success': False, 'error': 'User not logged in'}), 401
-
-        data = request.json
-        user_input = data['message']
-        chat_history = data.get('history', [])
-        use_weather_time = data.get('use_weather_time', False)
-
-        # Get user
-        user = User.query.filter_by(username=username).first()
-        if not user:
-            return jsonify({'success': False, 'error': 'User not found'}), 404
+CHAT_ERROR_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Could you please try again?"
 
-        # Get conversation manager for the user
-        conversation_manager = get_conversation_manager(username)
-
-        # Get contextual information if toggle is on
-        context = get_contextual_info() if use_weather_time else None
-
-        # Analyze intent before processing
-        try:
-            intent_analysis = conversation_manager.analyze_user_intent(user_input)
-        except Exception as e:
-            print(f"Error analyzing intent: {str(e)}")
-            # Provide a default intent analysis if there's an error
-            intent_analysis = {
-                'is_followup': False,
-                'followup_type': None,
-                'intent': 'general_query',
-                'context_references': [],
-                'referenced_items': []
-            }
-        
-        # Create a new conversation for each chat
-        conversation = Conversation(user_id=user.id)
-        db.session.add(conversation)
-        db.session.commit()
-
-        # Store user message
-        user_message = Message(
-            conversation_id=conversation.id,
-            sender='user',
-            content=user_input
-        )
-        db.session.add(user_message)
-        db.session.commit()
+def chat_error_payload(conversation_state=None):
+    return {
+        'response': CHAT_ERROR_RESPONSE,
+        'foods': [],
+        'is_followup': False,
+        'followup_type': None,
+        'intent': 'error',
+        'context_references': [],
+        'referenced_items': [],
+        'conversation_state': conversation_state if conversation_state is not None else {},
+        'context': None
+    }
 
-        # Embed the user input
-        query_embedding = get_embedding(user_input)
+def start_chat_turn():
+    """Validate a chat request; returns (turn, None) or (None, error response)"""
+    username = session.get('username')
+    if not username:
+        return None, (jsonify({'success': False, 'error': 'User not logged in'}), 401)
 
-        # Query Pinecone with context-aware search
-        index = get_new_index()
-        
-        # If it's a follow-up, include context in the search
-        if intent_analysis['is_followup']:
-            try:
-                # Add context from conversation state to the search
-                context_terms = []
-                
-                # Add last recommendations to context if this is a follow-up about specific items
-                if intent_analysis['followup_type'] in ['clarification', 'modification', 'comparison']:
-                    last_foods = conversation_manager.conversation_state.get('last_recommendations', [])
-                    if last_foods:
-                        context_terms.extend([food['name'] for food in last_foods])
-                
-                # Add other context terms
-                if conversation_manager.conversation_state.get('last_meal_type'):
-                    context_terms.append(conversation_manager.conversation_state['last_meal_type'])
-                if conversation_manager.conversation_state.get('last_dietary'):
-                    context_terms.append(conversation_manager.conversation_state['last_dietary'])
-                if conversation_manager.conversation_state.get('last_price_range'):
-                    context_terms.append(conversation_manager.conversation_state['last_price_range'])
-                if conversation_manager.conversation_state.get('last_cuisine'):
-                    context_terms.append(conversation_manager.conversation_state['last_cuisine'])
-                
-                # Add referenced items from intent analysis
-                if intent_analysis.get('referenced_items'):
-                    context_terms.extend(intent_analysis['referenced_items'])
-                
-                # Combine user input with context
-                enhanced_query = f"{user_input} {' '.join(context_terms)}"
-                query_embedding = get_embedding(enhanced_query)
-            except Exception as e:
-                print(f"Error updating preferences: {str(e)}")
-                # Continue with original query if context update fails
-                pass
-        
-        try:
-            # Increase top_k to get more potential matches
-            results = index.query(vector=query_embedding, top_k=20, include_metadata=True)
-            matches = results['matches']
-            retrieved_foods = [match['metadata'] for match in matches]
-            
-            # Ensure diversity in recommendations
-            diverse_foods = conversation_manager._enforce_recommendation_diversity(retrieved_foods)
-        except Exception as e:
-            print(f"Error querying Pinecone: {str(e)}")
-            retrieved_foods = []
-            diverse_foods = []
+    data = request.json
+    user_input = data['message']
+    use_weather_time = data.get('use_weather_time', False)
+    if len(user_input) > MAX_MESSAGE_CHARS:
+        return None, (jsonify({'success': False, 'error': f'Message is too long (max {MAX_MESSAGE_CHARS} characters)'}), 400)
 
-        # Generate contextual prompt using AI-driven conversation manager
+    # Get user
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        return None, (jsonify({'success': False, 'error': 'User not found'}), 404)
+
+    return {
+        'username': username,
+        'user': user,
+        'user_input': user_input,
+        # The turn's rows are written together once the response is ready
+        'started_at': datetime.utcnow(),
+        'use_weather_time': use_weather_time,
+        # Get conversation manager for the user
+        'conversation_manager': get_conversation_manager(username)
+    }, None
+
+def chat_candidates(conversation_manager, user_input):
+    """Menu ids matching this turn's constraints, or None to search the whole menu.
+
+    The current message is read with the rule-based analyzer, so the filter
+    is ready before the model's intent analysis; earlier turns' constraints
+    apply only when the analyzer reads the message as a follow-up.
+    """
+    analysis = conversation_manager.local_analysis(user_input)
+    attribute_filter = AttributeFilter.for_turn(analysis['context'], analysis['preferences'],
+                                                conversation_manager.user_preferences,
+                                                conversation_manager.conversation_state,
+                                                analysis['intent']['is_followup'])
+    if attribute_filter.is_empty():
+        return None
+    bitmap, applied = food_catalog.candidates(attribute_filter, MENU_SCHEMA)
+    if not bitmap:
+        print(f"Warning: no menu items satisfy {attribute_filter.describe()}, searching unfiltered")
+        return None
+    candidates = set(food_catalog.ids_in(bitmap))
+    print(f"Attribute filter {applied}: {len(candidates)} candidates")
+    return candidates
+
+def prepare_chat_turn(turn):
+    """Store the user message, run retrieval and build the generation prompt for a chat turn"""
+    username = turn['username']
+    user_input = turn['user_input']
+    use_weather_time = turn['use_weather_time']
+
+    # Pick up the state learned from this user's previous turn: wait for this worker's pending
+    # update, then re-read the store, which reloads if another worker saved a newer version
+    if not exchange_queue.wait_for(username, timeout=EXCHANGE_WAIT_TIMEOUT):
+        print(f"Warning: previous exchange update for {username} still pending, using current state")
+    conversation_manager = turn['conversation_manager'] = get_conversation_manager(username)
+
+    # Run intent analysis, retrieval and contextual info concurrently
+    pipeline = build_chat_pipeline(
+        conversation_manager,
+        user_input,
+        embed=get_embedding,
+        get_index=get_vector_index,
+        get_context=get_contextual_info if use_weather_time else None,
+        fuse=chat_retriever.fuse,
+        get_candidates=lambda: chat_candidates(conversation_manager, user_input),
+        id_key=id_field(MENU_SCHEMA)
+    )
+    stages = pipeline.run()
+    context = stages['context']
+    retrieved_foods = stages['retrieved_foods']
+    print("Turn stage timings:", {name: round(seconds, 3) for name, seconds in pipeline.timings.items()})
+    print("Embedding cache stats:", embedding_cache.get_stats())
+    print("Hybrid retrieval stats:", chat_retriever.get_stats())
+    if use_weather_time:
+        print("Context cache stats:", context_provider.get_stats())
+
+    # Generate contextual prompt sections using AI-driven conversation manager
+    try:
+        builder = conversation_manager.build_contextual_prompt(user_input, retrieved_foods)
+    except Exception as e:
+        print(f"Error generating prompt: {str(e)}")
+        builder = PromptBuilder()
+        builder.add_text('query', f"User query: {user_input}", required=True)
+        builder.add_blocks('candidates', listing_lines(retrieved_foods), header="Available foods:")
+        builder.add_text('instructions', "Please provide a helpful response about these food options.")
+    print("Turn cache stats:", conversation_manager.get_cache_stats())
+    print(f"Analyzer stats ({conversation_manager.analyzer_mode}):", conversation_manager.analyzer_stats)
+    print("Local analyzer stats:", get_local_analyzer().get_stats())
+    
+    # Add contextual information to the prompt if toggle is on
+    if use_weather_time and context:
         try:
-            prompt = conversation_manager.generate_contextual_prompt(user_input, retrieved_foods)
-        except Exception as e:
-            print(f"Error generating prompt: {str(e)}")
-            prompt = f"User query: {user_input}\n\nAvailable foods:\n{format_foods_for_prompt(retrieved_foods)}\n\nPlease provide a helpful response about these food options."
-        
-        # Add contextual information to the prompt if toggle is on
-        if use_weather_time and context:
-            try:
-                context_text = f"""
-Current Time: {context['time']['hour']}:00 on {context['time']['day']}, {context['time']['date']}
-"""
-                if 'weather' in context:
-                    context_text += f"""
+            context_text = f"""Current Time: {context['time']['hour']}:00 on {context['time']['day']}, {context['time']['date']}"""
+            if 'weather' in context:
+                context_text += f"""
 Current Weather: {context['weather']['temperature']}°C, {context['weather']['description']}
-Humidity: {context['weather']['humidity']}%
-"""
-                if 'holidays' in context:
-                    context_text += "\nUpcoming Holidays:\n" + "\n".join([
-                        f"- {holiday['name']} ({holiday['date']})"
-                        for holiday in context['holidays']
-                    ])
-
-                prompt = f"""
-Current Context:
-{context_text}
-
-{prompt}
-
-Based on the user's mood, current time, weather conditions, and any upcoming holidays, suggest the best option(s) in a friendly and intelligent way. Consider:
+Humidity: {context['weather']['humidity']}%"""
+            if 'holidays' in context:
+                context_text += "\n\nUpcoming Holidays:\n" + "\n".join([
+                    f"- {holiday['name']} ({holiday['date']})"
+                    for holiday in context['holidays']
+                ])
+
+            builder.add_text('context', f"Current Context:\n{context_text}", position=0)
+            builder.add_text('instructions', """Based on the user's mood, current time, weather conditions, and any upcoming holidays, suggest the best option(s) in a friendly and intelligent way. Consider:
 1. Time of day (breakfast, lunch, dinner, snack)
 2. Weather conditions (hot, cold, rainy)
 3. Any special occasions or holidays
 4. User's mood and preferences
 
-Your recommendation:
-"""
-            except Exception as e:
-                print(f"Error adding context: {str(e)}")
-                # Continue without context if there's an error
-                pass
+Your recommendation:""")
+        except Exception as e:
+            print(f"Error adding context: {str(e)}")
+            # Continue without context if there's an error
+            pass
+
+    prompt = builder.build()
+    print("Prompt tokens:", builder.get_stats())
+
+    turn.update({
+        'intent_analysis': stages['intent'],
+        'context': context,
+        'retrieved_foods': retrieved_foods,
+        'prompt': prompt
+    })
+    return turn
+
+def finish_chat_turn(turn, response_text):
+    """Parse the generated text, store the bot message and queue the exchange update"""
+    username = turn['username']
+    user_input = turn['user_input']
+    conversation_manager = turn['conversation_manager']
+    intent_analysis = turn['intent_analysis']
+    retrieved_foods = turn['retrieved_foods']
+
+    # Clean response and extract recommended food IDs
+    cleaned_response, recommended_food_ids = parse_response_and_recommendations(response_text)
+
+    # Filter retrieved foods based on recommendations
+    filtered_foods = [
+        food for food in retrieved_foods 
+        if str(food.get('id', '')) in recommended_food_ids
+    ] if recommended_food_ids else []
+
+    # Store the conversation, both messages and the stats update in one transaction
+    record_chat_turn({
+        'user_id': turn['user'].id,
+        'started_at': turn['started_at'],
+        'user_message': user_input,
+        'bot_message': cleaned_response,
+        'bot_timestamp': datetime.utcnow(),
+        'recommended_foods': filtered_foods
+    })
+    turn['recorded'] = True
+
+    # Update conversation manager with the exchange off the request path
+    exchange_queue.submit(username, apply_exchange, username, conversation_manager, user_input, cleaned_response, filtered_foods)
+
+    return {
+        'response': cleaned_response,
+        'foods': filtered_foods,
+        'is_followup': intent_analysis['is_followup'],
+        'followup_type': intent_analysis['followup_type'],
+        'intent': intent_analysis['intent'],
+        'context_references': intent_analysis['context_references'],
+        'referenced_items': intent_analysis.get('referenced_items', []),
+        'conversation_state': conversation_manager.conversation_state,
+        'context': turn['context'] if turn['use_weather_time'] else None
+    }
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    turn = None
+    try:
+        turn, error = start_chat_turn()
+        if error:
+            return error
+        prepare_chat_turn(turn)
 
         # Generate with Gemini
         try:
             model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(prompt)
-            
-            # Clean response and extract recommended food IDs
-            cleaned_response, recommended_food_ids = parse_response_and_recommendations(response.text)
-
-            # Filter retrieved foods based on recommendations
-            filtered_foods = [
-                food for food in retrieved_foods 
-                if str(food.get('id', '')) in recommended_food_ids
-            ] if recommended_food_ids else []
-
-            # Store bot message
-            bot_message = Message(
-                conversation_id=conversation.id,
-                sender='bot',
-                content=cleaned_response,
-                recommended_foods=filtered_foods
-            )
-            db.session.add(bot_message)
-            db.session.commit()
-
-            # Update conversation manager with the exchange
-            try:
-                conversation_manager.add_exchange(user_input, cleaned_response, filtered_foods)
-            except Exception as e:
-                print(f"Error updating conversation manager: {str(e)}")
-                # Continue even if conversation manager update fails
-                pass
+            response = model.generate_content(turn['prompt'])
 
             # Return the successful response
-            return jsonify({
-                'response': cleaned_response,
-                'foods': filtered_foods,
-                'is_followup': intent_analysis['is_followup'],
-                'followup_type': intent_analysis['followup_type'],
-                'intent': intent_analysis['intent'],
-                'context_references': intent_analysis['context_references'],
-                'referenced_items': intent_analysis.get('referenced_items', []),
-                'conversation_state': conversation_manager.conversation_state,
-                'context': context if use_weather_time else None
-            })
+            return jsonify(finish_chat_turn(turn, response.text))
 
         except Exception as e:
             print(f"Error generating response: {str(e)}")
+            record_unanswered_turn(turn)
             # Return a single error response
-            return jsonify({
-                'response': "I apologize, but I'm having trouble processing your request right now. Could you please try again?",
-                'foods': [],
-                'is_followup': False,
-                'followup_type': None,
-                'intent': 'error',
-                'context_references': [],
-                'referenced_items': [],
-                'conversation_state': conversation_manager.conversation_state,
-                'context': None
-            })
+            return jsonify(chat_error_payload(turn['conversation_manager'].conversation_state))
 
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
+        record_unanswered_turn(turn)
         # Return a single error response
-        return jsonify({
-            'response': "I apologize, but I'm having trouble processing your request right now. Could you please try again?",
-            'foods': [],
-            'is_followup': False,
-            'followup_type': None,
-            'intent': 'error',
-            'context_references': [],
-            'referenced_items': [],
-            'conversation_state': {},
-            'context': None
-        }), 500
+        return jsonify(chat_error_payload()), 500
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming /chat: NDJSON events with text deltas, then a final event carrying the foods"""
+    try:
+        turn, error = start_chat_turn()
+        if error:
+            return error
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {str(e)}")
+        return jsonify(chat_error_payload()), 500
+
+    def generate():
+        # Flush an event straight away so the client sees the first byte before retrieval runs
+        yield ndjson_event('start')
+        try:
+            prepare_chat_turn(turn)
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            record_unanswered_turn(turn)
+            yield ndjson_event('error', **chat_error_payload())
+            return
+
+        stream_filter = ResponseStreamFilter()
+        try:
+            model = genai.GenerativeModel('gemini-2.0-flash')
+            for chunk in model.generate_content(turn['prompt'], stream=True):
+                delta = stream_filter.feed(chunk.text)
+                if delta:
+                    yield ndjson_event('token', text=delta)
+            yield ndjson_event('done', **finish_chat_turn(turn, stream_filter.raw))
+        except Exception as e:
+            print(f"Error generating response: {str(e)}")
+            record_unanswered_turn(turn)
+            yield ndjson_event('error', **chat_error_payload(turn['conversation_manager'].conversation_state))
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/user_data', methods=['GET'])
 def get_user_data():
@@ -459,34 +559,7 @@ def get_user_data():
         if not user:
             return jsonify({'success': False, 'error': 'No data found for user'}), 404
 
-        conversations = Conversation.query.filter_by(user_id=user.id).order_by(Conversation.id.desc()).all()
-        data = []
-        
-        for conv in conversations:
-            messages = Message.query.filter_by(conversation_id=conv.id).order_by(Message.id).all()
-            
-            # Process messages in pairs (user message followed by bot response)
-            for i in range(0, len(messages), 2):
-                if i + 1 < len(messages):  # Ensure we have both user and bot messages
-                    user_msg = messages[i]
-                    bot_msg = messages[i + 1]
-                    
-                    conversation_data = {
-                        'timestamp': user_msg.timestamp.isoformat(),
-                        'user_input': user_msg.content,
-                        'ai_response': bot_msg.content,
-                        'recommended_foods': bot_msg.recommended_foods if bot_msg.recommended_foods else [],
-                        'is_followup': False  # You can implement followup detection logic here if needed
-                    }
-                    data.append(conversation_data)
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'login_time': user.login_time.isoformat(),
-                'conversations': data
-            }
-        })
+        return user_history_response(user)
     except Exception as e:
         print(f"Error in get_user_data: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -494,13 +567,11 @@ def get_user_data():
 @app.route('/all_users', methods=['GET'])
 def get_all_users():
     try:
-        users = User.query.all()
         users_info = {}
-        for user in users:
-            conversations = Conversation.query.filter_by(user_id=user.id).all()
-            users_info[user.username] = {
-                'login_time': user.login_time.isoformat(),
-                'conversation_count': len(conversations)
+        for row in query_user_stats():
+            users_info[row.username] = {
+                'login_time': row.login_time.isoformat(),
+                'conversation_count': row.conversation_count
             }
         return jsonify({
             'success': True,
@@ -509,20 +580,6 @@ def get_all_users():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def format_foods_for_prompt(foods):
-    formatted_foods = []
-    for food in foods:
-        # Use the correct keys from Pinecone data
-        food_id = food.get('Id', 'N/A')
-        name = food.get('ProductName', '')
-        image = food.get('Image', '')
-        description = food.get('Description', '')
-        price = food.get('Price', '')
-        formatted_foods.append(
-            f"[ID:{food_id}] {name} - {description} - {image} - {price}"
-        )
-    return "\n".join(formatted_foods)
-
 def parse_response_and_recommendations(text):
     """Extract the response and recommended food IDs"""
     # First, remove any visible food IDs from the response
@@ -571,29 +628,30 @@ def menu():
     if not session.get('username'):
         return redirect(url_for('home'))
     
-    # Load food items from JSON file
-    try:
-        json_path = os.path.join(os.path.dirname(__file__), 'data', 'niloufer.json')
-        with open(json_path, 'r', encoding='utf-8') as file:
-            menu_items = json.load(file)
-    except Exception as e:
-        print(f"Error loading menu items: {str(e)}")
-        menu_items = []
-    
-    return render_template('menu.html', menu_items=menu_items)
+    # The page fetches the catalog from /menu-data, where the browser can cache it
+    return render_template('menu.html')
 
 @app.route('/menu-data')
 def menu_data():
     if not session.get('username'):
         return jsonify({'error': 'Not authorized'}), 401
-    
-    try:
-        json_path = os.path.join(os.path.dirname(__file__), 'data', 'niloufer.json')
-        with open(json_path, 'r', encoding='utf-8') as file:
-            menu_items = json.load(file)
-        return jsonify(menu_items)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+
+    # The catalog is the same for every signed-in visitor; browsers may cache it, shared caches may not
+    snapshot = menu_catalog.get()
+    if snapshot is None:
+        return jsonify({'error': 'Menu is unavailable'}), 503
+
+    encoding, body, etag = snapshot.representation(request.accept_encodings)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={MENU_MAX_AGE}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/reset_chat', methods=['POST'])
 def reset_chat():
@@ -603,8 +661,8 @@ def reset_chat():
             return jsonify({'success': False, 'error': 'User not logged in'}), 401
 
         # Clear the conversation manager for this user
-        if username in conversation_managers:
-            del conversation_managers[username]
+        exchange_queue.wait_for(username, timeout=EXCHANGE_WAIT_TIMEOUT)
+        conversation_store.discard(username)
         
         # Create a new conversation manager
         get_conversation_manager(username)
@@ -622,44 +680,43 @@ def api_recommend():
         if not prompt:
             return jsonify({'error': 'No prompt provided'}), 400
 
-        # Use a stateless ConversationManager for API calls
-        conversation_manager = ConversationManager()
+        # Repeated kiosk prompts are answered from the cache, first exact then by similarity
+        version = catalog_version(PROD_INDEX_NAME)
+        cached = recommend_cache.get(prompt, version)
+        if cached is not None:
+            return jsonify(cached)
 
         # Embed the prompt
         query_embedding = get_embedding(prompt)
 
-        # Use the 'niloufer-prod-data' Pinecone index
-        from utils.pinecone_helper import get_new_index
-        index = get_new_index(index_name='niloufer-prod-data')
+        cached = recommend_cache.get_similar(query_embedding, version)
+        if cached is not None:
+            return jsonify(cached)
+
+        # Use a stateless ConversationManager for API calls
+        conversation_manager = ConversationManager()
+
+        # Use the 'niloufer-prod-data' index on the configured vector backend
+        index = get_vector_index(index_name=PROD_INDEX_NAME)
 
         # Query Pinecone for relevant foods
         try:
             results = index.query(vector=query_embedding, top_k=50, include_metadata=True)
             matches = results['matches']
-            retrieved_foods = [match['metadata'] for match in matches]
-            diverse_foods = conversation_manager._enforce_recommendation_diversity(retrieved_foods)
+            vector_foods = [match['metadata'] for match in matches]
         except Exception as e:
             print(f"Error querying Pinecone: {str(e)}")
-            retrieved_foods = []
-            diverse_foods = []
-
-        # Fallback: if any product name matches the prompt, ensure it is included in the foods passed to Gemini
-        prompt_lower = prompt.lower()
-        matching_foods = [food for food in retrieved_foods if food.get('ProductName', '').lower() in prompt_lower or prompt_lower in food.get('ProductName', '').lower()]
-        # Combine matching foods with the top 10, ensuring no duplicates
-        foods_for_prompt = []
-        seen_ids = set()
-        for food in matching_foods + retrieved_foods[:10]:
-            food_id = food.get('Id')
-            if food_id and food_id not in seen_ids:
-                foods_for_prompt.append(food)
-                seen_ids.add(food_id)
+            vector_foods = []
+
+        # Fuse with BM25 matches; foods named in the prompt lead the list even when the vector top-k missed them
+        retrieved_foods = recommend_retriever.fuse(prompt, vector_foods)
+
+        # Fused results are already unique with named foods first; keep the top 10 that carry an id
+        foods_for_prompt = [food for food in retrieved_foods[:10] if food.get('Id')]
 
         # Debug print: show the foods being sent to Gemini
         print("Foods for Gemini prompt:", [food.get('ProductName', '') for food in foods_for_prompt])
 
-        foods_section = f"Available foods:\n{format_foods_for_prompt(foods_for_prompt)}"
-
         # Few-shot example to help Gemini recommend using [RECOMMENDED_FOODS:...]
         example_block = (
             "Example:\n"
@@ -674,19 +731,20 @@ def api_recommend():
             "- Chilli Chicken\n\n"
             "Would you like something vegetarian or non-vegetarian?\n\n"
             "[RECOMMENDED_FOODS:12,15]\n"
-            "---\n"
+            "---"
         )
 
-        # Generate prompt for Gemini, always including the food list
+        # Generate prompt for Gemini, always including the food list (once, as id/price listings)
         try:
-            base_prompt = conversation_manager.generate_contextual_prompt(prompt, foods_for_prompt)
+            builder = conversation_manager.build_contextual_prompt(prompt, foods_for_prompt,
+                                                                   food_lines=listing_lines(foods_for_prompt))
         except Exception as e:
             print(f"Error generating prompt: {str(e)}")
-            base_prompt = f"User query: {prompt}"
-
-        prompt_text = (
-            f"{example_block}"
-            f"{base_prompt}\n\n{foods_section}\n\n"
+            builder = PromptBuilder()
+            builder.add_text('query', f"User query: {prompt}", required=True)
+            builder.add_blocks('candidates', listing_lines(foods_for_prompt), header="Available foods:")
+        builder.add_text('examples', example_block, position=0)
+        builder.add_text('instructions', (
             "IMPORTANT: You are a friendly, intelligent food suggestion bot. "
             "Always recommend 1–3 food options from the list above that are most relevant to the user's prompt. "
             "If the user's query is unclear, make your best guess and still recommend food options. "
@@ -694,7 +752,9 @@ def api_recommend():
             "At the end of your response, include a line in the format [RECOMMENDED_FOODS:id1,id2,...] "
             "where id1, id2, etc. are the IDs of the foods you are recommending from the list above. "
             "If you don't want to recommend any, still include the tag as [RECOMMENDED_FOODS:]."
-        )
+        ))
+        prompt_text = builder.build()
+        print("Prompt tokens:", builder.get_stats())
 
         # Debug print: show the prompt text sent to Gemini
         print("Prompt sent to Gemini:\n", prompt_text)
@@ -713,7 +773,10 @@ def api_recommend():
                 if name and name in response_lower:
                     recommended_ids.add(food.get('Id'))
 
-            return jsonify({'response': cleaned_response, 'recommended_food_ids': list(recommended_ids)})
+            payload = {'response': cleaned_response, 'recommended_food_ids': list(recommended_ids)}
+            recommend_cache.put(prompt, query_embedding, payload, version)
+            print("Recommend cache stats:", recommend_cache.get_stats())
+            return jsonify(payload)
         except Exception as e:
             print(f"Error generating response: {str(e)}")
             return jsonify({'error': 'AI generation failed', 'details': str(e)}), 500
@@ -0,0 +1,283 @@
+# bench_fakes.py
+"""Local stand-ins for the Gemini (google.generativeai) and Pinecone clients, for load benchmarks.
+
+install() patches the real client modules in place, so the app and its
+helpers run unchanged while every model, embedding and index call sleeps for
+a latency drawn from a configurable distribution and returns canned output.
+
+Latency specs (milliseconds), set through the environment:
+    BENCH_GENAI_LATENCY     generation and JSON-analysis calls   (default lognormal:700:0.35)
+    BENCH_EMBED_LATENCY     embed_content                        (default lognormal:90:0.3)
+    BENCH_PINECONE_LATENCY  index queries                        (default lognormal:45:0.3)
+each one of "const:MS", "uniform:LOW:HIGH", "lognormal:MEDIAN:SIGMA" or "0".
+
+Every call is appended to BENCH_CALL_LOG (one "<kind>\\n" line, written
+atomically with O_APPEND), so a driver can count calls across all workers.
+
+Run the app with fakes under gunicorn:
+    gunicorn -c gunicorn.conf.py 'bench_fakes:create_app()'
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+EMBEDDING_DIMENSION = 768
+INDEX_FILES = {
+    'niloufer-menu': os.path.join(DATA_DIR, 'niloufer.json'),
+    'niloufer-prod-data': os.path.join(DATA_DIR, 'niloufer-prod-date.json'),
+}
+DEFAULT_LATENCIES = {
+    'BENCH_GENAI_LATENCY': 'lognormal:700:0.35',
+    'BENCH_EMBED_LATENCY': 'lognormal:90:0.3',
+    'BENCH_PINECONE_LATENCY': 'lognormal:45:0.3',
+}
+# Call kinds written to the call log
+CALL_KINDS = ('generate', 'stream', 'analysis', 'embed', 'query')
+
+FOLLOWUP_RE = re.compile(r"\b(more|it|that|this|them|those|first|second|cheaper|another|else|compare)\b", re.I)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def latency_sampler(spec):
+    """Seconds-returning sampler for a latency spec"""
+    kind, _, params = str(spec).partition(':')
+    values = [float(value) for value in params.split(':') if value]
+    rng = random.Random()
+    if kind == 'const':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == 'lognormal':
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    if kind in ('0', 'none', ''):
+        return lambda: 0.0
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class CallLog:
+    """Append-only record of fake calls, shared by every process that opens the same path"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def record(self, kind):
+        if not self.path:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            os.write(self._fd, f"{kind}\n".encode())
+
+    @staticmethod
+    def counts(path):
+        counts = dict.fromkeys(CALL_KINDS, 0)
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    kind = line.strip()
+                    counts[kind] = counts.get(kind, 0) + 1
+        except FileNotFoundError:
+            pass
+        return counts
+
+
+call_log = CallLog()
+_samplers = {}
+
+
+def pause(name):
+    time.sleep(max(_samplers[name](), 0.0))
+
+
+def hashed_embedding(text):
+    """Feature-hashed bag of words, so texts sharing words land near each other"""
+    vector = np.zeros(EMBEDDING_DIMENSION, dtype=np.float32)
+    for token in TOKEN_RE.findall(str(text).lower()):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], 'little') % EMBEDDING_DIMENSION
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# --- google.generativeai -------------------------------------------------
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _canned_analysis(prompt):
+    """Canned JSON for the app's analysis prompts, keyed off each prompt's wording"""
+    user_input = ''
+    match = re.search(r"(?:Current user input|User input|Text):\s*(.*)", prompt)
+    if match:
+        user_input = match.group(1)
+    followup = bool(FOLLOWUP_RE.search(user_input))
+    intent = {
+        "is_followup": followup, "followup_type": "continuation" if followup else None,
+        "context_references": [], "intent": "find food", "referenced_items": [],
+        "sentiment": "neutral", "urgency": "medium", "confidence": 0.9,
+    }
+    preferences = {"dietary_restrictions": [], "price_range": None, "meal_type": None,
+                   "cuisine_preferences": [], "spice_level": None}
+    context = {"meal_type": None, "dietary": None, "price_range": None, "cuisine": []}
+    if 'exactly these sections' in prompt:
+        return json.dumps({"intent": intent, "preferences": preferences, "context": context})
+    if 'follow-up question' in prompt:
+        return json.dumps(intent)
+    if 'food preferences' in prompt:
+        return json.dumps(preferences)
+    return json.dumps(context)
+
+
+def _canned_reply(prompt):
+    """A reply recommending the first two listed foods, with the app's id tag"""
+    listed = prompt[prompt.rfind('Available food'):]
+    foods = re.findall(r"\[ID:([^\]]+)\]\s*([^:\-\n]+)", listed)[:2]
+    names = ' and '.join(name.strip().title() for _, name in foods) or 'something from the menu'
+    text = (f"Based on what you told me, I'd go for {names}. "
+            "Both are freshly made, travel well and suit the time of day. "
+            "If you want something lighter or cheaper, just say so and I'll adjust the picks. ")
+    return text + f"\n[RECOMMENDED_FOODS:{','.join(food_id for food_id, _ in foods)}]"
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name='gemini-2.0-flash', **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        prompt = str(prompt)
+        if 'Return ONLY the JSON object' in prompt:
+            call_log.record('analysis')
+            pause('BENCH_GENAI_LATENCY')
+            return FakeResponse(_canned_analysis(prompt))
+        text = _canned_reply(prompt)
+        if not stream:
+            call_log.record('generate')
+            pause('BENCH_GENAI_LATENCY')
+            return FakeResponse(text)
+        call_log.record('stream')
+        return self._stream(text)
+
+    @staticmethod
+    def _stream(text, chunks=12):
+        # The sampled latency is spread over the chunks, so time to first token is a fraction of it
+        total = _samplers['BENCH_GENAI_LATENCY']()
+        size = max(len(text) // chunks, 1)
+        for start in range(0, len(text), size):
+            time.sleep(total / chunks)
+            yield FakeResponse(text[start:start + size])
+
+
+def fake_embed_content(model=None, content=None, task_type=None, title=None, **kwargs):
+    call_log.record('embed')
+    pause('BENCH_EMBED_LATENCY')
+    if isinstance(content, (list, tuple)):
+        return {'embedding': [hashed_embedding(text).tolist() for text in content]}
+    return {'embedding': hashed_embedding(content).tolist()}
+
+
+# --- pinecone ------------------------------------------------------------
+
+class FakeIndex:
+    """Exact search over the catalog file behind an index name, with Pinecone's query shape"""
+
+    def __init__(self, name):
+        from utils.catalog import detect_schema, search_tokens
+        self.name = name
+        with open(INDEX_FILES[name], 'r', encoding='utf-8') as f:
+            items = [{k: v for k, v in item.items() if v is not None} for item in json.load(f)]
+        self.metadata = items
+        self.ids = [str(item.get('Id', item.get('id'))) for item in items]
+        self.matrix = np.stack([
+            hashed_embedding(' '.join(search_tokens(item, detect_schema(item)))) for item in items
+        ]) if items else np.zeros((0, EMBEDDING_DIMENSION), dtype=np.float32)
+
+    def query(self, vector=None, top_k=10, include_metadata=False, filter=None, **kwargs):
+        from utils.local_index import matches_filter
+        call_log.record('query')
+        pause('BENCH_PINECONE_LATENCY')
+        scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+        if filter:
+            allowed = np.array([matches_filter(item, filter) for item in self.metadata], dtype=bool)
+            scores = np.where(allowed, scores, -np.inf)
+        order = np.argsort(-scores)[:top_k]
+        return {'matches': [
+            dict({'id': self.ids[row], 'score': float(scores[row])},
+                 **({'metadata': self.metadata[row]} if include_metadata else {}))
+            for row in order if np.isfinite(scores[row])
+        ]}
+
+    def describe_index_stats(self, **kwargs):
+        return {'dimension': EMBEDDING_DIMENSION, 'total_vector_count': len(self.ids)}
+
+
+class _IndexList(list):
+    def names(self):
+        return [index['name'] for index in self]
+
+
+class _IndexDescription:
+    def __init__(self, name):
+        self.name = name
+        self.host = f"{name}.bench.local"
+
+
+class FakePinecone:
+    _indexes = {}
+    _lock = threading.Lock()
+
+    def __init__(self, api_key=None, **kwargs):
+        pass
+
+    def list_indexes(self):
+        return _IndexList({'name': name} for name in INDEX_FILES)
+
+    def create_index(self, name, **kwargs):
+        raise ValueError(f"Benchmark index {name} is not backed by a catalog file")
+
+    def describe_index(self, name):
+        return _IndexDescription(name)
+
+    def Index(self, name=None, host=None, **kwargs):
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = FakeIndex(name)
+            return self._indexes[name]
+
+
+def install():
+    """Patch google.generativeai and pinecone with the fakes; call before importing app"""
+    import google.generativeai as genai
+    import pinecone
+
+    for name, default in DEFAULT_LATENCIES.items():
+        _samplers[name] = latency_sampler(os.getenv(name, default))
+    call_log.path = os.getenv('BENCH_CALL_LOG')
+    genai.configure = lambda *args, **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.embed_content = fake_embed_content
+    pinecone.Pinecone = FakePinecone
+    os.environ.setdefault('VECTOR_BACKEND', 'pinecone')
+    os.environ.setdefault('PINECONE_API_KEY', 'bench')
+    os.environ.setdefault('GOOGLE_API_KEY', 'bench')
+
+
+def create_app():
+    """gunicorn app factory: the real app with fake model and index clients"""
+    install()
+    from app import app
+    return app
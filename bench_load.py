@@ -0,0 +1,246 @@
+# bench_load.py
+"""Replay concurrent synthetic sessions against the app under the real gunicorn
+config, with the fake Gemini/Pinecone clients from bench_fakes, and report
+latency percentiles, throughput and model calls per turn.
+
+Each run starts gunicorn with gunicorn.conf.py (bind overridden to localhost)
+on a fresh SQLite database, conversation store and embedding cache. Chat
+sessions log in and send an opening request followed by follow-ups; kiosk
+sessions send stateless /recommend prompts.
+
+Usage:
+    python bench_load.py
+    python bench_load.py --sessions 200 --concurrency 32 --turns 5 --stream
+    python bench_load.py --mix recommend --genai-latency const:400
+    BENCH_PINECONE_LATENCY=uniform:20:120 python bench_load.py --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench_fakes import CALL_KINDS, DEFAULT_LATENCIES, CallLog
+from bench_queries import make_app
+from models import db
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+OPENERS = [
+    "something hot for a rainy evening",
+    "veg options under 200",
+    "something for breakfast",
+    "I want a light snack with tea",
+    "suggest a sweet dessert",
+    "what's good for a quick lunch",
+    "something spicy and filling for dinner",
+    "best thing to have with irani chai",
+]
+FOLLOWUPS = [
+    "tell me more about the first one",
+    "anything cheaper?",
+    "compare them",
+    "something else like that",
+    "any vegan options?",
+    "is the second one spicy?",
+]
+KIOSK_PROMPTS = [
+    "osmania biscuit",
+    "chocolate cake for a birthday",
+    "something to go with tea",
+    "cheap snacks",
+    "plum cake",
+    "fresh bread",
+    "cookies for kids",
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Recorder:
+    """Latency samples per endpoint, from every session thread"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def timed(self, endpoint, call):
+        start = time.perf_counter()
+        try:
+            response = call()
+            ok = response.status_code < 400
+            if ok and endpoint == '/chat/stream':
+                # The stream's last event is 'done', or 'error' when generation failed
+                ok = json.loads(response.text.splitlines()[-1]).get('type') == 'done'
+        except (requests.RequestException, ValueError, IndexError):
+            ok = False
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((time.perf_counter() - start) * 1000)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def chat_session(base_url, number, turns, stream, rng, recorder):
+    session = requests.Session()
+    recorder.timed('/login', lambda: session.post(f"{base_url}/login", json={'username': f"bench_{number}"}))
+    endpoint = '/chat/stream' if stream else '/chat'
+    for turn in range(turns):
+        message = rng.choice(OPENERS) if turn == 0 else rng.choice(FOLLOWUPS + OPENERS[:2])
+        recorder.timed(endpoint, lambda: session.post(f"{base_url}{endpoint}", json={'message': message}, timeout=120))
+    return turns
+
+
+def kiosk_session(base_url, turns, rng, recorder):
+    for _ in range(turns):
+        prompt = rng.choice(KIOSK_PROMPTS)
+        recorder.timed('/recommend', lambda: requests.post(f"{base_url}/recommend", json={'prompt': prompt}, timeout=120))
+    return turns
+
+
+def start_server(args, workdir, call_log_path):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'app.sqlite3'),
+        'CONVERSATION_STORE': 'sqlite',
+        'CONVERSATION_STORE_URL': os.path.join(workdir, 'conversation_state.sqlite3'),
+        'EMBEDDING_CACHE_PATH': os.path.join(workdir, 'embedding_cache.sqlite3'),
+        'SECRET_KEY': 'bench',
+        'BENCH_CALL_LOG': call_log_path,
+        'BENCH_GENAI_LATENCY': args.genai_latency,
+        'BENCH_EMBED_LATENCY': args.embed_latency,
+        'BENCH_PINECONE_LATENCY': args.pinecone_latency,
+    })
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+               '--bind', f"127.0.0.1:{args.port}", '--chdir', ROOT]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    command.append('bench_fakes:create_app()')
+    log = open(os.path.join(workdir, 'gunicorn.log'), 'w')
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT), log
+
+
+def wait_until_up(base_url, server, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            return False
+        try:
+            requests.get(f"{base_url}/menu-data", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def wait_for_quiet(path, quiet=1.0, timeout=60):
+    """Wait until the call log stops growing (background exchange updates have finished)"""
+    deadline = time.time() + timeout
+    size, stable_since = -1, time.time()
+    while time.time() < deadline:
+        current = os.path.getsize(path) if os.path.exists(path) else 0
+        if current != size:
+            size, stable_since = current, time.time()
+        elif time.time() - stable_since >= quiet:
+            return
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /chat and /recommend with fake model and index clients")
+    parser.add_argument('--sessions', type=int, default=40, help="synthetic sessions to replay")
+    parser.add_argument('--concurrency', type=int, default=8, help="sessions running at once")
+    parser.add_argument('--turns', type=int, default=4, help="requests per session (chat: opener plus follow-ups)")
+    parser.add_argument('--mix', choices=('chat', 'recommend', 'mixed'), default='mixed')
+    parser.add_argument('--kiosk-share', type=float, default=0.3, help="share of /recommend sessions in a mixed run")
+    parser.add_argument('--stream', action='store_true', help="use /chat/stream instead of /chat")
+    parser.add_argument('--workers', type=int, default=None, help="override the config's worker count")
+    parser.add_argument('--port', type=int, default=10099)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--genai-latency', default=os.getenv('BENCH_GENAI_LATENCY', DEFAULT_LATENCIES['BENCH_GENAI_LATENCY']))
+    parser.add_argument('--embed-latency', default=os.getenv('BENCH_EMBED_LATENCY', DEFAULT_LATENCIES['BENCH_EMBED_LATENCY']))
+    parser.add_argument('--pinecone-latency',
+                        default=os.getenv('BENCH_PINECONE_LATENCY', DEFAULT_LATENCIES['BENCH_PINECONE_LATENCY']))
+    parser.add_argument('--keep', action='store_true', help="keep the run directory (databases, gunicorn log)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='nutrimood_bench_')
+    call_log_path = os.path.join(workdir, 'calls.log')
+    app = make_app('sqlite:///' + os.path.join(workdir, 'app.sqlite3'))
+    with app.app_context():
+        db.create_all()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server, log = start_server(args, workdir, call_log_path)
+    try:
+        if not wait_until_up(base_url, server):
+            print(f"gunicorn did not come up; see {os.path.join(workdir, 'gunicorn.log')}")
+            args.keep = True
+            return 1
+        wait_for_quiet(call_log_path, quiet=0.5)
+        warm_calls = CallLog.counts(call_log_path)
+
+        rng = random.Random(args.seed)
+        kiosk_share = {'chat': 0.0, 'recommend': 1.0}.get(args.mix, args.kiosk_share)
+        plan = [(number, rng.random() < kiosk_share, random.Random(rng.random())) for number in range(args.sessions)]
+        recorder = Recorder()
+
+        def run(session):
+            number, kiosk, session_rng = session
+            if kiosk:
+                return kiosk_session(base_url, args.turns, session_rng, recorder)
+            return chat_session(base_url, number, args.turns, args.stream, session_rng, recorder)
+
+        print(f"Replaying {args.sessions} sessions x {args.turns} turns, {args.concurrency} at a time "
+              f"(genai {args.genai_latency}, embed {args.embed_latency}, pinecone {args.pinecone_latency})")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            turns = sum(pool.map(run, plan))
+        elapsed = time.perf_counter() - start
+        wait_for_quiet(call_log_path)
+        calls = CallLog.counts(call_log_path)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+    requests_made = sum(len(samples) for samples in recorder.samples.values())
+    print(f"\n{'endpoint':<14} {'requests':>8} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'mean':>9}")
+    for endpoint, samples in recorder.samples.items():
+        print(f"{endpoint:<14} {len(samples):>8} {recorder.errors.get(endpoint, 0):>7} "
+              f"{percentile(samples, 0.50):>7.0f}ms {percentile(samples, 0.95):>7.0f}ms "
+              f"{percentile(samples, 0.99):>7.0f}ms {statistics.mean(samples):>7.0f}ms")
+    print(f"\nThroughput: {requests_made / elapsed:.1f} requests/s, {turns / elapsed:.1f} turns/s over {elapsed:.1f}s")
+
+    print(f"\nModel and index calls per turn ({turns} turns, warm-up excluded):")
+    for kind in CALL_KINDS:
+        count = calls.get(kind, 0) - warm_calls.get(kind, 0)
+        print(f"  {kind:<9} {count:>6}  {count / max(turns, 1):.2f}/turn")
+    model_calls = sum(calls.get(kind, 0) - warm_calls.get(kind, 0) for kind in ('generate', 'stream', 'analysis'))
+    print(f"  {'gemini':<9} {model_calls:>6}  {model_calls / max(turns, 1):.2f}/turn (generation + analysis)")
+
+    if args.keep:
+        print(f"\nRun directory: {workdir}")
+    else:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# bench_queries.py
+"""Seed a synthetic conversation database and time each endpoint's queries
+without and with the conversation/message indexes.
+
+The database is dropped and recreated, so it defaults to a throwaway SQLite
+file; pointing it at anything else needs --force.
+
+Usage:
+    python bench_queries.py
+    python bench_queries.py --users 5000 --avg-conversations 40 --heavy-conversations 20000
+    python bench_queries.py --database postgresql://localhost/nutrimood_bench --force
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from models import (db, User, Conversation, Message, UserStats,
+                    history_page_query, user_stats_query)
+
+DEFAULT_DATABASE = 'sqlite:///' + os.path.abspath(os.path.join('data', 'bench_queries.sqlite3'))
+INSERT_BATCH_SIZE = 5000
+HEAVY_USERNAME = 'heavy_user'
+
+
+def make_app(database_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def insert_rows(table, rows):
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(table.insert(), rows[i:i + INSERT_BATCH_SIZE])
+
+
+def seed(users, avg_conversations, heavy_conversations, seed_value):
+    """Users with a long-tailed number of one-exchange conversations, plus one very heavy user"""
+    rng = random.Random(seed_value)
+    start = datetime.utcnow() - timedelta(days=180)
+    user_rows, conversation_rows, message_rows, stats_rows = [], [], [], []
+    conversation_id = message_id = 0
+
+    for user_id in range(1, users + 2):
+        heavy = user_id == users + 1
+        username = HEAVY_USERNAME if heavy else f"user_{user_id}"
+        login_time = start + timedelta(minutes=rng.randrange(60 * 24 * 30))
+        user_rows.append({'id': user_id, 'username': username, 'login_time': login_time})
+        count = heavy_conversations if heavy else min(int(rng.paretovariate(1.5) * avg_conversations / 3), avg_conversations * 20)
+        recommendations = 0
+        timestamp = login_time
+        for _ in range(count):
+            conversation_id += 1
+            timestamp += timedelta(seconds=rng.randrange(30, 6 * 3600))
+            foods = [{'id': str(rng.randrange(1, 300)), 'name': 'Item'} for _ in range(rng.randrange(0, 4))]
+            recommendations += len(foods)
+            conversation_rows.append({'id': conversation_id, 'user_id': user_id, 'started_at': timestamp})
+            message_rows.append({'id': message_id + 1, 'conversation_id': conversation_id, 'sender': 'user',
+                                 'content': 'something spicy for dinner', 'timestamp': timestamp,
+                                 'recommended_foods': None})
+            message_rows.append({'id': message_id + 2, 'conversation_id': conversation_id, 'sender': 'bot',
+                                 'content': 'Try the biryani. ' * 20, 'timestamp': timestamp + timedelta(seconds=3),
+                                 'recommended_foods': foods})
+            message_id += 2
+        stats_rows.append({'user_id': user_id, 'conversation_count': count,
+                           'recommendation_count': recommendations,
+                           'last_activity': timestamp if count else None})
+
+    # Interleave users' conversations the way real traffic does
+    order = list(range(len(conversation_rows)))
+    rng.shuffle(order)
+    remap = {conversation_rows[old]['id']: new + 1 for new, old in enumerate(order)}
+    for row in conversation_rows:
+        row['id'] = remap[row['id']]
+    for row in message_rows:
+        row['conversation_id'] = remap[row['conversation_id']]
+    message_rows.sort(key=lambda row: (row['conversation_id'], row['sender'] == 'bot'))
+    for i, row in enumerate(message_rows, start=1):
+        row['id'] = i
+
+    insert_rows(User.__table__, user_rows)
+    insert_rows(Conversation.__table__, sorted(conversation_rows, key=lambda row: row['id']))
+    insert_rows(Message.__table__, message_rows)
+    insert_rows(UserStats.__table__, stats_rows)
+    db.session.commit()
+    return len(user_rows), len(conversation_rows), len(message_rows)
+
+
+def access_patterns(users):
+    """Endpoint name -> the statement that endpoint runs"""
+    heavy_id = users + 1
+    median_id = max(users // 2, 1)
+    middle_cursor = db.session.execute(
+        db.select(db.func.max(Conversation.id)).where(Conversation.user_id == heavy_id)
+    ).scalar() // 2
+    recent = datetime.utcnow() - timedelta(days=1)
+
+    return {
+        '/login (user by name)': db.select(User).where(User.username == HEAVY_USERNAME),
+        '/user_data page 1 (heavy user)': history_page_query(heavy_id),
+        '/user_data deep page (heavy user)': history_page_query(heavy_id, cursor=middle_cursor),
+        '/user_data page 1 (typical user)': history_page_query(median_id),
+        '/admin/dashboard, /all_users': user_stats_query(),
+        'user_stats backfill (per-user counts)': (
+            db.select(Conversation.user_id, db.func.count()).group_by(Conversation.user_id)
+        ),
+        'recent activity (last 24h)': (
+            db.select(db.func.count()).select_from(Message).where(Message.timestamp >= recent)
+        ),
+    }
+
+
+def explain(statement):
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(db.text(prefix + sql)).all()
+    return ' | '.join(str(row[-1]) for row in rows)
+
+
+def time_patterns(patterns, repeat):
+    results = {}
+    for name, statement in patterns.items():
+        db.session.execute(statement).all()  # warm the page cache
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.session.execute(statement).all()
+            samples.append((time.perf_counter() - start) * 1000)
+            db.session.rollback()
+        samples.sort()
+        results[name] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+    return results
+
+
+def model_indexes():
+    return [index for table in (Conversation.__table__, Message.__table__) for index in table.indexes]
+
+
+def analyze():
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark conversation queries before and after indexing")
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help="database URL to drop, seed and benchmark")
+    parser.add_argument('--force', action='store_true', help="allow a non-SQLite database (it is wiped)")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--avg-conversations', type=int, default=25)
+    parser.add_argument('--heavy-conversations', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--explain', action='store_true', help="print the query plan for each pattern")
+    args = parser.parse_args()
+
+    if not args.database.startswith('sqlite') and not args.force:
+        parser.error("refusing to wipe a non-SQLite database without --force")
+    if args.database.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(args.database[len('sqlite:///'):]) or '.', exist_ok=True)
+
+    app = make_app(args.database)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        indexes = model_indexes()
+        for index in indexes:
+            index.drop(db.engine)
+
+        start = time.time()
+        users, conversations, messages = seed(args.users, args.avg_conversations, args.heavy_conversations, args.seed)
+        print(f"Seeded {users} users, {conversations} conversations, {messages} messages in {time.time() - start:.1f}s")
+
+        patterns = access_patterns(args.users)
+        analyze()
+        before = time_patterns(patterns, args.repeat)
+        plans_before = {name: explain(statement) for name, statement in patterns.items()}
+
+        for index in indexes:
+            index.create(db.engine)
+        analyze()
+        after = time_patterns(patterns, args.repeat)
+        plans_after = {name: explain(statement) for name, statement in patterns.items()}
+
+    print(f"\n{'access pattern':<40} {'before p50':>11} {'p95':>9} {'after p50':>11} {'p95':>9} {'speedup':>8}")
+    for name in patterns:
+        (b50, b95), (a50, a95) = before[name], after[name]
+        print(f"{name:<40} {b50:>9.2f}ms {b95:>7.2f}ms {a50:>9.2f}ms {a95:>7.2f}ms {b50 / max(a50, 1e-6):>7.1f}x")
+
+    if args.explain:
+        for name in patterns:
+            print(f"\n{name}\n  before: {plans_before[name]}\n  after:  {plans_after[name]}")
+
+
+if __name__ == "__main__":
+    main()
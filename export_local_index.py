@@ -0,0 +1,45 @@
+# export_local_index.py
+"""Copy vectors from a Pinecone index into the local NumPy index without re-embedding.
+
+Usage: python export_local_index.py <index-name> <catalog-json>
+e.g.   python export_local_index.py niloufer-prod-data data/niloufer-prod-date.json
+"""
+import json
+import sys
+from utils.pinecone_helper import get_new_index
+from utils.ingest import stamp_catalog_version
+from utils.local_index import get_local_index
+
+BATCH_SIZE = 100
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    index_name, data_path = sys.argv[1], sys.argv[2]
+
+    with open(data_path, 'r', encoding='utf-8') as f:
+        food_data = json.load(f)
+    ids = [str(item.get('Id') or item.get('id')) for item in food_data]
+
+    remote = get_new_index(index_name=index_name)
+    local = get_local_index(index_name)
+
+    exported = 0
+    for i in range(0, len(ids), BATCH_SIZE):
+        fetched = remote.fetch(ids=ids[i:i + BATCH_SIZE])
+        vectors = [
+            {'id': vector_id, 'values': list(vector['values']), 'metadata': dict(vector.get('metadata') or {})}
+            for vector_id, vector in fetched['vectors'].items()
+        ]
+        local.upsert(vectors=vectors)
+        exported += len(vectors)
+        print(f"Exported {exported}/{len(ids)} vectors...")
+
+    stamp_catalog_version(index_name)
+    print(f"✅ Local index '{index_name}' written to {local.matrix_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import time
+
 bind = "0.0.0.0:10000"
 workers = 2
 worker_class = "sync"
@@ -10,4 +12,23 @@ graceful_timeout = 120
 errorlog = "-"
 loglevel = "info"
 accesslog = "-"
-preload_app = True
\ No newline at end of file
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Resolve index handles once per worker, after the fork, so requests skip the control plane
+    from utils.vector_backend import warm_vector_indexes
+    from utils.context_provider import context_provider
+    warm_vector_indexes()
+    context_provider.warm()
+
+
+def worker_exit(server, worker):
+    # Flush background exchange updates and queued chat rows before a worker is recycled (max_requests) or stopped
+    # Both queues share one grace period, so the worker is done before the master kills it
+    from app import exchange_queue, turn_writer
+    deadline = time.monotonic() + graceful_timeout
+    if not exchange_queue.shutdown(timeout=graceful_timeout):
+        server.log.warning("Worker %s exited with exchange updates still pending", worker.pid)
+    if not turn_writer.shutdown(timeout=max(0, deadline - time.monotonic())):
+        server.log.warning("Worker %s exited with %s chat rows still queued", worker.pid, turn_writer.depth())
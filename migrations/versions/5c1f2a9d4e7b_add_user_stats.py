@@ -0,0 +1,64 @@
+"""Add per-user stats table
+
+Revision ID: 5c1f2a9d4e7b
+Revises: 37dd511137c8
+Create Date: 2026-10-17 10:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f2a9d4e7b'
+down_revision = '37dd511137c8'
+branch_labels = None
+depends_on = None
+
+# Number of recommended foods stored on a bot message, per dialect
+RECOMMENDATION_COUNT_SQL = {
+    'postgresql': "CASE WHEN json_typeof(m.recommended_foods) = 'array' THEN json_array_length(m.recommended_foods) ELSE 0 END",
+    'sqlite': "CASE WHEN json_type(m.recommended_foods) = 'array' THEN json_array_length(m.recommended_foods) ELSE 0 END",
+}
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_count', sa.Integer(), nullable=False),
+    sa.Column('recommendation_count', sa.Integer(), nullable=False),
+    sa.Column('last_activity', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from the existing history with grouped aggregates
+    bind = op.get_bind()
+    recommendation_count = RECOMMENDATION_COUNT_SQL.get(bind.dialect.name)
+    if recommendation_count is None:
+        raise RuntimeError(f"No user_stats backfill for dialect {bind.dialect.name}")
+    op.execute(f"""
+        INSERT INTO user_stats (user_id, conversation_count, recommendation_count, last_activity)
+        SELECT u.id,
+               COALESCE(c.conversation_count, 0),
+               COALESCE(r.recommendation_count, 0),
+               r.last_activity
+        FROM "user" u
+        LEFT JOIN (
+            SELECT user_id, COUNT(*) AS conversation_count
+            FROM conversation
+            GROUP BY user_id
+        ) c ON c.user_id = u.id
+        LEFT JOIN (
+            SELECT conv.user_id,
+                   SUM(CASE WHEN m.sender = 'bot' THEN {recommendation_count} ELSE 0 END) AS recommendation_count,
+                   MAX(m.timestamp) AS last_activity
+            FROM message m
+            JOIN conversation conv ON conv.id = m.conversation_id
+            GROUP BY conv.user_id
+        ) r ON r.user_id = u.id
+    """)
+
+
+def downgrade():
+    op.drop_table('user_stats')
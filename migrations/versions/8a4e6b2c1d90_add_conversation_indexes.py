@@ -0,0 +1,31 @@
+"""Add conversation and message indexes
+
+Revision ID: 8a4e6b2c1d90
+Revises: 5c1f2a9d4e7b
+Create Date: 2026-10-17 11:03:27.540918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6b2c1d90'
+down_revision = '5c1f2a9d4e7b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A user's conversations, in id order (history pages, stats backfill)
+    op.create_index('ix_conversation_user_id_id', 'conversation', ['user_id', 'id'], unique=False)
+    # The user or bot message of a conversation (history pairing, per-conversation reads)
+    op.create_index('ix_message_conversation_id_sender_id', 'message', ['conversation_id', 'sender', 'id'], unique=False)
+    # Time-range scans (recent activity, retention)
+    op.create_index('ix_message_timestamp', 'message', ['timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_message_timestamp', table_name='message')
+    op.drop_index('ix_message_conversation_id_sender_id', table_name='message')
+    op.drop_index('ix_conversation_user_id_id', table_name='conversation')
@@ -1,4 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
 
 db = SQLAlchemy()  # Do NOT pass app here
@@ -10,15 +12,144 @@ class User(db.Model):
     conversations = db.relationship('Conversation', backref='user', lazy=True)
 
 class Conversation(db.Model):
+    __table_args__ = (
+        db.Index('ix_conversation_user_id_id', 'user_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     messages = db.relationship('Message', backref='conversation', lazy=True)
 
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_conversation_id_sender_id', 'conversation_id', 'sender', 'id'),
+        db.Index('ix_message_timestamp', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
     sender = db.Column(db.String(10))  # 'user' or 'bot'
     content = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    recommended_foods = db.Column(db.JSON)  # Store as JSON if needed
\ No newline at end of file
+    recommended_foods = db.Column(db.JSON)  # Store as JSON if needed
+
+class UserStats(db.Model):
+    """Per-user dashboard counters, kept current by /chat instead of recounted on every page view"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    conversation_count = db.Column(db.Integer, nullable=False, default=0)
+    recommendation_count = db.Column(db.Integer, nullable=False, default=0)
+    last_activity = db.Column(db.DateTime)
+
+    @classmethod
+    def increment(cls, user_id, conversations=0, recommendations=0, at=None):
+        """Add to a user's counters in the current transaction; the caller commits.
+
+        A single INSERT ... ON CONFLICT DO UPDATE, so two first turns for the
+        same user on different workers cannot both insert the row.
+        """
+        at = at or datetime.utcnow()
+        dialect = db.session.get_bind().dialect.name
+        insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        statement = insert(cls).values(
+            user_id=user_id,
+            conversation_count=conversations,
+            recommendation_count=recommendations,
+            last_activity=at
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[cls.user_id],
+            set_={
+                'conversation_count': cls.conversation_count + statement.excluded.conversation_count,
+                'recommendation_count': cls.recommendation_count + statement.excluded.recommendation_count,
+                'last_activity': statement.excluded.last_activity
+            }
+        ))
+
+def write_chat_turns(turns):
+    """Insert each turn's conversation and user/bot messages and bump user_stats in one transaction.
+
+    Each turn is a dict with user_id, started_at, user_message, bot_message,
+    bot_timestamp and recommended_foods; a turn whose bot_message is None
+    (generation failed) stores only the user message. Rows go out as
+    multi-row inserts, so a batch of turns costs the same number of
+    statements as a single one.
+    """
+    try:
+        conversation_ids = db.session.scalars(
+            db.insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True),
+            [{'user_id': turn['user_id'], 'started_at': turn['started_at']} for turn in turns]
+        ).all()
+        messages = []
+        totals = {}
+        for conversation_id, turn in zip(conversation_ids, turns):
+            messages.append({'conversation_id': conversation_id, 'sender': 'user',
+                             'content': turn['user_message'], 'timestamp': turn['started_at'],
+                             'recommended_foods': None})
+            if turn['bot_message'] is not None:
+                messages.append({'conversation_id': conversation_id, 'sender': 'bot',
+                                 'content': turn['bot_message'], 'timestamp': turn['bot_timestamp'],
+                                 'recommended_foods': turn['recommended_foods']})
+            conversations, recommendations, last = totals.get(turn['user_id'], (0, 0, None))
+            totals[turn['user_id']] = (conversations + 1, recommendations + len(turn['recommended_foods']),
+                                       max(filter(None, [last, turn['bot_timestamp'] or turn['started_at']])))
+        db.session.execute(db.insert(Message), messages)
+        for user_id, (conversations, recommendations, last) in totals.items():
+            UserStats.increment(user_id, conversations=conversations, recommendations=recommendations, at=last)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+def user_stats_query():
+    """Select every user with their counters; users without a stats row count as zero"""
+    return (
+        db.select(
+            User.username,
+            User.login_time,
+            db.func.coalesce(UserStats.conversation_count, 0).label('conversation_count'),
+            db.func.coalesce(UserStats.recommendation_count, 0).label('recommendation_count'),
+            UserStats.last_activity
+        )
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .order_by(User.id)
+    )
+
+def query_user_stats():
+    return db.session.execute(user_stats_query()).all()
+
+def history_page_query(user_id, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """Select (user message, bot message) pairs for one page, newest first, fetching one extra row"""
+    user_msg = db.aliased(Message)
+    bot_msg = db.aliased(Message)
+    query = (
+        db.select(user_msg, bot_msg)
+        .join(Conversation, Conversation.id == user_msg.conversation_id)
+        .outerjoin(bot_msg, db.and_(bot_msg.conversation_id == user_msg.conversation_id, bot_msg.sender == 'bot'))
+        .where(Conversation.user_id == user_id, user_msg.sender == 'user')
+        .order_by(Conversation.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        query = query.where(Conversation.id < cursor)
+    return query
+
+def query_history_page(user_id, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of a user's exchanges, newest first, as (items, next_cursor).
+
+    /chat writes one user and one bot message per conversation, so each user
+    message is paired with its conversation's bot message in a single joined
+    query. The cursor is the last conversation id on the previous page, so a
+    page is a range scan of the (user_id, id) conversation index.
+    """
+    rows = db.session.execute(history_page_query(user_id, cursor, limit)).all()
+    items = [{
+        'timestamp': user.timestamp.isoformat(),
+        'user_input': user.content,
+        'ai_response': bot.content if bot else '',
+        'recommended_foods': (bot.recommended_foods if bot else None) or [],
+        'is_followup': False
+    } for user, bot in rows[:limit]]
+    next_cursor = rows[limit - 1][0].conversation_id if len(rows) > limit else None
+    return items, next_cursor
@@ -1,90 +1,25 @@
 import os
 from dotenv import load_dotenv
 from utils.embeddings import get_embedding
-from utils.pinecone_helper import get_new_index
+from utils.vector_backend import get_vector_index
+from utils.context_provider import get_contextual_info
 import google.generativeai as genai
-import requests
-from datetime import datetime
-import pytz
 
 load_dotenv()
 
-def get_contextual_info():
-    """Get weather, time, and holiday information"""
-    context = {}
-    
-    # Get current time
-    ist = pytz.timezone('Asia/Kolkata')
-    current_time = datetime.now(ist)
-    context['time'] = {
-        'hour': current_time.hour,
-        'day': current_time.strftime('%A'),
-        'date': current_time.strftime('%Y-%m-%d')
-    }
-    
-    # Get weather
-    weather_api_key = os.getenv("WEATHER_API_KEY")
-    if weather_api_key:
-        try:
-            response = requests.get(
-                "http://api.openweathermap.org/data/2.5/weather",
-                params={
-                    'q': 'Hyderabad,IN',
-                    'appid': weather_api_key,
-                    'units': 'metric'
-                }
-            )
-            if response.status_code == 200:
-                weather_data = response.json()
-                context['weather'] = {
-                    'temperature': weather_data['main']['temp'],
-                    'description': weather_data['weather'][0]['description'],
-                    'humidity': weather_data['main']['humidity']
-                }
-        except Exception as e:
-            print(f"Warning: Could not fetch weather data: {str(e)}")
-    
-    # Get holidays
-    holiday_api_key = os.getenv("HOLIDAY_API_KEY")
-    if holiday_api_key:
-        try:
-            response = requests.get(
-                "https://calendarific.com/api/v2/holidays",
-                params={
-                    'api_key': holiday_api_key,
-                    'country': 'IN',
-                    'year': current_time.year,
-                    'month': current_time.month
-                }
-            )
-            if response.status_code == 200:
-                holiday_data = response.json()
-                holidays = holiday_data.get('response', {}).get('holidays', [])
-                context['holidays'] = [
-                    {
-                        'name': holiday['name'],
-                        'date': holiday['date']['iso']
-                    }
-                    for holiday in holidays
-                ]
-        except Exception as e:
-            print(f"Warning: Could not fetch holiday data: {str(e)}")
-    
-    return context
-
 # Configure Google Generative AI
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
 user_input = input("What are you in the mood for? ")
 
-# Get contextual information
-context = get_contextual_info()
+# Get contextual information (a one-off CLI run can wait for the first fetch)
+context = get_contextual_info(block=True)
 
 # Embed the user input
 query_embedding = get_embedding(user_input)
 
 # Query Pinecone
-index = get_new_index()
+index = get_vector_index()
 results = index.query(vector=query_embedding, top_k=5, include_metadata=True)
 matches = results['matches']
 retrieved_foods = [match['metadata'] for match in matches]
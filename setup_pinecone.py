@@ -1,13 +1,14 @@
 # setup_pinecone.py
 import json
-from utils.embeddings import get_embedding
-from utils.pinecone_helper import get_new_index, upsert_data
+from utils.embeddings import get_embeddings
+from utils.pinecone_helper import upsert_data
+from utils.vector_backend import get_vector_index
 
 # Load your JSON food data
 with open("data/niloufer.json", "r") as f:
     food_data = json.load(f)
 
-index = get_new_index()
-upsert_data(index, food_data, get_embedding)
+index = get_vector_index()
+upsert_data(index, food_data, get_embeddings)
 
 print("✅ Successfully uploaded food data to Pinecone!")
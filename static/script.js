@@ -220,7 +220,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const typingIndicator = addTypingIndicator();
 
         try {
-            const response = await fetch('/chat', {
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -232,19 +232,42 @@ document.addEventListener('DOMContentLoaded', function() {
                 })
             });
 
-            const data = await response.json();
-            
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                throw new Error(data.error || 'Chat request failed');
+            }
+
+            // Render text as it streams in, then show food cards from the final event
+            let contentDiv = null;
+            let streamedText = '';
+            const data = await readChatStream(response, event => {
+                if (event.type !== 'token') return;
+                if (!contentDiv) {
+                    if (typingIndicator) {
+                        typingIndicator.remove();
+                    }
+                    contentDiv = createMessage('bot');
+                }
+                streamedText += event.text;
+                contentDiv.innerHTML = formatMessageText(streamedText);
+                scrollToBottom();
+            });
+
             // Remove typing indicator
             if (typingIndicator) {
                 typingIndicator.remove();
             }
-            
-            if (data.error) {
-                throw new Error(data.error);
+
+            if (!data || data.type === 'error') {
+                throw new Error('Chat stream failed');
             }
 
-            // Add bot response to chat
-            await typeMessage(data.response, 'bot');
+            // Replace the streamed text with the cleaned final response
+            if (!contentDiv) {
+                contentDiv = createMessage('bot');
+            }
+            contentDiv.innerHTML = formatMessageText(data.response);
+            scrollToBottom();
 
             // Add to chat history
             chatHistory.push({ role: 'assistant', content: data.response });
@@ -266,6 +289,81 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Read an NDJSON chat stream, calling onEvent for each event; resolves with the final event
+    async function readChatStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let finalEvent = null;
+
+        const handleLine = line => {
+            if (!line.trim()) return;
+            const event = JSON.parse(line);
+            if (event.type === 'done' || event.type === 'error') {
+                finalEvent = event;
+            }
+            onEvent(event);
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffer + decoder.decode());
+        return finalEvent;
+    }
+
+    function formatMessageText(text) {
+        return text
+            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+            .replace(/\*(.*?)\*/g, '<em>$1</em>')
+            .replace(/`(.*?)`/g, '<code>$1</code>')
+            .replace(/\n/g, '<br>');
+    }
+
+    // Create an empty message bubble for role and return its content element
+    function createMessage(role) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${role}`;
+
+        const messageWrapper = document.createElement('div');
+        messageWrapper.className = 'message-wrapper';
+
+        // Add emoji avatar only for bot messages
+        if (role === 'bot') {
+            const avatar = document.createElement('div');
+            avatar.className = 'message-avatar';
+            avatar.innerHTML = '👨‍🍳';
+            messageWrapper.appendChild(avatar);
+        }
+
+        const messageBubble = document.createElement('div');
+        messageBubble.className = 'message-bubble';
+
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'message-content';
+        messageBubble.appendChild(contentDiv);
+
+        // Add timestamp
+        const timeDiv = document.createElement('div');
+        timeDiv.className = 'message-time';
+        timeDiv.textContent = new Date().toLocaleTimeString('en-US', { 
+            hour: 'numeric', 
+            minute: 'numeric',
+            hour12: true 
+        });
+        messageBubble.appendChild(timeDiv);
+
+        messageWrapper.appendChild(messageBubble);
+        messageDiv.appendChild(messageWrapper);
+        chatMessages.appendChild(messageDiv);
+        return contentDiv;
+    }
+
     function addFollowUpQuestions(foods, aiResponse) {
         // Remove any existing follow-up questions
         const existingFollowUps = document.querySelectorAll('.quick-actions-container');
@@ -338,40 +436,7 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     async function typeMessage(messageContent, role) {
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${role}`;
-        
-        const messageWrapper = document.createElement('div');
-        messageWrapper.className = 'message-wrapper';
-        
-        // Add emoji avatar only for bot messages
-        if (role === 'bot') {
-            const avatar = document.createElement('div');
-            avatar.className = 'message-avatar';
-            avatar.innerHTML = '👨‍🍳';
-            messageWrapper.appendChild(avatar);
-        }
-
-        const messageBubble = document.createElement('div');
-        messageBubble.className = 'message-bubble';
-
-        const contentDiv = document.createElement('div');
-        contentDiv.className = 'message-content';
-        messageBubble.appendChild(contentDiv);
-
-        // Add timestamp
-        const timeDiv = document.createElement('div');
-        timeDiv.className = 'message-time';
-        timeDiv.textContent = new Date().toLocaleTimeString('en-US', { 
-            hour: 'numeric', 
-            minute: 'numeric',
-            hour12: true 
-        });
-        messageBubble.appendChild(timeDiv);
-
-        messageWrapper.appendChild(messageBubble);
-        messageDiv.appendChild(messageWrapper);
-        chatMessages.appendChild(messageDiv);
+        const contentDiv = createMessage(role);
 
         if (role === 'bot') {
             // Split the message into words
@@ -381,11 +446,7 @@ document.addEventListener('DOMContentLoaded', function() {
             // Type each word with a delay
             for (const word of words) {
                 currentText += word;
-                contentDiv.innerHTML = currentText
-                    .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                    .replace(/\*(.*?)\*/g, '<em>$1</em>')
-                    .replace(/`(.*?)`/g, '<code>$1</code>')
-                    .replace(/\n/g, '<br>');
+                contentDiv.innerHTML = formatMessageText(currentText);
                 
                 // Add a random fun emoji at the end
                 const funEmojis = ['😋', '🍽️', '🥗', '🍜', '🍕', '🍔', '🌮', '🍣', '🍲', '🥑', '🍟', '🍱', '🍛', '🍦', '🍩', '🍉', '🍇', '🍒', '🍰', '🥞', '🍤', '🍿', '🥨', '🍪', '🧁', '🍔', '🍟', '🥪', '🥙', '🍧', '🍵', '🍹', '🍴'];
@@ -397,11 +458,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         } else {
             // For user messages, display immediately
-            contentDiv.innerHTML = messageContent
-                .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                .replace(/\*(.*?)\*/g, '<em>$1</em>')
-                .replace(/`(.*?)`/g, '<code>$1</code>')
-                .replace(/\n/g, '<br>');
+            contentDiv.innerHTML = formatMessageText(messageContent);
         }
         
         scrollToBottom();
@@ -411,39 +468,7 @@ document.addEventListener('DOMContentLoaded', function() {
         if (role === 'bot') {
             typeMessage(content, role);
         } else {
-            const messageDiv = document.createElement('div');
-            messageDiv.className = `message ${role}`;
-            
-            const messageWrapper = document.createElement('div');
-            messageWrapper.className = 'message-wrapper';
-
-            const messageBubble = document.createElement('div');
-            messageBubble.className = 'message-bubble';
-
-            const messageContent = document.createElement('div');
-            messageContent.className = 'message-content';
-            
-            messageContent.innerHTML = content
-                .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                .replace(/\*(.*?)\*/g, '<em>$1</em>')
-                .replace(/`(.*?)`/g, '<code>$1</code>')
-                .replace(/\n/g, '<br>');
-            
-            messageBubble.appendChild(messageContent);
-
-            // Add timestamp
-            const timeDiv = document.createElement('div');
-            timeDiv.className = 'message-time';
-            timeDiv.textContent = new Date().toLocaleTimeString('en-US', { 
-                hour: 'numeric', 
-                minute: 'numeric',
-                hour12: true 
-            });
-            messageBubble.appendChild(timeDiv);
-            
-            messageWrapper.appendChild(messageBubble);
-            messageDiv.appendChild(messageWrapper);
-            chatMessages.appendChild(messageDiv);
+            createMessage(role).innerHTML = formatMessageText(content);
             scrollToBottom();
         }
     }
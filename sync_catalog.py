@@ -0,0 +1,173 @@
+# sync_catalog.py
+"""Incrementally sync a menu catalog into its vector index.
+
+Keeps a manifest of content hashes per item id and only re-embeds/upserts new
+or changed items, updates the metadata of items whose embedding text is
+unchanged, and deletes removed ones.
+
+Usage:
+    python sync_catalog.py niloufer-prod-data --dry-run
+    python sync_catalog.py niloufer-prod-data
+    python sync_catalog.py niloufer-menu --rebuild-manifest   # index already up to date
+"""
+import argparse
+import hashlib
+import json
+import os
+from dotenv import load_dotenv
+from utils.ingest import clean_metadata, menu_item_text, prod_item_text
+
+load_dotenv()
+
+MANIFEST_DIR = os.path.join('data', 'manifests')
+DELETE_BATCH_SIZE = 100
+FETCH_BATCH_SIZE = 100
+
+# index name -> how to read, identify and embed its catalog
+CATALOGS = {
+    'niloufer-menu': {
+        'path': os.path.join('data', 'niloufer.json'),
+        'id_key': 'id',
+        'to_text': menu_item_text,
+        'to_metadata': lambda item: item,
+    },
+    'niloufer-prod-data': {
+        'path': os.path.join('data', 'niloufer-prod-date.json'),
+        'id_key': 'Id',
+        'to_text': prod_item_text,
+        'to_metadata': clean_metadata,
+    },
+}
+
+
+def content_hash(value):
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def build_manifest(items, catalog):
+    """id -> hash of the embedding text, plus a metadata hash for non-embedded fields"""
+    return {
+        str(item[catalog['id_key']]): {
+            'text': content_hash(catalog['to_text'](item)),
+            'metadata': content_hash(catalog['to_metadata'](item)),
+        }
+        for item in items
+    }
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def diff_manifests(old, new):
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    common = set(new) & set(old)
+    reembed = sorted(i for i in common if old[i]['text'] != new[i]['text'])
+    metadata_only = sorted(i for i in common if old[i]['text'] == new[i]['text'] and old[i]['metadata'] != new[i]['metadata'])
+    return {'added': added, 'changed': reembed, 'metadata_changed': metadata_only, 'removed': removed}
+
+
+def print_report(index_name, diff, items_by_id, total):
+    print(f"Catalog '{index_name}': {total} items")
+    for label, key in [('New', 'added'), ('Changed (re-embed)', 'changed'),
+                       ('Metadata only', 'metadata_changed'), ('Removed', 'removed')]:
+        print(f"  {label}: {len(diff[key])}")
+        for item_id in diff[key][:20]:
+            item = items_by_id.get(item_id, {})
+            print(f"    - {item_id} {item.get('ProductName') or item.get('name') or ''}")
+        if len(diff[key]) > 20:
+            print(f"    ... {len(diff[key]) - 20} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync a catalog into its vector index")
+    parser.add_argument('index_name', choices=sorted(CATALOGS))
+    parser.add_argument('--dry-run', action='store_true', help="report the diff without touching the index")
+    parser.add_argument('--rebuild-manifest', action='store_true',
+                        help="record the current catalog as synced without touching the index")
+    args = parser.parse_args()
+
+    catalog = CATALOGS[args.index_name]
+    manifest_path = os.path.join(MANIFEST_DIR, f"{args.index_name}.json")
+
+    with open(catalog['path'], 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    items_by_id = {str(item[catalog['id_key']]): item for item in items}
+
+    old_manifest = load_manifest(manifest_path)
+    new_manifest = build_manifest(items, catalog)
+    diff = diff_manifests(old_manifest, new_manifest)
+    print_report(args.index_name, diff, items_by_id, len(items))
+
+    if args.dry_run:
+        print("Dry run: no changes made.")
+        return
+    if args.rebuild_manifest:
+        save_manifest(manifest_path, new_manifest)
+        print(f"Manifest written to {manifest_path}")
+        return
+
+    from utils.embeddings import get_embeddings
+    from utils.ingest import ingest, stamp_catalog_version
+    from utils.vector_backend import get_vector_index
+    index = get_vector_index(index_name=args.index_name)
+
+    # Metadata-only changes keep their embedding text: re-upsert the stored vectors with the
+    # complete new metadata, so fields dropped from an item are dropped from the index too
+    to_embed = diff['added'] + diff['changed']
+    updated = 0
+    for i in range(0, len(diff['metadata_changed']), FETCH_BATCH_SIZE):
+        batch = diff['metadata_changed'][i:i + FETCH_BATCH_SIZE]
+        fetched = index.fetch(ids=batch)['vectors']
+        vectors = [
+            {'id': item_id, 'values': list(fetched[item_id]['values']),
+             'metadata': catalog['to_metadata'](items_by_id[item_id])}
+            for item_id in batch if item_id in fetched
+        ]
+        # Items missing from the index are embedded like new ones
+        to_embed += [item_id for item_id in batch if item_id not in fetched]
+        if vectors:
+            index.upsert(vectors=vectors)
+            updated += len(vectors)
+    if updated:
+        stamp_catalog_version(args.index_name)
+        print(f"Replaced metadata of {updated} items")
+
+    to_upsert = [items_by_id[i] for i in to_embed]
+    if to_upsert:
+        ingest(
+            index,
+            to_upsert,
+            embed_batch=get_embeddings,
+            to_text=catalog['to_text'],
+            to_id=lambda item: str(item[catalog['id_key']]),
+            to_metadata=catalog['to_metadata'],
+            index_name=args.index_name
+        )
+
+    for i in range(0, len(diff['removed']), DELETE_BATCH_SIZE):
+        index.delete(ids=diff['removed'][i:i + DELETE_BATCH_SIZE])
+    if diff['removed']:
+        stamp_catalog_version(args.index_name)
+        print(f"Deleted {len(diff['removed'])} removed items")
+
+    save_manifest(manifest_path, new_manifest)
+    print(f"✅ Synced '{args.index_name}'; manifest written to {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
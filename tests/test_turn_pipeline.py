@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from utils.turn_pipeline import TurnPipeline, build_chat_pipeline, get_executor
+
+
+class FakeIndex:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, vector, top_k, include_metadata, **kwargs):
+        self.queries.append(vector)
+        return {'matches': [{'metadata': {'id': '1', 'name': 'Tea', 'vector': vector}}]}
+
+
+class FakeConversationManager:
+    def __init__(self, intent, conversation_state=None):
+        self.intent = intent
+        self.conversation_state = conversation_state or {}
+
+    def analyze_user_intent(self, user_input):
+        return self.intent
+
+
+def run_chat_turn(intent, conversation_state=None, user_input="something hot"):
+    index = FakeIndex()
+    embedded = []
+
+    def embed(text):
+        embedded.append(text)
+        return [float(len(embedded))]
+
+    pipeline = build_chat_pipeline(FakeConversationManager(intent, conversation_state), user_input,
+                                   embed=embed, get_index=lambda: index)
+    return pipeline.run(), embedded, index
+
+
+def test_stage_starts_after_its_dependencies_finish():
+    spans = {}
+    lock = threading.Lock()
+
+    def stage(name, delay):
+        def fn(**deps):
+            start = time.perf_counter()
+            time.sleep(delay)
+            with lock:
+                spans[name] = (start, time.perf_counter())
+            return name
+        return fn
+
+    pipeline = TurnPipeline()
+    pipeline.add_stage('a', stage('a', 0.05))
+    pipeline.add_stage('b', stage('b', 0.01))
+    pipeline.add_stage('c', stage('c', 0.0), deps=['a', 'b'])
+    results = pipeline.run()
+
+    assert results == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert spans['c'][0] >= spans['a'][1]
+    assert spans['c'][0] >= spans['b'][1]
+
+
+def test_dependency_results_are_passed_by_stage_name():
+    pipeline = TurnPipeline()
+    pipeline.add_stage('x', lambda: 2)
+    pipeline.add_stage('y', lambda: 3)
+    pipeline.add_stage('product', lambda x, y: x * y, deps=['x', 'y'])
+    assert pipeline.run()['product'] == 6
+
+
+def test_independent_stages_start_in_parallel():
+    # Each stage waits for the others; run one after another, the barrier times out
+    barrier = threading.Barrier(3, timeout=2)
+    pipeline = TurnPipeline()
+    for name in ('intent', 'context', 'raw_embedding'):
+        pipeline.add_stage(name, barrier.wait)
+    pipeline.run(get_executor())
+    assert not barrier.broken
+
+
+def test_undeclared_dependency_is_rejected():
+    pipeline = TurnPipeline()
+    with pytest.raises(ValueError):
+        pipeline.add_stage('retrieved_foods', lambda intent: intent, deps=['intent'])
+
+
+def test_stage_error_propagates():
+    def fail():
+        raise RuntimeError("model down")
+
+    pipeline = TurnPipeline()
+    pipeline.add_stage('intent', fail)
+    with pytest.raises(RuntimeError):
+        pipeline.run()
+
+
+def test_new_request_uses_speculative_query():
+    results, embedded, index = run_chat_turn({'is_followup': False})
+    assert embedded == ["something hot"]
+    assert len(index.queries) == 1
+    assert results['retrieved_foods'] is results['speculative_foods']
+
+
+def test_followup_with_unchanged_query_does_not_requery():
+    results, embedded, index = run_chat_turn({'is_followup': True, 'followup_type': 'continuation'})
+    assert embedded == ["something hot"]
+    assert len(index.queries) == 1
+    assert results['retrieved_foods'] is results['speculative_foods']
+
+
+def test_followup_with_enhanced_query_requeries():
+    results, embedded, index = run_chat_turn(
+        {'is_followup': True, 'followup_type': 'continuation'},
+        conversation_state={'last_meal_type': 'breakfast'},
+    )
+    assert embedded == ["something hot", "something hot breakfast"]
+    assert len(index.queries) == 2
+    assert results['retrieved_foods'][0]['vector'] == [2.0]
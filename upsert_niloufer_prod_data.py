@@ -1,7 +1,8 @@
 import json
 import os
-from utils.embeddings import get_embedding
-from utils.pinecone_helper import get_new_index
+from utils.embeddings import get_embeddings
+from utils.vector_backend import get_vector_index
+from utils.ingest import ingest, prod_item_text, clean_metadata
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,36 +10,22 @@ load_dotenv()
 DATA_PATH = os.path.join('data', 'niloufer-prod-date.json')
 INDEX_NAME = 'niloufer-prod-data'
 
-def clean_metadata(item):
-    # Remove keys with None values
-    return {k: v for k, v in item.items() if v is not None}
-
 # Load data
 with open(DATA_PATH, 'r', encoding='utf-8') as f:
     food_data = json.load(f)
 
 # Prepare Pinecone index
-index = get_new_index(index_name=INDEX_NAME)
-
-# Prepare vectors for upsert
-vectors = []
-for item in food_data:
-    # Use only product name and description for embedding
-    full_text = f"{item.get('ProductName', '')} {item.get('Description', '')}"
-    embedding = get_embedding(full_text)
-    vectors.append({
-        "id": item["Id"],
-        "values": embedding,
-        "metadata": clean_metadata(item)
-    })
-    if len(vectors) % 50 == 0:
-        print(f"Prepared {len(vectors)} vectors...")
-
-# Upsert in batches
-batch_size = 100
-for i in range(0, len(vectors), batch_size):
-    batch = vectors[i:i+batch_size]
-    index.upsert(vectors=batch)
-    print(f"Upserted batch {i//batch_size + 1} ({len(batch)} items)")
-
-print(f"Done! Upserted {len(vectors)} items to Pinecone index '{INDEX_NAME}'.") 
\ No newline at end of file
+index = get_vector_index(index_name=INDEX_NAME)
+
+# Embed in concurrent batches (product name and description only) and upsert as batches complete
+stats = ingest(
+    index,
+    food_data,
+    embed_batch=get_embeddings,
+    to_text=prod_item_text,
+    to_id=lambda item: item["Id"],
+    to_metadata=clean_metadata,
+    index_name=INDEX_NAME
+)
+
+print(f"Done! Upserted {stats['upsert'].items} items to Pinecone index '{INDEX_NAME}'.")
@@ -0,0 +1,305 @@
+import bisect
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Canonical meal slots; catalog 'time' strings such as "Lunch/Dinner" or "Snack time" map onto these
+MEAL_SLOTS = ('breakfast', 'lunch', 'dinner', 'snack')
+MEAL_WORDS = {
+    'breakfast': ('breakfast',), 'morning': ('breakfast',), 'brunch': ('breakfast', 'lunch'),
+    'lunch': ('lunch',), 'afternoon': ('lunch', 'snack'),
+    'dinner': ('dinner',), 'night': ('dinner',),
+    'snack': ('snack',), 'snacks': ('snack',), 'evening': ('snack', 'dinner'), 'appetizer': ('snack',),
+    'tea': ('snack',), 'dessert': ('snack', 'lunch', 'dinner'),
+    'anytime': MEAL_SLOTS, 'any': MEAL_SLOTS, 'all': MEAL_SLOTS,
+}
+
+# Spice levels as ranks: none 0, mild 1, medium 2, spicy 3
+SPICE_WORDS = {'none': 0, 'no': 0, 'mild': 1, 'low': 1, 'medium': 2, 'moderate': 2, 'high': 3, 'hot': 3, 'spicy': 3}
+SPICE_PREFERENCES = {'mild': (0, 1), 'medium': (1, 2), 'spicy': (2, 3)}
+
+ALLERGEN_ALIASES = {'milk': 'dairy', 'cheese': 'dairy', 'paneer': 'dairy', 'butter': 'dairy', 'ghee': 'dairy',
+                    'wheat': 'gluten', 'egg': 'eggs', 'nut': 'nuts', 'peanuts': 'nuts', 'cashew': 'nuts',
+                    'almonds': 'nuts', 'soya': 'soy'}
+# Dietary restrictions users state, and what each one requires of an item
+RESTRICTION_RULES = {
+    'vegetarian': {'require': 'vegetarian'}, 'veg': {'require': 'vegetarian'},
+    'vegan': {'require': 'vegan'},
+    'gluten-free': {'exclude': 'gluten'}, 'gluten free': {'exclude': 'gluten'}, 'no gluten': {'exclude': 'gluten'},
+    'dairy-free': {'exclude': 'dairy'}, 'dairy free': {'exclude': 'dairy'}, 'lactose intolerant': {'exclude': 'dairy'},
+    'nut-free': {'exclude': 'nuts'}, 'nut allergy': {'exclude': 'nuts'}, 'no nuts': {'exclude': 'nuts'},
+    'eggless': {'exclude': 'eggs'}, 'no eggs': {'exclude': 'eggs'}, 'egg-free': {'exclude': 'eggs'},
+    'soy-free': {'exclude': 'soy'},
+}
+
+
+def _values(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def parse_price(value: Any) -> Optional[float]:
+    """'620rs', 660, '857.14' -> float; None when there is no number"""
+    match = re.search(r"\d+(?:\.\d+)?", str(value or '').replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def meal_slots(value: Any) -> set:
+    slots = set()
+    for text in _values(value):
+        for word in re.findall(r"[a-z]+", text.lower()):
+            slots.update(MEAL_WORDS.get(word, ()))
+    return slots
+
+
+def spice_ranks(value: Any) -> set:
+    """'Medium-High' -> {2, 3}; unknown or 'Varied' -> every rank"""
+    ranks = {SPICE_WORDS[word] for text in _values(value)
+             for word in re.findall(r"[a-z]+", text.lower()) if word in SPICE_WORDS}
+    return ranks or {0, 1, 2, 3}
+
+
+def diet_tags(diet: Any, dietary_tags: Any) -> set:
+    tags = set()
+    for text in _values(diet) + _values(dietary_tags):
+        base = text.split('(')[0].strip().lower()
+        if base in ('vegan', 'vegetarian', 'eggless', 'gluten-free'):
+            tags.add(base)
+    if 'vegan' in tags:
+        tags.add('vegetarian')
+    return tags
+
+
+def allergen_tags(allergens: Any) -> set:
+    tags = set()
+    for text in _values(allergens):
+        for word in re.findall(r"[a-z]+", text.lower()):
+            word = ALLERGEN_ALIASES.get(word, word)
+            if word in ('dairy', 'gluten', 'eggs', 'nuts', 'soy', 'sesame', 'mustard'):
+                tags.add(word)
+    return tags
+
+
+def iter_rows(bitmap: int) -> Iterator[int]:
+    """Row numbers of the set bits, lowest first"""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+class AttributeFilter:
+    """Constraints on catalog rows.
+
+    Hard constraints (required diets, allergens) are never relaxed; preferred
+    diets (carried over from earlier turns) are soft and relaxed last.
+    """
+
+    __slots__ = ('require_diets', 'exclude_allergens', 'meal', 'spice', 'max_price', 'price_range',
+                 'prefer_diets')
+
+    def __init__(self, require_diets: Iterable[str] = (), exclude_allergens: Iterable[str] = (),
+                 meal: Optional[str] = None, spice: Optional[str] = None,
+                 max_price: Optional[float] = None, price_range: Optional[str] = None,
+                 prefer_diets: Iterable[str] = ()):
+        self.require_diets = tuple(sorted(set(require_diets)))
+        self.exclude_allergens = tuple(sorted(set(exclude_allergens)))
+        self.meal = meal
+        self.spice = spice
+        self.max_price = max_price
+        self.price_range = price_range
+        self.prefer_diets = tuple(sorted(set(prefer_diets)))
+
+    @classmethod
+    def from_conversation(cls, user_preferences: Dict[str, Any], conversation_state: Dict[str, Any]) -> 'AttributeFilter':
+        """Constraints the user has stated so far; later state wins over older preferences"""
+        require, exclude = set(), set()
+        restrictions = _values(user_preferences.get('dietary_restrictions')) + _values(conversation_state.get('last_dietary'))
+        for restriction in restrictions:
+            rule = RESTRICTION_RULES.get(restriction.strip().lower())
+            if rule and 'require' in rule:
+                require.add(rule['require'])
+            elif rule:
+                exclude.add(rule['exclude'])
+
+        meal = None
+        for value in (conversation_state.get('last_meal_type'), user_preferences.get('meal_type')):
+            slots = meal_slots(value)
+            if len(slots) == 1:
+                meal = slots.pop()
+                break
+
+        spice = str(user_preferences.get('spice_level') or '').lower() or None
+        # A stated amount (price_ceiling) is exact; otherwise the low/medium/high bucket is mapped to catalog prices
+        if conversation_state.get('last_price_range') or conversation_state.get('last_price_ceiling'):
+            price_text, max_price = conversation_state.get('last_price_range'), conversation_state.get('last_price_ceiling')
+        else:
+            price_text, max_price = user_preferences.get('price_range'), user_preferences.get('price_ceiling')
+        if max_price is None:
+            max_price = parse_price(price_text)  # states saved before price_ceiling held "under <amount>"
+        price_range = None if max_price is not None else (str(price_text).lower() if price_text else None)
+        return cls(require, exclude, meal, spice if spice in SPICE_PREFERENCES else None, max_price, price_range)
+
+    @classmethod
+    def for_turn(cls, context: Dict[str, Any], preferences: Dict[str, Any], user_preferences: Dict[str, Any],
+                 conversation_state: Dict[str, Any], is_followup: bool) -> 'AttributeFilter':
+        """Constraints for one turn: what the current message states, plus earlier ones on a follow-up.
+
+        context and preferences are the current message's analysis. Allergen
+        exclusions always carry over. Earlier diet, meal, spice and price
+        constraints carry over only on a follow-up, and never over a value
+        the message states itself; a carried-over diet is only preferred.
+        """
+        current = cls.from_conversation(
+            {'dietary_restrictions': _values(preferences.get('dietary_restrictions')),
+             'meal_type': preferences.get('meal_type'), 'spice_level': preferences.get('spice_level'),
+             'price_range': preferences.get('price_range'), 'price_ceiling': preferences.get('price_ceiling')},
+            {'last_dietary': context.get('dietary'), 'last_meal_type': context.get('meal_type'),
+             'last_price_range': context.get('price_range'), 'last_price_ceiling': context.get('price_ceiling')},
+        )
+        earlier = cls.from_conversation(user_preferences, conversation_state)
+        if not is_followup:
+            earlier = cls(exclude_allergens=earlier.exclude_allergens)
+        stated_diet = current.require_diets or context.get('dietary') or _values(preferences.get('dietary_restrictions'))
+        stated_price = current.max_price is not None or current.price_range
+        return cls(
+            require_diets=current.require_diets,
+            exclude_allergens=current.exclude_allergens + earlier.exclude_allergens,
+            meal=current.meal or earlier.meal,
+            spice=current.spice or earlier.spice,
+            max_price=current.max_price if stated_price else earlier.max_price,
+            price_range=current.price_range if stated_price else earlier.price_range,
+            prefer_diets=() if stated_diet else earlier.require_diets,
+        )
+
+    def is_empty(self) -> bool:
+        return not (self.require_diets or self.exclude_allergens or self.meal or self.spice
+                    or self.max_price is not None or self.price_range or self.prefer_diets)
+
+    def describe(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) not in (None, ())}
+
+
+class AttributeIndex:
+    """Bitset per attribute value plus a sorted price index over catalog rows.
+
+    Bit i of a bitmap stands for catalog row i, so filters combine with
+    integer &, | and ~ regardless of catalog size.
+    """
+
+    # Soft constraints are dropped in this order when too few rows qualify
+    RELAX_ORDER = ('spice', 'meal', 'price', 'diet')
+
+    def __init__(self, records: Sequence[Any], items: Sequence[Dict[str, Any]]):
+        self.bitmaps: Dict[Tuple[str, Any], int] = {}
+        self.schema_rows: Dict[str, int] = {}
+        self.schema_attributes: Dict[str, set] = {}
+        prices: Dict[str, List[Tuple[float, int]]] = {}
+        for row, (record, item) in enumerate(zip(records, items)):
+            bit = 1 << row
+            self.schema_rows[record.schema] = self.schema_rows.get(record.schema, 0) | bit
+            self.schema_attributes.setdefault(record.schema, set()).update(
+                attribute for attribute, field in (('meal', 'time'), ('spice', 'spice_level'),
+                                                   ('diet', 'diet'), ('allergen', 'allergens'))
+                if field in item
+            )
+            for slot in meal_slots(item.get('time')):
+                self._add(('meal', slot), bit)
+            if 'spice_level' in item:
+                for rank in spice_ranks(item.get('spice_level')):
+                    self._add(('spice', rank), bit)
+            for tag in diet_tags(item.get('diet'), item.get('dietary_tags')):
+                self._add(('diet', tag), bit)
+            for tag in allergen_tags(item.get('allergens')):
+                self._add(('allergen', tag), bit)
+            price = parse_price(record.price)
+            if price is not None:
+                prices.setdefault(record.schema, []).append((price, row))
+
+        # Sorted prices with prefix bitmaps: rows priced at or below prices[i] are prefix[i + 1]
+        self.prices: Dict[str, List[float]] = {}
+        self.price_prefix: Dict[str, List[int]] = {}
+        for schema, pairs in prices.items():
+            pairs.sort()
+            prefix = [0]
+            for _, row in pairs:
+                prefix.append(prefix[-1] | (1 << row))
+            self.prices[schema] = [price for price, _ in pairs]
+            self.price_prefix[schema] = prefix
+
+    def _add(self, key: Tuple[str, Any], bit: int) -> None:
+        self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+
+    def rows_with(self, attribute: str, value: Any) -> int:
+        return self.bitmaps.get((attribute, value), 0)
+
+    def priced_at_most(self, schema: str, ceiling: float) -> int:
+        prices = self.prices.get(schema, [])
+        return self.price_prefix[schema][bisect.bisect_right(prices, ceiling)] if prices else 0
+
+    def price_ceiling(self, schema: str, price_range: str) -> Optional[float]:
+        """'low' / 'medium' map to the catalog's lower third / two thirds of prices"""
+        prices = self.prices.get(schema)
+        share = {'low': 1 / 3, 'budget': 1 / 3, 'cheap': 1 / 3, 'medium': 2 / 3, 'moderate': 2 / 3}.get(price_range)
+        if not prices or share is None:
+            return None
+        return prices[min(int(len(prices) * share), len(prices) - 1)]
+
+    def _constraint(self, name: str, attribute_filter: AttributeFilter, schema: str) -> Optional[int]:
+        if name in ('meal', 'spice', 'diet') and name not in self.schema_attributes.get(schema, ()):
+            return None
+        if name == 'diet' and attribute_filter.prefer_diets:
+            bitmap = self.schema_rows.get(schema, 0)
+            for diet in attribute_filter.prefer_diets:
+                bitmap &= self.rows_with('diet', diet)
+            return bitmap
+        if name == 'meal' and attribute_filter.meal:
+            return self.rows_with('meal', attribute_filter.meal)
+        if name == 'spice' and attribute_filter.spice:
+            bitmap = 0
+            for rank in SPICE_PREFERENCES[attribute_filter.spice]:
+                bitmap |= self.rows_with('spice', rank)
+            return bitmap
+        if name == 'price':
+            ceiling = attribute_filter.max_price
+            if ceiling is None and attribute_filter.price_range:
+                ceiling = self.price_ceiling(schema, attribute_filter.price_range)
+            if ceiling is not None and schema in self.prices:
+                return self.priced_at_most(schema, ceiling)
+        return None
+
+    def evaluate(self, attribute_filter: AttributeFilter, schema: str, min_rows: int = 5) -> Tuple[int, List[str]]:
+        """(bitmap of qualifying rows, names of the constraints applied).
+
+        Soft constraints are relaxed in RELAX_ORDER until at least min_rows
+        qualify. Constraints on attributes this schema does not have are skipped.
+        """
+        universe = self.schema_rows.get(schema, 0)
+        attributes = self.schema_attributes.get(schema, set())
+        hard = universe
+        applied = []
+        if 'diet' in attributes:
+            for diet in attribute_filter.require_diets:
+                hard &= self.rows_with('diet', diet)
+                applied.append(f"diet:{diet}")
+        if 'allergen' in attributes:
+            for allergen in attribute_filter.exclude_allergens:
+                hard &= ~self.rows_with('allergen', allergen)
+                applied.append(f"no:{allergen}")
+
+        soft = {}
+        for name in ('meal', 'spice', 'price', 'diet'):
+            bitmap = self._constraint(name, attribute_filter, schema)
+            if bitmap is not None and bitmap & universe:
+                soft[name] = bitmap
+        for name in self.RELAX_ORDER + (None,):
+            bitmap = hard
+            for constraint in soft.values():
+                bitmap &= constraint
+            if bin(bitmap).count('1') >= min_rows or not soft:
+                return bitmap, applied + sorted(soft)
+            if name in soft:
+                del soft[name]
+        return hard, applied
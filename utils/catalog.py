@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.attribute_index import AttributeIndex, AttributeFilter, iter_rows
+from utils.lexical_index import BM25Index, tokenize
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+DEFAULT_CATALOG_PATHS = (
+    os.path.join(DATA_DIR, 'niloufer.json'),
+    os.path.join(DATA_DIR, 'niloufer-prod-date.json'),
+)
+
+MENU_SCHEMA = 'menu'  # niloufer.json / food_items.json: id, name, description, ...
+PROD_SCHEMA = 'prod'  # prod feed: Id, ProductName, Description, Price, ...
+
+# Fields indexed for lexical search, with how many times each field's tokens count
+SEARCH_FIELDS = {
+    MENU_SCHEMA: {'name': 3, 'keywords': 2, 'description': 1, 'category': 1, 'cuisine': 1, 'ingredients': 1},
+    PROD_SCHEMA: {'ProductName': 3, 'Description': 1, 'KioskCategoryName': 1, 'SubCategoryName': 1},
+}
+
+
+def id_field(schema: str) -> str:
+    """Metadata key holding the item id in a schema's vector index"""
+    return 'Id' if schema == PROD_SCHEMA else 'id'
+
+
+def detect_schema(item: Dict[str, Any]) -> str:
+    return PROD_SCHEMA if 'ProductName' in item or 'Id' in item else MENU_SCHEMA
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(v) for v in value)
+    return str(value)
+
+
+class FoodRecord:
+    """One catalog item in a schema-independent shape, with its prompt lines rendered once"""
+
+    __slots__ = ('schema', 'id', 'name', 'description', 'price', 'image_url', 'category',
+                 'region', 'mood', 'time', 'diet', 'spice_level', 'snippet', 'listing', 'summary')
+
+    def __init__(self, schema: str, id: str, name: str, description: str, price: str, image_url: str,
+                 category: str, region: str = '', mood: str = '', time: str = '', diet: str = '',
+                 spice_level: str = ''):
+        self.schema = schema
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.image_url = image_url
+        self.category = category
+        self.region = region
+        self.mood = mood
+        self.time = time
+        self.diet = diet
+        self.spice_level = spice_level
+        self.snippet = self._render_snippet()
+        self.listing = f"[ID:{id}] {name} - {description} - {image_url} - {price}"
+        self.summary = f"- {name}: {description}"
+
+    def _render_snippet(self) -> str:
+        """Line for the contextual chat prompt"""
+        if self.schema == MENU_SCHEMA:
+            attributes = f"Region: {self.region}, Mood: {self.mood}, Time: {self.time}, Diet: {self.diet}, Price: {self.price or 'N/A'}"
+        else:
+            attributes = f"Category: {self.category or 'N/A'}, Price: {self.price or 'N/A'}"
+        return f"[ID:{self.id or 'N/A'}] {self.name}: {self.description} ({attributes})"
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'FoodRecord':
+        """Normalize a raw catalog item or vector-index metadata dict of either schema"""
+        if detect_schema(item) == PROD_SCHEMA:
+            return cls(
+                PROD_SCHEMA,
+                id=_text(item.get('Id')),
+                name=_text(item.get('ProductName')),
+                description=_text(item.get('Description')),
+                price=_text(item.get('Price')),
+                image_url=_text(item.get('Image')),
+                category=_text(item.get('KioskCategoryName') or item.get('CategoryTitle')),
+            )
+        return cls(
+            MENU_SCHEMA,
+            id=_text(item.get('id')),
+            name=_text(item.get('name')),
+            description=_text(item.get('description')),
+            price=_text(item.get('price')),
+            image_url=_text(item.get('image_url')),
+            category=_text(item.get('category')),
+            region=_text(item.get('region')),
+            mood=_text(item.get('mood')),
+            time=_text(item.get('time')),
+            diet=_text(item.get('diet')),
+            spice_level=_text(item.get('spice_level')),
+        )
+
+
+def search_tokens(item: Dict[str, Any], schema: str) -> List[str]:
+    tokens = []
+    for field, weight in SEARCH_FIELDS[schema].items():
+        tokens.extend(tokenize(_text(item.get(field))) * weight)
+    return tokens
+
+
+class FoodCatalog:
+    """All known catalog items as FoodRecords, with an (schema, id) -> row index.
+
+    Lookups take the raw dicts that flow through the app (vector-index metadata,
+    stored recommendations) and return the shared record; items that are not in
+    the loaded files are normalized on the fly. items holds each row's raw item
+    in the shape the vector index stores as metadata. A BM25 index per schema
+    and bitmap attribute indexes are built alongside.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = ()):
+        # Vector metadata never carries None values (see ingest.clean_metadata)
+        self.items: Tuple[Dict[str, Any], ...] = tuple(
+            {k: v for k, v in item.items() if v is not None} for item in items
+        )
+        self.records: Tuple[FoodRecord, ...] = tuple(FoodRecord.from_item(item) for item in self.items)
+        self.index: Dict[Tuple[str, str], int] = {
+            (record.schema, record.id): row for row, record in enumerate(self.records)
+        }
+        self.lexical: Dict[str, BM25Index] = {
+            schema: BM25Index(
+                (row, search_tokens(self.items[row], schema))
+                for row, record in enumerate(self.records) if record.schema == schema
+            )
+            for schema in SEARCH_FIELDS
+        }
+        self.attributes = AttributeIndex(self.records, self.items)
+
+    @classmethod
+    def load(cls, paths: Iterable[str] = DEFAULT_CATALOG_PATHS) -> 'FoodCatalog':
+        items = []
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    items.extend(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not load catalog {path}: {str(e)}")
+        return cls(items)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, food_id: Any, schema: str = MENU_SCHEMA) -> Optional[FoodRecord]:
+        row = self.index.get((schema, str(food_id)))
+        return self.records[row] if row is not None else None
+
+    def key_for(self, item: Dict[str, Any]) -> Tuple[str, str]:
+        schema = detect_schema(item)
+        return schema, str(item.get('Id') if schema == PROD_SCHEMA else item.get('id'))
+
+    def key_for_row(self, row: int) -> Tuple[str, str]:
+        record = self.records[row]
+        return record.schema, record.id
+
+    def record(self, item: Dict[str, Any]) -> FoodRecord:
+        schema, food_id = self.key_for(item)
+        return self.get(food_id, schema) or FoodRecord.from_item(item)
+
+    def search(self, query: str, schema: str, top_k: int = 20,
+               allowed_ids: Optional[Iterable[str]] = None) -> List[Tuple[int, float]]:
+        """BM25 (row, score) matches among the catalog's items of one schema, optionally only allowed_ids"""
+        allowed = None
+        if allowed_ids is not None:
+            allowed = 0
+            for food_id in allowed_ids:
+                row = self.index.get((schema, str(food_id)))
+                if row is not None:
+                    allowed |= 1 << row
+        return self.lexical[schema].search(query, top_k, allowed)
+
+    def candidates(self, attribute_filter: AttributeFilter, schema: str, min_rows: int = 5) -> Tuple[int, List[str]]:
+        """Bitmap of rows satisfying the filter and the constraints that were applied"""
+        return self.attributes.evaluate(attribute_filter, schema, min_rows)
+
+    def vocabulary(self, schema: str) -> frozenset:
+        """Every search token of a schema's items"""
+        return frozenset(self.lexical[schema].postings)
+
+    def ids_in(self, bitmap: int) -> List[str]:
+        return [self.records[row].id for row in iter_rows(bitmap)]
+
+    def records_for(self, items: Iterable[Dict[str, Any]]) -> List[FoodRecord]:
+        return [self.record(item) for item in items]
+
+
+_catalog: Optional[FoodCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> FoodCatalog:
+    """Process-wide catalog, loaded on first use (before the fork when the app is preloaded)"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = FoodCatalog.load()
+        return _catalog
+
+
+def snippet_lines(items: Iterable[Dict[str, Any]]) -> List[str]:
+    return [record.snippet for record in get_catalog().records_for(items)]
+
+
+def listing_lines(items: Iterable[Dict[str, Any]]) -> List[str]:
+    return [record.listing for record in get_catalog().records_for(items)]
+
+
+def format_summaries(items: Iterable[Dict[str, Any]]) -> str:
+    return "\n".join(record.summary for record in get_catalog().records_for(items))
+
+
+def food_names(items: Iterable[Dict[str, Any]]) -> List[str]:
+    return [record.name for record in get_catalog().records_for(items)]
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import pytz
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+IST = pytz.timezone('Asia/Kolkata')
+WEATHER_TTL = int(os.getenv("WEATHER_TTL_SECONDS", "600"))
+HOLIDAY_TTL = int(os.getenv("HOLIDAY_TTL_SECONDS", "86400"))
+REQUEST_TIMEOUT = (3.05, 5)  # connect, read
+REFRESH_AHEAD = 0.8  # refresh once 80% of the TTL has passed
+ERROR_BACKOFF = 60  # seconds before retrying an upstream that failed
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=1)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CachedSource:
+    """One upstream data source with a TTL, refresh-ahead and stale-on-error serving.
+
+    get() never waits on the network unless asked to: it returns the cached value
+    (even when expired) and schedules a background refresh when the value is
+    ageing, expired, missing or belongs to an older key (e.g. last month).
+    """
+
+    def __init__(self, name: str, fetch: Callable[[Any], Any], ttl: float,
+                 key: Callable[[], Any] = lambda: None):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.key = key
+        self.value = None
+        self.value_key = None
+        self.fetched_at = 0.0
+        self.retry_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale': 0, 'empty': 0, 'refreshes': 0, 'errors': 0}
+
+    def refresh(self) -> None:
+        key = self.key()
+        try:
+            value = self.fetch(key)
+            with self._lock:
+                self.value, self.value_key, self.fetched_at = value, key, time.time()
+                self.stats['refreshes'] += 1
+        except Exception as e:
+            # Keep serving the previous value while the upstream is down
+            with self._lock:
+                self.stats['errors'] += 1
+                self.retry_at = time.time() + ERROR_BACKOFF
+            print(f"Warning: Could not fetch {self.name} data: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _schedule_refresh(self, executor: ThreadPoolExecutor) -> None:
+        with self._lock:
+            if self._refreshing or time.time() < self.retry_at:
+                return
+            self._refreshing = True
+        executor.submit(self.refresh)
+
+    def get(self, executor: ThreadPoolExecutor, block: bool = False) -> Any:
+        if block and self.value is None:
+            with self._lock:
+                self._refreshing = True
+            self.refresh()
+        with self._lock:
+            age = time.time() - self.fetched_at
+            value = self.value
+            current = self.value_key == self.key()
+            if value is None:
+                self.stats['empty'] += 1
+            elif current and age < self.ttl:
+                self.stats['hits'] += 1
+            else:
+                self.stats['stale'] += 1
+        if value is None or not current or age >= self.ttl * REFRESH_AHEAD:
+            self._schedule_refresh(executor)
+        return value
+
+
+class ContextProvider:
+    """Weather, time and holiday context for prompts, served from per-source TTL caches"""
+
+    def __init__(self, location: str = 'Hyderabad,IN', country: str = 'IN'):
+        self.location = location
+        self.country = country
+        self._session = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.weather = CachedSource('weather', self._fetch_weather, WEATHER_TTL)
+        self.holidays = CachedSource('holiday', self._fetch_holidays, HOLIDAY_TTL, key=self._holiday_month)
+
+    def _resources(self):
+        # Sessions and threads are per process; a preloaded app must not share them across a fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._session = _make_session()
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='context-refresh')
+                self._pid = os.getpid()
+            return self._session, self._executor
+
+    @staticmethod
+    def _holiday_month():
+        now = datetime.now(IST)
+        return now.year, now.month
+
+    def _fetch_weather(self, _key) -> Optional[Dict[str, Any]]:
+        weather_api_key = os.getenv("WEATHER_API_KEY")
+        if not weather_api_key:
+            return None
+        session, _ = self._resources()
+        response = session.get(
+            "http://api.openweathermap.org/data/2.5/weather",
+            params={
+                'q': self.location,
+                'appid': weather_api_key,
+                'units': 'metric'
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        weather_data = response.json()
+        return {
+            'temperature': weather_data['main']['temp'],
+            'description': weather_data['weather'][0]['description'],
+            'humidity': weather_data['main']['humidity']
+        }
+
+    def _fetch_holidays(self, key):
+        holiday_api_key = os.getenv("HOLIDAY_API_KEY")
+        if not holiday_api_key:
+            return None
+        year, month = key
+        session, _ = self._resources()
+        response = session.get(
+            "https://calendarific.com/api/v2/holidays",
+            params={
+                'api_key': holiday_api_key,
+                'country': self.country,
+                'year': year,
+                'month': month
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        holidays = response.json().get('response', {}).get('holidays', [])
+        return [
+            {
+                'name': holiday['name'],
+                'date': holiday['date']['iso']
+            }
+            for holiday in holidays
+        ]
+
+    def get_context(self, block: bool = False) -> Dict[str, Any]:
+        """Get weather, time, and holiday information without waiting on the APIs (unless block)"""
+        _, executor = self._resources()
+        current_time = datetime.now(IST)
+        context = {
+            'time': {
+                'hour': current_time.hour,
+                'day': current_time.strftime('%A'),
+                'date': current_time.strftime('%Y-%m-%d')
+            }
+        }
+        weather = self.weather.get(executor, block=block)
+        if weather:
+            context['weather'] = weather
+        holidays = self.holidays.get(executor, block=block)
+        if holidays is not None:
+            context['holidays'] = holidays
+        return context
+
+    def warm(self) -> None:
+        """Start background fetches so the first chat already has context"""
+        _, executor = self._resources()
+        self.weather.get(executor)
+        self.holidays.get(executor)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {'weather': dict(self.weather.stats), 'holidays': dict(self.holidays.stats)}
+
+
+context_provider = ContextProvider()
+
+
+def get_contextual_info(block: bool = False) -> Dict[str, Any]:
+    """Get weather, time, and holiday information"""
+    return context_provider.get_context(block=block)
@@ -1,16 +1,70 @@
 import google.generativeai as genai
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 import json
+import os
 import re
+import threading
+import time
+from utils.unified_analyzer import (
+    ANALYZER_MODES, INTENT_DEFAULTS, LEGACY_MODE, UNIFIED_MODE, describe_schema, validate_unified_analysis
+)
+from utils.catalog import food_names, format_summaries, snippet_lines
+from utils.local_analyzer import get_local_analyzer
+from utils.prompt_builder import PromptBuilder
+
+# Exchanges rendered verbatim in prompts; older ones live on as one summary line each
+RECENT_EXCHANGES = 3
+SUMMARY_MAX_LINES = 20
+
+CHAT_INSTRUCTIONS = """Instructions:
+1. Respond naturally as if you're having a friendly conversation
+2. Consider the entire conversation context and user's preferences
+3. If it's a follow-up question:
+   - Acknowledge the connection to previous context
+   - Reference specific items or preferences mentioned earlier
+   - Maintain consistency with previous recommendations
+   - If the user is asking about a specific item mentioned earlier, focus on that item
+   - If the user is asking for more options, provide alternatives that match the previous context
+4. Make personalized recommendations based on user's preferences and constraints
+5. Keep the response concise but informative
+6. Do not use any HTML tags or special formatting
+7. IMPORTANT: When discussing calories or nutritional information:
+   - Only mention calorie counts when:
+     * The user specifically asks about calories
+     * The user asks about low/high calorie options
+     * The user mentions health, diet, or weight-related concerns
+     * The calorie information is crucial for the recommendation
+   - When calories are not relevant to the query, focus on other aspects like taste, ingredients, and preparation
+8. At the end of your response, add a line with the recommended food IDs in this format:
+   [RECOMMENDED_FOODS:ID1,ID2,ID3]
+   Only include IDs of foods you actually recommend in your response.
+
+Provide your response:"""
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(str(text or '').split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+def _describe_budget(price_range: Optional[str], price_ceiling: Optional[float]) -> str:
+    """'low (up to 200)', 'low' or 'up to 200'"""
+    amount = f"up to {price_ceiling:g}" if price_ceiling is not None else ''
+    if price_range and amount:
+        return f"{price_range} ({amount})"
+    return price_range or amount
 
 class ConversationManager:
-    def __init__(self):
+    def __init__(self, analyzer_mode: str = None):
         self.conversation_history: List[Dict[str, Any]] = []
         self.context_window = 10
+        # Rolling summary of exchanges that left the verbatim window, one line per exchange
+        self.conversation_summary: List[str] = []
         self.user_preferences = {
             'dietary_restrictions': [],
             'price_range': None,
+            'price_ceiling': None,
             'meal_type': None,
             'cuisine_preferences': [],
             'spice_level': None,
@@ -28,6 +82,7 @@ class ConversationManager:
             'last_meal_type': None,
             'last_cuisine': None,
             'last_price_range': None,
+            'last_price_ceiling': None,
             'last_dietary': None
         }
         self.model = genai.GenerativeModel('gemini-2.0-flash')
@@ -37,37 +92,170 @@ class ConversationManager:
             "top_k": 40,
             "max_output_tokens": 1024,
         }
+        # Turn-scoped memo of LLM analyses, keyed by the
+        # history version so any state change starts a fresh turn
+        self.history_version = 0
+        self._turn_cache: Dict[Any, Any] = {}
+        self._turn_cache_lock = threading.Lock()
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        # Rendered conversation context, kept per section and re-rendered only where it changed.
+        # Exchange blocks are rendered once on add and trimmed from the left as they age out.
+        self._context_lock = threading.RLock()
+        self._context_sections: Dict[str, Optional[str]] = {'preferences': None, 'state': None}
+        self._exchange_blocks: Optional[deque] = None
+        self._rendered_context: Optional[str] = None
+        self.render_stats = {'context_joins': 0, 'section_renders': 0, 'exchange_renders': 0}
+        # 'legacy' makes three JSON-extraction calls per turn, 'unified' makes one
+        self.analyzer_mode = analyzer_mode or os.getenv("ANALYZER_MODE", LEGACY_MODE)
+        if self.analyzer_mode not in ANALYZER_MODES:
+            raise ValueError(f"Unknown analyzer mode: {self.analyzer_mode}")
+        self.analyzer_stats = {'calls': 0, 'seconds': 0.0, 'prompt_chars': 0, 'response_chars': 0, 'local': 0}
+
+    def _call_model(self, prompt: str):
+        """Run a JSON-extraction call and record its latency and size for the analyzer stats"""
+        start = time.perf_counter()
+        try:
+            response = self.model.generate_content(
+                prompt,
+                generation_config=self.generation_config
+            )
+        finally:
+            self.analyzer_stats['calls'] += 1
+            self.analyzer_stats['seconds'] += time.perf_counter() - start
+            self.analyzer_stats['prompt_chars'] += len(prompt)
+        self.analyzer_stats['response_chars'] += len(response.text or '')
+        return response
+
+    def local_analysis(self, user_input: str) -> Dict[str, Dict[str, Any]]:
+        """Rule-based analysis of user_input, whatever its confidence, at most once per turn"""
+        return self._memoize('local', user_input, lambda: get_local_analyzer().analyze(
+            user_input, self.conversation_state.get('last_recommendations', []), bool(self.conversation_history)
+        ))
+
+    def _fast_path(self, kind: str, user_input: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Rule-based analysis of user_input when it is confident enough to replace a model call of this kind"""
+        analysis = get_local_analyzer().accept(kind, self.local_analysis(user_input))
+        if analysis is not None:
+            self.analyzer_stats['local'] += 1
+        return analysis
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable snapshot of the conversation state, for the shared state store"""
+        return {
+            'conversation_history': [
+                dict(exchange, timestamp=exchange['timestamp'].isoformat())
+                for exchange in self.conversation_history
+            ],
+            'user_preferences': self.user_preferences,
+            'conversation_state': self.conversation_state,
+            'conversation_summary': self.conversation_summary,
+            'history_version': self.history_version,
+            'analyzer_mode': self.analyzer_mode
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ConversationManager':
+        manager = cls(analyzer_mode=data.get('analyzer_mode'))
+        manager.conversation_history = [
+            dict(exchange, timestamp=datetime.fromisoformat(exchange['timestamp']))
+            for exchange in data.get('conversation_history', [])
+        ]
+        manager.user_preferences.update(data.get('user_preferences', {}))
+        manager.conversation_state.update(data.get('conversation_state', {}))
+        manager.conversation_summary = list(data.get('conversation_summary', []))
+        manager.history_version = data.get('history_version', 0)
+        return manager
+
+    def _bump_history_version(self) -> None:
+        """Mark history/preferences/state as changed and drop the turn cache"""
+        with self._turn_cache_lock:
+            self.history_version += 1
+            self._turn_cache.clear()
+
+    def _memoize(self, kind: str, user_input: Any, compute):
+        """Return the cached result for (kind, user_input) in the current turn, computing it at most once"""
+        key = (kind, user_input, self.history_version)
+        with self._turn_cache_lock:
+            if key in self._turn_cache:
+                self.cache_stats['hits'] += 1
+                return self._turn_cache[key]
+            self.cache_stats['misses'] += 1
+        result = compute()
+        with self._turn_cache_lock:
+            if key[2] == self.history_version:
+                self._turn_cache[key] = result
+        return result
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counts for the turn cache, plus context render counts"""
+        with self._turn_cache_lock:
+            total = self.cache_stats['hits'] + self.cache_stats['misses']
+            return {
+                'hits': self.cache_stats['hits'],
+                'misses': self.cache_stats['misses'],
+                'hit_rate': self.cache_stats['hits'] / total if total else 0.0,
+                'history_version': self.history_version,
+                'context_renders': dict(self.render_stats)
+            }
 
     def add_exchange(self, user_input: str, ai_response: str, retrieved_foods: List[Dict[str, Any]]) -> None:
         """Add a conversation exchange to the history and update conversation state"""
+        # The unified analysis for this input is normally already cached from the turn
+        analysis = self._unified_analysis(user_input) if self.analyzer_mode == UNIFIED_MODE else None
+
         self.conversation_history.append({
             "user_input": user_input,
             "ai_response": ai_response,
             "retrieved_foods": retrieved_foods,
             "timestamp": datetime.utcnow()
         })
+        if len(self.conversation_history) > RECENT_EXCHANGES:
+            self._summarize_exchange(self.conversation_history[-RECENT_EXCHANGES - 1])
+        self._append_exchange_block(self.conversation_history[-1])
         
         if len(self.conversation_history) > self.context_window:
             self.conversation_history.pop(0)
+        self._bump_history_version()
 
         # Update user preferences using AI
-        self._update_user_preferences(user_input)
+        if analysis is not None:
+            self._apply_preferences(analysis['preferences'])
+        else:
+            self._update_user_preferences(user_input)
+        self._bump_history_version()
         
         # Update conversation state
-        self._update_conversation_state(user_input, ai_response, retrieved_foods)
+        context = analysis['context'] if analysis is not None else None
+        self._update_conversation_state(user_input, ai_response, retrieved_foods, context)
+        self._bump_history_version()
+
+    def _summarize_exchange(self, exchange: Dict[str, Any]) -> None:
+        """Fold an exchange leaving the verbatim window into the rolling summary"""
+        names = food_names(exchange.get('retrieved_foods', []))
+        line = f"- User asked: {_shorten(exchange['user_input'], 100)}"
+        line += f"; suggested: {', '.join(names)}" if names else f"; replied: {_shorten(exchange['ai_response'], 80)}"
+        self.conversation_summary.append(line)
+        del self.conversation_summary[:-SUMMARY_MAX_LINES]
 
-    def _update_conversation_state(self, user_input: str, ai_response: str, retrieved_foods: List[Dict[str, Any]]) -> None:
+    def _update_conversation_state(self, user_input: str, ai_response: str, retrieved_foods: List[Dict[str, Any]],
+                                   context: Dict[str, Any] = None) -> None:
         """Update the conversation state using AI analysis"""
-        # Extract context using AI
-        context = self._extract_context_with_ai(user_input)
+        # Extract context using AI unless the unified analysis already provided it
+        if context is None:
+            context = self._extract_context_with_ai(user_input)
         
         # Update state based on AI analysis
+        rendered_before = self._rendered_state_values()
         if context.get('meal_type'):
             self.conversation_state['last_meal_type'] = context['meal_type']
         if context.get('dietary'):
             self.conversation_state['last_dietary'] = context['dietary']
-        if context.get('price_range'):
-            self.conversation_state['last_price_range'] = context['price_range']
+        if context.get('price_range') or context.get('price_ceiling') is not None:
+            # A new budget replaces both halves, so a bucket from the model drops an older stated amount
+            self.conversation_state['last_price_range'] = context.get('price_range')
+            self.conversation_state['last_price_ceiling'] = context.get('price_ceiling')
+        if self._rendered_state_values() != rendered_before:
+            self._invalidate_context('state')
         if context.get('cuisine'):
             self.conversation_state['last_cuisine'] = context['cuisine']
 
@@ -88,6 +276,10 @@ class ConversationManager:
 
     def _extract_context_with_ai(self, text: str) -> Dict[str, Any]:
         """Use AI to extract context and preferences from text"""
+        local = self._fast_path('context', text)
+        if local is not None:
+            return dict(local['context'])
+
         prompt = f"""Analyze the following text and extract relevant food-related context.
         Text: {text}
         
@@ -103,10 +295,7 @@ class ConversationManager:
         Return ONLY the JSON object, no other text."""
 
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
-            )
+            response = self._call_model(prompt)
             if not response.text or not response.text.strip():
                 print(f"Error extracting context: Model returned empty response. Raw output: '{response.text}'")
                 return {}
@@ -122,6 +311,11 @@ class ConversationManager:
 
     def _update_user_preferences(self, user_input: str) -> None:
         """Update user preferences using AI analysis"""
+        local = self._fast_path('preferences', user_input)
+        if local is not None:
+            self._apply_preferences(local['preferences'])
+            return
+
         prompt = f"""Analyze the following user input and extract their food preferences. 
         Consider the entire conversation context and previous preferences.
         
@@ -144,10 +338,7 @@ class ConversationManager:
         Return ONLY the JSON object, no other text."""
 
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
-            )
+            response = self._call_model(prompt)
             if not response.text or not response.text.strip():
                 print(f"Error updating preferences: Model returned empty response. Raw output: '{response.text}'")
                 return
@@ -157,15 +348,80 @@ class ConversationManager:
             except Exception as je:
                 print(f"Error updating preferences: Could not parse JSON. Raw output: '{response.text}'. Error: {je}")
                 return
-            # Update only the fields that were determined
-            for key, value in preferences.items():
-                if value is not None and value != []:
-                    self.user_preferences[key] = value
+            self._apply_preferences(preferences)
         except Exception as e:
             print(f"Error updating preferences: {str(e)}")
 
+    def _apply_preferences(self, preferences: Dict[str, Any]) -> None:
+        """Update only the preference fields that were determined"""
+        changed = False
+        for key, value in preferences.items():
+            if value is not None and value != [] and self.user_preferences.get(key) != value:
+                self.user_preferences[key] = value
+                changed = True
+        # A budget bucket without a stated amount replaces the older amount
+        if (preferences.get('price_range') and preferences.get('price_ceiling') is None
+                and self.user_preferences.get('price_ceiling') is not None):
+            self.user_preferences['price_ceiling'] = None
+            changed = True
+        if changed:
+            self._invalidate_context('preferences')
+
     def analyze_user_intent(self, user_input: str) -> Dict[str, Any]:
+        """Analyze user intent, at most once per user input and history version"""
+        if self.analyzer_mode == UNIFIED_MODE:
+            intent_analysis = dict(self._unified_analysis(user_input)['intent'])
+            intent_analysis['user_preferences'] = self.user_preferences
+            intent_analysis['conversation_state'] = self.conversation_state
+            return intent_analysis
+        return self._memoize('intent', user_input, lambda: self._analyze_user_intent(user_input))
+
+    def _unified_analysis(self, user_input: str) -> Dict[str, Dict[str, Any]]:
+        """Single-call intent, preference and context extraction, at most once per turn"""
+        return self._memoize('unified', user_input,
+                             lambda: self._fast_path('unified', user_input) or self._run_unified_analysis(user_input))
+
+    def _run_unified_analysis(self, user_input: str) -> Dict[str, Dict[str, Any]]:
+        """Use one AI call to fill the intent dict, user preferences and conversation context"""
+        prompt = f"""Analyze this food conversation and the current user input.
+        
+        Previous preferences: {self.user_preferences}
+        Previous conversation:
+        {self.get_conversation_context()}
+        
+        Current conversation state:
+        - Last meal type: {self.conversation_state['last_meal_type']}
+        - Last dietary preference: {self.conversation_state['last_dietary']}
+        - Last price range: {self.conversation_state['last_price_range']}
+        - Last recommendations: {food_names(self.conversation_state['last_recommendations'])}
+        
+        Current user input: {user_input}
+        
+        Return a JSON object with exactly these sections:
+{describe_schema()}
+        
+        "intent" describes whether this is a follow-up and what the user wants, "preferences" the user's
+        food preferences given the whole conversation, and "context" the food context of the current input only.
+        If any field cannot be determined, use null or an empty list.
+        Return ONLY the JSON object, no other text."""
+
+        try:
+            response = self._call_model(prompt)
+            if not response.text or not response.text.strip():
+                raise ValueError("Empty response from model")
+            json_str = self._extract_json_from_markdown(response.text)
+            return validate_unified_analysis(json.loads(json_str))
+        except Exception as e:
+            print(f"Error in unified analysis: {str(e)}")
+            return {'intent': dict(INTENT_DEFAULTS), 'preferences': {}, 'context': {}}
+
+    def _analyze_user_intent(self, user_input: str) -> Dict[str, Any]:
         """Use AI to analyze user intent and context with improved follow-up detection"""
+        local = self._fast_path('intent', user_input)
+        if local is not None:
+            return dict(local['intent'], user_preferences=self.user_preferences,
+                        conversation_state=self.conversation_state)
+
         prompt = f"""Analyze this conversation and determine if it's a follow-up question.
         
         Previous conversation:
@@ -175,7 +431,7 @@ class ConversationManager:
         - Last meal type: {self.conversation_state['last_meal_type']}
         - Last dietary preference: {self.conversation_state['last_dietary']}
         - Last price range: {self.conversation_state['last_price_range']}
-        - Last recommendations: {[food['name'] for food in self.conversation_state['last_recommendations']]}
+        - Last recommendations: {food_names(self.conversation_state['last_recommendations'])}
         
         Current user input: {user_input}
         
@@ -192,10 +448,7 @@ class ConversationManager:
         Return ONLY the JSON object, no other text."""
 
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
-            )
+            response = self._call_model(prompt)
             if not response.text or not response.text.strip():
                 print(f"Error analyzing intent: Model returned empty response. Raw output: '{response.text}'")
                 raise ValueError("Empty response from model")
@@ -242,75 +495,106 @@ class ConversationManager:
 
     def generate_contextual_prompt(self, user_input: str, retrieved_foods: List[Dict[str, Any]]) -> str:
         """Generate a prompt that includes conversation history and context with improved follow-up handling"""
-        # Format the retrieved foods
-        retrieved_text = "\n".join([
-            f"[ID:{item.get('id', 'N/A')}] {item['name']}: {item['description']} (Region: {item['region']}, Mood: {item['mood']}, Time: {item['time']}, Diet: {item['diet']}, Price: {item.get('price', 'N/A')})"
-            for item in retrieved_foods
-        ])
-
-        # Get conversation history and analyze intent
-        conversation_context = self.get_conversation_context()
+        builder = self.build_contextual_prompt(user_input, retrieved_foods)
+        prompt = builder.build()
+        print("Prompt tokens:", builder.get_stats())
+        return prompt
+
+    def build_contextual_prompt(self, user_input: str, retrieved_foods: List[Dict[str, Any]],
+                                food_lines: List[str] = None) -> PromptBuilder:
+        """Prompt sections for a turn, each within its token budget.
+
+        History keeps the latest exchanges verbatim after the rolling summary;
+        food_lines (default: the foods' prompt snippets) are kept in rank order.
+        """
         intent_analysis = self.analyze_user_intent(user_input)
+        preferences = {key: value for key, value in intent_analysis['user_preferences'].items()
+                       if value not in (None, [], '')}
 
-        # Create the full prompt with improved context handling
-        prompt = f"""You are a food expert having a natural conversation with a user about food recommendations.
-        
-        Previous conversation:
-        {conversation_context}
+        builder = PromptBuilder()
+        builder.add_blocks(
+            'history', self.get_history_blocks(), keep='last', empty='(no previous messages)',
+            header="You are a food expert having a natural conversation with a user about food recommendations.\n\n"
+                   "Previous conversation:"
+        )
+        builder.add_text('state', f"""Current conversation state:
+- Last meal type: {self.conversation_state['last_meal_type']}
+- Last dietary preference: {self.conversation_state['last_dietary']}
+- Last price range: {self.conversation_state['last_price_range']}
+- Last recommendations: {food_names(self.conversation_state['last_recommendations'])}
+- User preferences: {preferences}""")
+        builder.add_text('query', f"""Current user query: {user_input}
 
-        Current conversation state:
-        - Last meal type: {self.conversation_state['last_meal_type']}
-        - Last dietary preference: {self.conversation_state['last_dietary']}
-        - Last price range: {self.conversation_state['last_price_range']}
-        - Last recommendations: {[food['name'] for food in self.conversation_state['last_recommendations']]}
-
-        Current user query: {user_input}
-
-        User's intent and context:
-        - Intent: {intent_analysis['intent']}
-        - Is follow-up question: {intent_analysis['is_followup']}
-        - Follow-up type: {intent_analysis['followup_type']}
-        - Context references: {intent_analysis['context_references']}
-        - Referenced items: {intent_analysis.get('referenced_items', [])}
-        - Sentiment: {intent_analysis.get('sentiment', 'neutral')}
-        - Urgency: {intent_analysis.get('urgency', 'medium')}
-        - User preferences: {intent_analysis['user_preferences']}
-
-        Available food items:
-        {retrieved_text}
-
-        Instructions:
-        1. Respond naturally as if you're having a friendly conversation
-        2. Consider the entire conversation context and user's preferences
-        3. If it's a follow-up question:
-           - Acknowledge the connection to previous context
-           - Reference specific items or preferences mentioned earlier
-           - Maintain consistency with previous recommendations
-           - If the user is asking about a specific item mentioned earlier, focus on that item
-           - If the user is asking for more options, provide alternatives that match the previous context
-        4. Make personalized recommendations based on user's preferences and constraints
-        5. Keep the response concise but informative
-        6. Do not use any HTML tags or special formatting
-        7. IMPORTANT: When discussing calories or nutritional information:
-           - Only mention calorie counts when:
-             * The user specifically asks about calories
-             * The user asks about low/high calorie options
-             * The user mentions health, diet, or weight-related concerns
-             * The calorie information is crucial for the recommendation
-           - When calories are not relevant to the query, focus on other aspects like taste, ingredients, and preparation
-        8. At the end of your response, add a line with the recommended food IDs in this format:
-           [RECOMMENDED_FOODS:ID1,ID2,ID3]
-           Only include IDs of foods you actually recommend in your response.
-        
-        Provide your response:"""
+User's intent and context:
+- Intent: {intent_analysis['intent']}
+- Is follow-up question: {intent_analysis['is_followup']}
+- Follow-up type: {intent_analysis['followup_type']}
+- Context references: {intent_analysis['context_references']}
+- Referenced items: {intent_analysis.get('referenced_items', [])}
+- Sentiment: {intent_analysis.get('sentiment', 'neutral')}
+- Urgency: {intent_analysis.get('urgency', 'medium')}""", required=True)
+        builder.add_blocks('candidates', snippet_lines(retrieved_foods) if food_lines is None else food_lines,
+                           header="Available food items:")
+        builder.add_text('instructions', CHAT_INSTRUCTIONS)
+        return builder
 
-        return prompt
+    def _invalidate_context(self, section: str = None) -> None:
+        """Drop one rendered section (or none, for history changes) and the joined context"""
+        with self._context_lock:
+            if section is not None:
+                self._context_sections[section] = None
+            self._rendered_context = None
+
+    def _rendered_state_values(self):
+        return tuple(self.conversation_state[key] for key in
+                     ('last_meal_type', 'last_dietary', 'last_price_range', 'last_price_ceiling'))
+
+    @staticmethod
+    def _render_exchange(exchange: Dict[str, Any]) -> str:
+        block = f"User: {exchange['user_input']}\nAssistant: {exchange['ai_response']}"
+        # Add relevant food items from previous exchanges
+        foods = exchange.get('retrieved_foods', [])
+        if foods:
+            block += "\n\nRelevant foods discussed:\n" + format_summaries(foods)
+        return block
+
+    def _recent_blocks(self) -> deque:
+        """Rendered verbatim exchanges; built from history only after a load from the state store"""
+        if self._exchange_blocks is None:
+            self._exchange_blocks = deque(self._render_exchange(exchange)
+                                          for exchange in self.conversation_history[-RECENT_EXCHANGES:])
+            self.render_stats['exchange_renders'] += len(self._exchange_blocks)
+        return self._exchange_blocks
+
+    def _append_exchange_block(self, exchange: Dict[str, Any]) -> None:
+        with self._context_lock:
+            if self._exchange_blocks is not None:
+                self._exchange_blocks.append(self._render_exchange(exchange))
+                self.render_stats['exchange_renders'] += 1
+                while len(self._exchange_blocks) > RECENT_EXCHANGES:
+                    self._exchange_blocks.popleft()
+            self._rendered_context = None
+
+    def get_history_blocks(self) -> List[str]:
+        """Summary lines for older exchanges, then one block per recent exchange"""
+        with self._context_lock:
+            return self.conversation_summary + list(self._recent_blocks())
 
     def get_conversation_context(self) -> str:
-        """Get formatted conversation history for context with improved state tracking"""
-        context = []
-        
-        # Add user preferences if they exist
+        """Formatted preferences, state and history, re-rendering only the sections that changed"""
+        with self._context_lock:
+            if self._rendered_context is None:
+                for name, render in (('preferences', self._render_preferences), ('state', self._render_state)):
+                    if self._context_sections[name] is None:
+                        self._context_sections[name] = render()
+                        self.render_stats['section_renders'] += 1
+                parts = [section for section in self._context_sections.values() if section]
+                self._rendered_context = "\n".join(parts + self.get_history_blocks())
+                self.render_stats['context_joins'] += 1
+            return self._rendered_context
+
+    def _render_preferences(self) -> str:
+        """User preferences section of the conversation context"""
         preferences = []
         if self.user_preferences['dietary_restrictions']:
             preferences.append(f"Dietary restrictions: {', '.join(self.user_preferences['dietary_restrictions'])}")
@@ -328,44 +612,24 @@ class ConversationManager:
             preferences.append(f"Weather: {self.user_preferences['weather']}")
         if self.user_preferences['mood']:
             preferences.append(f"Mood: {self.user_preferences['mood']}")
-        if self.user_preferences['price_range']:
-            preferences.append(f"Price range: {self.user_preferences['price_range']}")
+        if self.user_preferences['price_range'] or self.user_preferences['price_ceiling']:
+            preferences.append(f"Price range: {_describe_budget(self.user_preferences['price_range'], self.user_preferences['price_ceiling'])}")
         if self.user_preferences['meal_type']:
             preferences.append(f"Preferred meal type: {self.user_preferences['meal_type']}")
         if self.user_preferences['spice_level']:
             preferences.append(f"Preferred spice level: {self.user_preferences['spice_level']}")
         
-        if preferences:
-            context.append("User preferences:")
-            context.extend(preferences)
-            context.append("")
+        return "\n".join(["User preferences:"] + preferences + [""]) if preferences else ''
 
-        # Add conversation state
+    def _render_state(self) -> str:
+        """Conversation state section of the conversation context"""
         state_info = []
         if self.conversation_state['last_meal_type']:
             state_info.append(f"Last discussed meal type: {self.conversation_state['last_meal_type']}")
         if self.conversation_state['last_dietary']:
             state_info.append(f"Last dietary preference: {self.conversation_state['last_dietary']}")
-        if self.conversation_state['last_price_range']:
-            state_info.append(f"Last price range: {self.conversation_state['last_price_range']}")
-        
-        if state_info:
-            context.append("Current conversation state:")
-            context.extend(state_info)
-            context.append("")
-
-        # Add conversation history
-        for exchange in self.conversation_history:
-            context.append(f"User: {exchange['user_input']}")
-            context.append(f"Assistant: {exchange['ai_response']}")
-            
-            # Add relevant food items from previous exchanges
-            foods = exchange.get('retrieved_foods', [])
-            if foods:
-                food_context = "\nRelevant foods discussed:\n" + "\n".join([
-                    f"- {food['name']}: {food['description']}"
-                    for food in foods
-                ])
-                context.append(food_context)
+        if self.conversation_state['last_price_range'] or self.conversation_state['last_price_ceiling']:
+            budget = _describe_budget(self.conversation_state['last_price_range'], self.conversation_state['last_price_ceiling'])
+            state_info.append(f"Last price range: {budget}")
         
-        return "\n".join(context) 
\ No newline at end of file
+        return "\n".join(["Current conversation state:"] + state_info + [""]) if state_info else '' 
\ No newline at end of file
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'embedding_cache.sqlite3')
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share an entry"""
+    return ' '.join(str(text).split()).lower()
+
+
+def cache_key(model: str, task_type: str, text: str, title: Optional[str] = None) -> str:
+    raw = "\x00".join([model, task_type or '', title or '', normalize_text(text)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-process LRU in front of a SQLite file.
+
+    The SQLite file runs in WAL mode so every gunicorn worker on the host shares
+    it. The disk tier is bounded by max_rows and evicts least recently used rows.
+    """
+
+    def __init__(self, path: str = None, memory_items: int = 2048, max_rows: int = 50000):
+        self.path = path or DEFAULT_CACHE_PATH
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_evict = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evicted': 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process; never reuse one across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, task_type TEXT, vector BLOB, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return vector
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: embedding cache read failed: {str(e)}")
+            row = None
+        if row is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        vector = array('f', row[0]).tolist()
+        self._remember(key, vector)
+        with self._lock:
+            self.stats['disk_hits'] += 1
+        return vector
+
+    def put(self, key: str, vector: List[float], model: str = '', task_type: str = '') -> None:
+        self._remember(key, vector)
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, task_type, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, task_type, array('f', vector).tobytes(), time.time())
+            )
+            conn.commit()
+            with self._lock:
+                self._writes_since_evict += 1
+                should_evict = self._writes_since_evict >= 100
+                if should_evict:
+                    self._writes_since_evict = 0
+            if should_evict:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"Warning: embedding cache write failed: {str(e)}")
+
+    def evict(self) -> int:
+        """Trim the disk tier to 90% of max_rows, dropping least recently used rows"""
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_rows:
+            return 0
+        excess = count - int(self.max_rows * 0.9)
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        conn.commit()
+        with self._lock:
+            self.stats['evicted'] += excess
+        return excess
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_size'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
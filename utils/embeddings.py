@@ -2,15 +2,55 @@
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from utils.embedding_cache import EmbeddingCache, cache_key
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
+EMBEDDING_MODEL = "models/embedding-001"
+EMBEDDING_TASK_TYPE = "retrieval_document"
+EMBEDDING_TITLE = "Food item embedding"
+
+# Shared by every worker on the host through the SQLite file; set EMBEDDING_CACHE=off to bypass
+embedding_cache = EmbeddingCache(
+    path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+    memory_items=int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "2048")),
+    max_rows=int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "50000"))
+)
+CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "on").lower() != "off"
+
 def get_embedding(text):
+    key = cache_key(EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, text, EMBEDDING_TITLE)
+    if CACHE_ENABLED:
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return cached
+
     result = genai.embed_content(
-        model="models/embedding-001",
+        model=EMBEDDING_MODEL,
         content=text,
-        task_type="retrieval_document",
-        title="Food item embedding"
+        task_type=EMBEDDING_TASK_TYPE,
+        title=EMBEDDING_TITLE
     )
-    return result['embedding']
+    embedding = result['embedding']
+    if CACHE_ENABLED:
+        embedding_cache.put(key, embedding, model=EMBEDDING_MODEL, task_type=EMBEDDING_TASK_TYPE)
+    return embedding
+
+def get_embeddings(texts):
+    """Embed a list of texts with one batch call for the cache misses; results keep input order"""
+    keys = [cache_key(EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, text, EMBEDDING_TITLE) for text in texts]
+    embeddings = [embedding_cache.get(key) if CACHE_ENABLED else None for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        result = genai.embed_content(
+            model=EMBEDDING_MODEL,
+            content=[texts[i] for i in missing],
+            task_type=EMBEDDING_TASK_TYPE,
+            title=EMBEDDING_TITLE
+        )
+        for i, embedding in zip(missing, result['embedding']):
+            embeddings[i] = embedding
+            if CACHE_ENABLED:
+                embedding_cache.put(keys[i], embedding, model=EMBEDDING_MODEL, task_type=EMBEDDING_TASK_TYPE)
+    return embeddings
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _UserLane:
+    def __init__(self):
+        self.jobs = deque()
+        self.running = False
+        self.idle = threading.Condition()
+
+
+class ExchangeUpdateQueue:
+    """Applies post-response updates in the background, in order, one lane per user.
+
+    Jobs for the same user never run concurrently and run in submission order;
+    different users are updated in parallel on a shared pool.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lanes: Dict[Hashable, _UserLane] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'inline': 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily so a preloaded app never forks with live worker threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='exchange-update')
+        return self._executor
+
+    def _run_job(self, fn: Callable[..., Any], args: tuple) -> None:
+        try:
+            fn(*args)
+            outcome = 'completed'
+        except Exception as e:
+            outcome = 'failed'
+            print(f"Error applying exchange update: {str(e)}")
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> None:
+        """Queue fn(*args) behind any pending updates for key"""
+        with self._lock:
+            self.stats['submitted'] += 1
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                lane = self._lanes.setdefault(key, _UserLane())
+                with lane.idle:
+                    lane.jobs.append((fn, args))
+                    start_drain = not lane.running
+                    lane.running = True
+                if start_drain:
+                    self._get_executor().submit(self._drain, key, lane)
+        if closed:
+            # Shutting down: apply synchronously rather than dropping the update
+            with self._lock:
+                self.stats['inline'] += 1
+            self._run_job(fn, args)
+
+    def _drain(self, key: Hashable, lane: _UserLane) -> None:
+        while True:
+            with lane.idle:
+                if not lane.jobs:
+                    lane.running = False
+                    lane.idle.notify_all()
+                    break
+                fn, args = lane.jobs.popleft()
+            self._run_job(fn, args)
+        with self._lock:
+            with lane.idle:
+                if not lane.running and not lane.jobs and self._lanes.get(key) is lane:
+                    del self._lanes[key]
+
+    def wait_for(self, key: Hashable, timeout: Optional[float] = None) -> bool:
+        """Block until every pending update for key has been applied; False on timeout"""
+        with self._lock:
+            lane = self._lanes.get(key)
+        if lane is None:
+            return True
+        with lane.idle:
+            return lane.idle.wait_for(lambda: not lane.running and not lane.jobs, timeout=timeout)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(lane.jobs) + (1 if lane.running else 0) for lane in self._lanes.values())
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting background work and wait for queued updates to finish.
+
+        timeout bounds the whole wait, not each lane's, so the caller can fit it in a shutdown grace period.
+        """
+        with self._lock:
+            self._closed = True
+            lanes = list(self._lanes.values())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        drained = True
+        for lane in lanes:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            with lane.idle:
+                drained = lane.idle.wait_for(lambda: not lane.running and not lane.jobs, timeout=remaining) and drained
+        if self._executor is not None:
+            self._executor.shutdown(wait=drained)
+        return drained
@@ -0,0 +1,125 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# One <index-name>.version file per index, rewritten after every write so caches keyed on it are dropped
+CATALOG_VERSION_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'manifests')
+
+
+def menu_item_text(item: Dict[str, Any]) -> str:
+    """Embedding text for the niloufer.json / food_items.json schema"""
+    return f"name: {item['name']}, description: {item['description']}, region: {item['region']}, mood: {item['mood']}, time: {item['time']}, diet: {item['diet']}, category: {item['category']}, spice_level: {item['spice_level']}, health_benefits: {item['health_benefits']}, region: {item['region']}, ingredients: {item['ingredients']}, sides: {item['sides']}, cooking_method: {item['cooking_method']}, dietary_tags: {item['dietary_tags']}, price: {item['price']}, calories: {item['calories']})"
+
+
+def prod_item_text(item: Dict[str, Any]) -> str:
+    """Embedding text for the prod feed: only product name and description"""
+    return f"{item.get('ProductName', '')} {item.get('Description', '')}"
+
+
+def catalog_version_path(index_name: str) -> str:
+    return os.path.join(CATALOG_VERSION_DIR, f"{index_name}.version")
+
+
+def stamp_catalog_version(index_name: str) -> None:
+    """Record that index_name's contents changed (see response_cache.catalog_version)"""
+    path = catalog_version_path(index_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+def clean_metadata(item: Dict[str, Any]) -> Dict[str, Any]:
+    # Remove keys with None values
+    return {k: v for k, v in item.items() if v is not None}
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def add(self, items: int, seconds: float) -> None:
+        self.items += items
+        self.batches += 1
+        self.seconds += seconds
+
+    def report(self) -> str:
+        rate = self.items / self.seconds if self.seconds else 0.0
+        return f"{self.name}: {self.items} items in {self.batches} batches, {self.seconds:.2f}s busy, {rate:.1f} items/s"
+
+
+def _batched(items: Iterable[Any], size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest(index, items: Iterable[Dict[str, Any]], embed_batch: Callable[[List[str]], List[List[float]]],
+           to_text: Callable[[Dict[str, Any]], str], to_id: Callable[[Dict[str, Any]], str],
+           to_metadata: Callable[[Dict[str, Any]], Dict[str, Any]] = clean_metadata,
+           embed_batch_size: int = 50, upsert_batch_size: int = 100, max_concurrency: int = 4,
+           log: Optional[Callable[[str], None]] = print, index_name: Optional[str] = None) -> Dict[str, StageStats]:
+    """Embed items in concurrent batches and stream upserts as vectors become ready.
+
+    At most max_concurrency embedding batches are in flight and at most one
+    upsert batch is buffered, so memory stays bounded regardless of catalog size.
+    When index_name is given, its catalog version is stamped once anything was upserted.
+    """
+    stats = {'embed': StageStats('embed'), 'upsert': StageStats('upsert')}
+    started = time.perf_counter()
+    buffer: List[Dict[str, Any]] = []
+
+    def embed(batch):
+        start = time.perf_counter()
+        embeddings = embed_batch([to_text(item) for item in batch])
+        return batch, embeddings, time.perf_counter() - start
+
+    def flush():
+        if not buffer:
+            return
+        start = time.perf_counter()
+        index.upsert(vectors=list(buffer))
+        stats['upsert'].add(len(buffer), time.perf_counter() - start)
+        if log:
+            log(f"Upserted batch {stats['upsert'].batches} ({len(buffer)} items)")
+        buffer.clear()
+
+    def collect(done):
+        for future in done:
+            batch, embeddings, seconds = future.result()
+            stats['embed'].add(len(batch), seconds)
+            for item, embedding in zip(batch, embeddings):
+                buffer.append({"id": to_id(item), "values": embedding, "metadata": to_metadata(item)})
+                if len(buffer) >= upsert_batch_size:
+                    flush()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ingest-embed') as executor:
+        in_flight = set()
+        for batch in _batched(items, embed_batch_size):
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(embed, batch))
+        done, _ = wait(in_flight)
+        collect(done)
+    flush()
+    if index_name and stats['upsert'].items:
+        stamp_catalog_version(index_name)
+
+    if log:
+        elapsed = time.perf_counter() - started
+        total = stats['upsert'].items
+        log(stats['embed'].report())
+        log(stats['upsert'].report())
+        log(f"total: {total} items in {elapsed:.2f}s, {total / elapsed if elapsed else 0.0:.1f} items/s")
+    return stats
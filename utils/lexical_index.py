@@ -0,0 +1,135 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from i in is it me my of on or please show some something "
+    "that the this to want with you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of term -> [(row, term frequency)].
+
+    Documents are token lists keyed by the caller's row numbers, so the index can
+    cover any subset of a larger table.
+    """
+
+    def __init__(self, documents: Iterable[Tuple[int, Sequence[str]]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: Dict[int, int] = {}
+        for row, tokens in documents:
+            self.doc_lengths[row] = len(tokens)
+            for term, frequency in Counter(tokens).items():
+                self.postings[term].append((row, frequency))
+        self.postings = dict(self.postings)
+        count = len(self.doc_lengths)
+        self.avg_length = (sum(self.doc_lengths.values()) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, rows in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def search(self, query: str, top_k: int = 20, allowed: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(row, score) pairs for the best matching documents, best first.
+
+        allowed is an optional row bitmap; documents outside it are skipped.
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for row, frequency in self.postings[term]:
+                if allowed is not None and not (allowed >> row) & 1:
+                    continue
+                norm = 1 - self.b + self.b * self.doc_lengths[row] / (self.avg_length or 1.0)
+                scores[row] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Merge ranked key lists; each key scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+class HybridRetriever:
+    """Fuses vector-index results with BM25 hits from the catalog for one schema.
+
+    Items found only lexically (e.g. a dish named exactly but missed by the
+    vector top-k) are taken from the catalog in their index metadata shape.
+    Items whose name the query contains, or whose name contains the whole
+    query, lead the fused list: a lexical-only hit scores about 1/(k+1) and
+    would otherwise rank below everything both retrievers found.
+    """
+
+    def __init__(self, catalog, schema: str, lexical_top_k: int = 20, rrf_k: int = 60):
+        self.catalog = catalog
+        self.schema = schema
+        self.lexical_top_k = lexical_top_k
+        self.rrf_k = rrf_k
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'lexical_hits': 0, 'lexical_only': 0, 'named': 0}
+
+    def fuse(self, query: str, vector_foods: List[Dict[str, Any]], top_k: int = None,
+             allowed_ids: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """Vector foods re-ranked together with lexical matches, at most top_k (default: as many as given).
+
+        allowed_ids, when given, restricts the lexical side to those catalog ids.
+        """
+        top_k = top_k or len(vector_foods) or self.lexical_top_k
+        by_key: Dict[Hashable, Dict[str, Any]] = {}
+        vector_ranking = []
+        for food in vector_foods:
+            key = self.catalog.key_for(food)
+            if key not in by_key:
+                by_key[key] = food
+                vector_ranking.append(key)
+
+        lexical_ranking = []
+        for row, _ in self.catalog.search(query, self.schema, self.lexical_top_k, allowed_ids):
+            key = self.catalog.key_for_row(row)
+            lexical_ranking.append(key)
+            by_key.setdefault(key, self.catalog.items[row])
+
+        fused = [key for key, _ in reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=self.rrf_k)]
+        named = [key for key in fused if self._names(query, by_key[key])]
+        named_keys = set(named)
+        fused = (named + [key for key in fused if key not in named_keys])[:top_k]
+        with self._lock:
+            self.stats['queries'] += 1
+            self.stats['lexical_hits'] += len(lexical_ranking)
+            self.stats['named'] += len(named)
+            vector_keys = set(vector_ranking)
+            self.stats['lexical_only'] += sum(1 for key in fused if key not in vector_keys)
+        return [by_key[key] for key in fused]
+
+    def _names(self, query: str, food: Dict[str, Any]) -> bool:
+        """Whether the query names this food, or is a single word of its name; whole words only"""
+        name = self.catalog.record(food).name.lower().strip()
+        query = query.lower().strip()
+        if not (name and query):
+            return False
+        if re.search(rf"\b{re.escape(name)}\b", query):
+            return True
+        return len(query.split()) == 1 and bool(re.search(rf"\b{re.escape(query)}\b", name))
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from utils.catalog import MENU_SCHEMA, food_names, get_catalog
+from utils.unified_analyzer import INTENT_DEFAULTS, UNIFIED_SCHEMA
+
+# Rule-based analyses at or above this confidence replace the model call; above 1 disables the fast path
+LOCAL_ANALYZER_THRESHOLD = float(os.getenv("LOCAL_ANALYZER_THRESHOLD", "0.8"))
+
+MEAL_WORDS = {'breakfast': 'breakfast', 'brunch': 'breakfast', 'lunch': 'lunch', 'dinner': 'dinner',
+              'supper': 'dinner', 'snack': 'snack', 'snacks': 'snack'}
+TIME_WORDS = {'morning': 'morning', 'afternoon': 'afternoon', 'evening': 'evening', 'night': 'night',
+              'tonight': 'night'}
+# Checked in order; a matched span is blanked so "non-veg" does not also read as "veg"
+DIET_PATTERNS = (
+    (r"\bnon[- ]?veg(?:etarian)?\b", 'non-vegetarian'),
+    (r"\bvegan\b", 'vegan'),
+    (r"\b(?:pure\s+)?veg(?:etarian|gie|gies)?\b", 'vegetarian'),
+)
+SPICE_PATTERNS = (
+    (r"\b(?:not|less|no|low)\s+(?:too\s+|very\s+|so\s+)?spic(?:y|e)\b|\bmild(?:er)?\b", 'mild'),
+    (r"\bmedium(?:\s+spic(?:y|e))?\b", 'medium'),
+    (r"\b(?:extra\s+)?(?:spicy|spicier|fiery)\b", 'spicy'),
+)
+CUISINES = ('south indian', 'north indian', 'hyderabadi', 'indo-chinese', 'chinese', 'italian', 'continental',
+            'mughlai', 'punjabi', 'andhra', 'chettinad', 'irani', 'street food')
+PRICE_WORDS = {'cheap': 'low', 'cheaper': 'low', 'budget': 'low', 'affordable': 'low', 'inexpensive': 'low',
+               'moderate': 'medium', 'premium': 'high', 'expensive': 'high', 'fancy': 'high'}
+# "under 200", "below rs 150", "within ₹300": the amount becomes price_ceiling, bucketed into price_range
+PRICE_CEILING_RE = re.compile(r"\b(?:under|below|less than|within|upto|up to|max(?:imum)?|cheaper than)\s*"
+                              r"(?:rs\.?|inr|₹)?\s*(\d+)\s*(?:rs|rupees|inr)?\b")
+MOOD_PATTERNS = ((r"\b(?:quick|fast|hurry|asap)\b", 'quick'), (r"\b(?:relax(?:ed|ing)?|chill)\b", 'relaxed'))
+OCCASION_PATTERNS = ((r"\b(?:birthday|party|celebrat\w*)\b", 'celebration'),
+                     (r"\b(?:date|anniversary|special)\b", 'special'))
+
+ORDINALS = {'first': 0, '1st': 0, 'second': 1, '2nd': 1, 'third': 2, '3rd': 2, 'last': -1}
+ORDINAL_RE = re.compile(r"\b(?:the\s+)?(first|1st|second|2nd|third|3rd|last)(?:\s+(?:one|item|dish|option))?\b")
+PRONOUN_RE = re.compile(r"\b(?:it|its|that|this|those|these|them|they|one)\b")
+# Checked in order; the first match decides the follow-up type
+FOLLOWUP_PATTERNS = (
+    ('comparison', r"\b(?:compare|comparison|vs|versus|difference|which (?:one )?(?:is )?(?:\w+er|best)|which one)\b"),
+    ('clarification', r"\b(?:tell me more|more about|what(?:'s| is) in|ingredients?|calories|how spicy|made of|"
+                      r"details?|describe|how much)\b"),
+    ('modification', r"\b(?:instead|something else|other than|different|change)\b"),
+    ('continuation', r"\b(?:more options|more|another|others?|similar|alternatives?|next)\b"),
+)
+FOLLOWUP_INTENTS = {'comparison': 'compare_items', 'clarification': 'item_details',
+                    'modification': 'modify_request', 'continuation': 'more_options',
+                    'reference': 'item_details', 'pronoun': 'item_details'}
+GREETING_RE = re.compile(r"^\s*(?:hi|hello|hey|thanks|thank you|ok|okay|bye|good (?:morning|evening|night))\b")
+POSITIVE_RE = re.compile(r"\b(?:love|great|awesome|yum|yummy|delicious|thanks|thank you)\b")
+NEGATIVE_RE = re.compile(r"\b(?:hate|bad|awful|boring|don't like|dont like)\b")
+# Exclusions ("no onion", "without egg") need the model to read what is excluded
+NEGATION_RE = re.compile(r"\b(?:not|no|don't|dont|without|except|never|avoid|allergic)\b")
+
+FILLER = frozenset(
+    "a about all an and any anything are be can could do does eat food foods for from get give good have having "
+    "how i i'd i'm im is it just like looking me my need now of on one option options or please recommend "
+    "recommendations rs s show so some something suggest suggestion suggestions tell the to today try us want "
+    "we what whats what's which with would you your dish dishes item items also too very really".split()
+)
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Each fast-path use replaces one model call of the given kind
+CALL_KINDS = ('intent', 'context', 'preferences', 'unified')
+
+
+def _empty_section(section: str) -> Dict[str, Any]:
+    return {name: [] if kind is list else None for name, kind in UNIFIED_SCHEMA[section].items()}
+
+
+class _Scan:
+    """Lowercased input whose matched spans are blanked, so what is left shows what no rule explained"""
+
+    def __init__(self, text: str):
+        self.text = text.lower()
+        self.remaining = self.text
+
+    def take(self, pattern) -> Optional[re.Match]:
+        match = re.search(pattern, self.remaining)
+        if match:
+            start, end = match.span()
+            self.remaining = self.remaining[:start] + ' ' * (end - start) + self.remaining[end:]
+        return match
+
+    def first(self, patterns: Iterable) -> Optional[str]:
+        """Value of the first (pattern, value) pair that matches"""
+        for pattern, value in patterns:
+            if self.take(pattern):
+                return value
+        return None
+
+    def word(self, lexicon: Dict[str, str]) -> Optional[str]:
+        return self.first((rf"\b{re.escape(word)}\b", value) for word, value in lexicon.items())
+
+
+class LocalAnalyzer:
+    """Deterministic intent, preference and context extraction for simple messages.
+
+    analyze() returns the unified analysis shape (intent / preferences /
+    context sections) with intent.confidence set to the share of the
+    message's content words some rule or the menu vocabulary explained.
+    Messages with exclusions, unknown words or unresolvable references
+    score low and are left to the model. price_range holds the same
+    low / medium / high buckets the model returns; a stated amount is also
+    kept as a number in price_ceiling (preferences and context), which
+    AttributeFilter applies as an exact ceiling. price_buckets are the
+    highest low and medium prices; without them an amount sets no bucket.
+    """
+
+    def __init__(self, threshold: float = LOCAL_ANALYZER_THRESHOLD, vocabulary: Iterable[str] = (),
+                 price_buckets: Sequence[Optional[float]] = (None, None)):
+        self.threshold = threshold
+        self.vocabulary = frozenset(vocabulary)
+        self.price_buckets = tuple(price_buckets)
+        self._lock = threading.Lock()
+        self.stats = {kind: {'local': 0, 'model': 0} for kind in CALL_KINDS}
+
+    def analyze(self, text: str, last_recommendations: Sequence[Dict[str, Any]] = (),
+                has_history: bool = False) -> Dict[str, Dict[str, Any]]:
+        scan = _Scan(text)
+        intent = dict(INTENT_DEFAULTS)
+        preferences = _empty_section('preferences')
+        context = _empty_section('context')
+        signals = 0
+
+        if GREETING_RE.search(scan.text):
+            scan.take(GREETING_RE)
+            intent['intent'] = 'greeting'
+            signals += 1
+
+        dietary = scan.first(DIET_PATTERNS)
+        price = scan.take(PRICE_CEILING_RE)
+        price_ceiling = float(price.group(1)) if price else None
+        price_range = self._price_bucket(price_ceiling) if price else scan.word(PRICE_WORDS)
+        spice = scan.first(SPICE_PATTERNS)
+        meal = scan.word(MEAL_WORDS)
+        time_of_day = scan.word(TIME_WORDS)
+        cuisines = [cuisine for cuisine in CUISINES if scan.take(rf"\b{re.escape(cuisine)}\b")]
+        mood = scan.first(MOOD_PATTERNS)
+        occasion = scan.first(OCCASION_PATTERNS)
+        signals += sum(1 for value in (dietary, price_range or price_ceiling, spice, meal, time_of_day, mood, occasion)
+                       if value)
+        signals += len(cuisines)
+
+        context.update(meal_type=meal, dietary=dietary, price_range=price_range, price_ceiling=price_ceiling,
+                       cuisine=cuisines, time_of_day=time_of_day, mood=mood, occasion=occasion)
+        preferences.update(
+            dietary_restrictions=[dietary] if dietary in ('vegetarian', 'vegan') else [],
+            price_range=price_range, price_ceiling=price_ceiling, meal_type=meal, cuisine_preferences=cuisines, spice_level=spice,
+            time_preference=time_of_day, occasion=occasion, mood=mood,
+        )
+
+        # References back to the last recommendations
+        names = [name for name in food_names(last_recommendations) if name]
+        referenced = [name for name in names if scan.take(rf"\b{re.escape(name.lower())}\b")]
+        ordinal = scan.take(ORDINAL_RE) if names else None
+        if ordinal:
+            position = ORDINALS[ordinal.group(1)]
+            if position < len(names):
+                referenced.append(names[position])
+        followup_type = next((kind for kind, pattern in FOLLOWUP_PATTERNS if scan.take(pattern)), None)
+        pronoun = scan.take(PRONOUN_RE)
+        unresolved = False
+        if has_history:
+            if referenced and followup_type is None:
+                followup_type = 'reference'
+            elif pronoun and followup_type is None and not signals:
+                followup_type = 'pronoun'
+            # "that one" with nothing to point at cannot be resolved locally
+            unresolved = bool((pronoun or ordinal or followup_type in ('clarification', 'comparison'))
+                              and not (referenced or names))
+        intent['is_followup'] = bool(has_history and followup_type)
+        intent['followup_type'] = followup_type if intent['is_followup'] else None
+        intent['referenced_items'] = referenced
+        intent['context_references'] = referenced or (["last recommendations"] if intent['is_followup'] else [])
+        if intent['is_followup']:
+            intent['intent'] = FOLLOWUP_INTENTS[followup_type]
+            signals += 1
+        elif intent['intent'] != 'greeting':
+            intent['intent'] = 'recommendation'
+        intent['sentiment'] = ('negative' if NEGATIVE_RE.search(scan.text)
+                               else 'positive' if POSITIVE_RE.search(scan.text) else 'neutral')
+        intent['urgency'] = 'high' if mood == 'quick' else 'medium'
+
+        # Confidence: share of content words explained by a rule or the menu vocabulary
+        words = [word for word in WORD_RE.findall(scan.remaining) if word not in FILLER]
+        unknown = [word for word in words if word not in self.vocabulary]
+        food_terms = len(words) - len(unknown)
+        content = signals + len(words)
+        confidence = 1 - len(unknown) / content if content else 0.0
+        if not signals and not food_terms:
+            confidence = 0.0
+        if NEGATION_RE.search(scan.remaining) or unresolved:
+            confidence = min(confidence, 0.3)
+        intent['confidence'] = round(confidence, 2)
+        return {'intent': intent, 'preferences': preferences, 'context': context}
+
+    def _price_bucket(self, ceiling: float) -> Optional[str]:
+        low, medium = self.price_buckets
+        if low is None or medium is None:
+            return None
+        return 'low' if ceiling <= low else 'medium' if ceiling <= medium else 'high'
+
+    def accept(self, kind: str, analysis: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """analysis when it is confident enough to replace a model call of this kind, else None"""
+        local = analysis['intent']['confidence'] >= self.threshold
+        with self._lock:
+            self.stats[kind]['local' if local else 'model'] += 1
+        return analysis if local else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {kind: dict(counts) for kind, counts in self.stats.items()}
+        skipped = sum(counts['local'] for counts in stats.values())
+        total = skipped + sum(counts['model'] for counts in stats.values())
+        stats['model_calls_skipped'] = skipped
+        stats['skip_rate'] = skipped / total if total else 0.0
+        return stats
+
+
+_local_analyzer: Optional[LocalAnalyzer] = None
+_local_analyzer_lock = threading.Lock()
+
+
+def get_local_analyzer() -> LocalAnalyzer:
+    """Process-wide analyzer; menu words count as explained, so dish names do not need the model"""
+    global _local_analyzer
+    with _local_analyzer_lock:
+        if _local_analyzer is None:
+            catalog = get_catalog()
+            buckets = tuple(catalog.attributes.price_ceiling(MENU_SCHEMA, bucket) for bucket in ('low', 'medium'))
+            _local_analyzer = LocalAnalyzer(vocabulary=catalog.vocabulary(MENU_SCHEMA), price_buckets=buckets)
+        return _local_analyzer
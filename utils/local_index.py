@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'vector_index'))
+
+
+def matches_filter(metadata: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    """The subset of Pinecone's metadata filter language the app uses: $and, $eq, $ne, $in, $nin"""
+    for field, expected in condition.items():
+        if field == '$and':
+            if not all(matches_filter(metadata, part) for part in expected):
+                return False
+            continue
+        value = metadata.get(field)
+        if not isinstance(expected, dict):
+            expected = {'$eq': expected}
+        for op, operand in expected.items():
+            if op == '$eq' and value != operand:
+                return False
+            if op == '$ne' and value == operand:
+                return False
+            if op == '$in' and value not in operand:
+                return False
+            if op == '$nin' and value in operand:
+                return False
+            if op not in ('$eq', '$ne', '$in', '$nin'):
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return True
+
+
+class LocalIndex:
+    """In-process exact cosine index with the same query/upsert/delete surface as a Pinecone Index.
+
+    Embeddings are L2-normalized and kept in one contiguous float32 matrix saved as
+    <name>.<generation>.npy and opened memory-mapped, so every worker on the host
+    shares the same pages. Ids and metadata live in a side table,
+    <name>.<generation>.meta.json, in row order. <name>.current names the live
+    generation; a write adds a new pair of files and then swaps that one pointer,
+    so readers in other workers always load a matching matrix and table.
+    """
+
+    KEEP_GENERATIONS = 2  # the live one and its predecessor, which a reader may still be opening
+
+    def __init__(self, name: str, directory: str = None):
+        self.name = name
+        self.directory = directory or LOCAL_INDEX_DIR
+        self.pointer_path = os.path.join(self.directory, f"{name}.current")
+        self.matrix_path = os.path.join(self.directory, f"{name}.npy")
+        self.meta_path = os.path.join(self.directory, f"{name}.meta.json")
+        self._lock = threading.Lock()
+        self._generation = None
+        self._rejected = None
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._row_of: Dict[str, int] = {}
+        self._load()
+
+    def _paths(self, generation: str):
+        stem = os.path.join(self.directory, f"{self.name}.{generation}")
+        return stem + '.npy', stem + '.meta.json'
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            # Indexes written before generations were introduced: a bare <name>.npy / .meta.json pair
+            return '' if os.path.exists(self.meta_path) and os.path.exists(self.matrix_path) else None
+
+    def _load(self) -> None:
+        generation = self._current_generation()
+        if generation is None or generation in (self._generation, self._rejected):
+            return
+        matrix_path, meta_path = self._paths(generation) if generation else (self.matrix_path, self.meta_path)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            # Superseded between reading the pointer and opening the files; keep what we have
+            print(f"Warning: could not load local index '{self.name}' generation {generation}: {str(e)}")
+            return
+        if matrix.shape[0] != len(table['ids']):
+            print(f"Warning: local index '{self.name}' generation {generation} has "
+                  f"{matrix.shape[0]} rows for {len(table['ids'])} ids; ignoring it")
+            self._rejected = generation
+            return
+        self.matrix = matrix
+        self.ids = table['ids']
+        self.metadata = table['metadata']
+        self._row_of = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.matrix_path, self.meta_path = matrix_path, meta_path
+        self._generation = generation
+
+    def _save(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        generation = str(time.time_ns())
+        matrix_path, meta_path = self._paths(generation)
+        np.save(matrix_path, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'dimension': int(matrix.shape[1]) if matrix.ndim == 2 else 0, 'ids': ids, 'metadata': metadata}, f)
+        # Both files are complete before the pointer names them
+        tmp_pointer = self.pointer_path + '.tmp'
+        with open(tmp_pointer, 'w', encoding='utf-8') as f:
+            f.write(generation)
+        os.replace(tmp_pointer, self.pointer_path)
+        self._load()
+        self._prune(generation)
+
+    def _prune(self, generation: str) -> None:
+        """Remove generations older than the last KEEP_GENERATIONS (mapped pages stay valid after unlink)"""
+        prefix = f"{self.name}."
+        generations = sorted({
+            entry[len(prefix):].split('.', 1)[0] for entry in os.listdir(self.directory)
+            if entry.startswith(prefix) and entry.endswith(('.npy', '.meta.json'))
+            and entry[len(prefix):].split('.', 1)[0].isdigit()
+        }, key=int)
+        for old in generations[:-self.KEEP_GENERATIONS]:
+            if old != generation:
+                for path in self._paths(old):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False,
+              include_values: bool = False, filter: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """Exact cosine top-k over the whole matrix, or over the rows whose metadata passes filter"""
+        with self._lock:
+            self._load()
+            matrix, ids, metadata = self.matrix, self.ids, self.metadata
+        if not ids:
+            return {'matches': []}
+
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        if filter:
+            rows = np.array([row for row, meta in enumerate(metadata) if matches_filter(meta, filter)], dtype=np.int64)
+            if not len(rows):
+                return {'matches': []}
+            scores = np.full(len(ids), -np.inf, dtype=np.float32)
+            scores[rows] = matrix[rows] @ query
+            k = min(top_k, len(rows))
+        else:
+            scores = matrix @ query
+            k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        matches = []
+        for row in top:
+            match = {'id': ids[row], 'score': float(scores[row])}
+            if include_metadata:
+                match['metadata'] = metadata[row]
+            if include_values:
+                match['values'] = matrix[row].tolist()
+            matches.append(match)
+        return {'matches': matches}
+
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs) -> Dict[str, int]:
+        """Insert or replace vectors given as {'id', 'values', 'metadata'} dicts"""
+        if not vectors:
+            return {'upserted_count': 0}
+        with self._lock:
+            self._load()
+            ids = list(self.ids)
+            metadata = list(self.metadata)
+            incoming = self._normalize(np.asarray([v['values'] for v in vectors], dtype=np.float32))
+            matrix = np.array(self.matrix, dtype=np.float32) if ids else np.zeros((0, incoming.shape[1]), dtype=np.float32)
+            row_of = dict(self._row_of)
+
+            appended = []
+            for vector, values in zip(vectors, incoming):
+                vector_id = str(vector['id'])
+                if vector_id in row_of:
+                    matrix[row_of[vector_id]] = values
+                    metadata[row_of[vector_id]] = vector.get('metadata', {})
+                else:
+                    row_of[vector_id] = len(ids)
+                    ids.append(vector_id)
+                    metadata.append(vector.get('metadata', {}))
+                    appended.append(values)
+            if appended:
+                matrix = np.vstack([matrix, np.asarray(appended, dtype=np.float32)])
+            self._save(matrix, ids, metadata)
+        return {'upserted_count': len(vectors)}
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            if delete_all:
+                dimension = self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+                self._save(np.zeros((0, dimension), dtype=np.float32), [], [])
+                return {}
+            doomed = {str(vector_id) for vector_id in (ids or [])}
+            keep = [row for row, vector_id in enumerate(self.ids) if vector_id not in doomed]
+            self._save(np.asarray(self.matrix)[keep], [self.ids[row] for row in keep], [self.metadata[row] for row in keep])
+        return {}
+
+    def fetch(self, ids: List[str], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            rows = [(vector_id, self._row_of[vector_id]) for vector_id in map(str, ids) if vector_id in self._row_of]
+            return {'vectors': {
+                vector_id: {'id': vector_id, 'values': self.matrix[row].tolist(), 'metadata': self.metadata[row]}
+                for vector_id, row in rows
+            }}
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            dimension = self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+            return {'dimension': int(dimension), 'total_vector_count': len(self.ids)}
+
+
+_local_indexes: Dict[str, LocalIndex] = {}
+_local_indexes_lock = threading.Lock()
+
+
+def get_local_index(index_name: str) -> LocalIndex:
+    """One LocalIndex per name per process"""
+    with _local_indexes_lock:
+        if index_name not in _local_indexes:
+            _local_indexes[index_name] = LocalIndex(index_name)
+        return _local_indexes[index_name]
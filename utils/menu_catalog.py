@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_MENU_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'niloufer.json')
+RELOAD_CHECK_INTERVAL = 5  # seconds between mtime checks of the catalog file
+
+
+class CatalogSnapshot:
+    """Immutable serialized catalog with precomputed compressed bodies and a strong ETag"""
+
+    __slots__ = ('items', 'bodies', 'etag', 'mtime_ns')
+
+    def __init__(self, items: Tuple[Dict[str, Any], ...], mtime_ns: int):
+        body = json.dumps(list(items), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        self.items = items
+        self.bodies = bodies
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.mtime_ns = mtime_ns
+
+    def representation(self, accept_encodings) -> Tuple[str, bytes, str]:
+        """(content encoding, body, strong ETag) best matching the request's Accept-Encoding"""
+        if accept_encodings['gzip']:
+            # Each encoding is a different representation, so it gets its own strong ETag
+            return 'gzip', self.bodies['gzip'], f"{self.etag}-gzip"
+        return 'identity', self.bodies['identity'], self.etag
+
+
+class MenuCatalog:
+    """Per-process holder of the current menu snapshot, rebuilt only when the file changes"""
+
+    def __init__(self, path: str = None):
+        self.path = path or DEFAULT_MENU_PATH
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'loads': 0, 'load_errors': 0}
+
+    def _load(self) -> None:
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if self._snapshot is not None and self._snapshot.mtime_ns == mtime_ns:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            items = tuple(json.load(f))
+        self._snapshot = CatalogSnapshot(items, mtime_ns)
+        self.stats['loads'] += 1
+
+    def get(self) -> Optional[CatalogSnapshot]:
+        """Current snapshot; a failed reload keeps serving the previous one"""
+        with self._lock:
+            if self._snapshot is None or time.time() - self._checked_at >= RELOAD_CHECK_INTERVAL:
+                self._checked_at = time.time()
+                try:
+                    self._load()
+                except (OSError, ValueError) as e:
+                    self.stats['load_errors'] += 1
+                    print(f"Error loading menu items: {str(e)}")
+            return self._snapshot
@@ -1,40 +1,123 @@
 import os
+import threading
 from pinecone import Pinecone, ServerlessSpec
+from pinecone.exceptions import NotFoundException
 from dotenv import load_dotenv
+from utils.ingest import ingest, menu_item_text
 
 load_dotenv()
 
-# Initialize Pinecone client once
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 INDEX_NAME = "niloufer-menu"
+POOL_SIZE = int(os.getenv("PINECONE_POOL_SIZE", "10"))
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Pinecone client, created once per worker process"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), connection_pool_maxsize=POOL_SIZE)
+            _client_pid = os.getpid()
+        return _client
+
+class RegisteredIndex:
+    """Cached Index handle that re-resolves through the registry once on a "not found" error"""
+
+    RETRYABLE = ('query', 'upsert', 'delete', 'fetch', 'update', 'describe_index_stats')
+
+    def __init__(self, registry, name, handle):
+        self._registry = registry
+        self.name = name
+        self.handle = handle
+
+    def __getattr__(self, attr):
+        target = getattr(self.handle, attr)
+        if attr not in self.RETRYABLE or not callable(target):
+            return target
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(self.handle, attr)(*args, **kwargs)
+            except NotFoundException:
+                print(f"Index '{self.name}' not found on its cached host, refreshing")
+                self.handle = self._registry.resolve(self.name)
+                return getattr(self.handle, attr)(*args, **kwargs)
+        return call
+
+class IndexRegistry:
+    """Resolves each index once per worker and hands out cached, pooled handles.
+
+    The control plane (list/describe/create) is only contacted on first use,
+    on refresh(), or when a data-plane call reports the index as not found.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def resolve(self, index_name):
+        """Validate or create the index on the control plane and open a fresh handle"""
+        pc = get_client()
+        # Create index if not exists with serverless spec
+        if index_name not in pc.list_indexes().names():
+            pc.create_index(
+                name=index_name,
+                dimension=768,
+                metric="cosine",
+                spec=ServerlessSpec(
+                    cloud='aws',
+                    region='us-east-1'
+                )
+            )
+        host = pc.describe_index(index_name).host
+        return pc.Index(name=index_name, host=host)
+
+    def get(self, index_name):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Handles and their connection pools must not be shared across a fork
+                self._indexes = {}
+                self._pid = os.getpid()
+            if index_name not in self._indexes:
+                self._indexes[index_name] = RegisteredIndex(self, index_name, self.resolve(index_name))
+            return self._indexes[index_name]
+
+    def refresh(self, index_name=None):
+        """Drop cached handles so the next get() goes back to the control plane"""
+        with self._lock:
+            if index_name is None:
+                self._indexes = {}
+            else:
+                self._indexes.pop(index_name, None)
+
+    def warm(self, index_names):
+        for index_name in index_names:
+            try:
+                self.get(index_name)
+            except Exception as e:
+                print(f"Warning: could not warm index '{index_name}': {str(e)}")
+
+index_registry = IndexRegistry()
 
 def get_new_index(index_name=None):
     if index_name is None:
         index_name = INDEX_NAME
-    # Create index if not exists with serverless spec
-    if index_name not in pc.list_indexes().names():
-        pc.create_index(
-            name=index_name,
-            dimension=768,
-            metric="cosine",
-            spec=ServerlessSpec(
-                cloud='aws',
-                region='us-east-1'
-            )
-        )
-    return pc.Index(index_name)
-
-def upsert_data(index, food_data, get_embedding):
-    vectors = []
-    for item in food_data:
-        full_text = f"name: {item['name']}, description: {item['description']}, region: {item['region']}, mood: {item['mood']}, time: {item['time']}, diet: {item['diet']}, category: {item['category']}, spice_level: {item['spice_level']}, health_benefits: {item['health_benefits']}, region: {item['region']}, ingredients: {item['ingredients']}, sides: {item['sides']}, cooking_method: {item['cooking_method']}, dietary_tags: {item['dietary_tags']}, price: {item['price']}, calories: {item['calories']})"
-        embedding = get_embedding(full_text)
-        vectors.append({
-            "id": item["id"],
-            "values": embedding,
-            "metadata": item
-        })
-    index.upsert(vectors=vectors)
+    return index_registry.get(index_name)
+
+def upsert_data(index, food_data, get_embeddings):
+    """Embed menu items in concurrent batches and stream them into the index"""
+    return ingest(
+        index,
+        food_data,
+        embed_batch=get_embeddings,
+        to_text=menu_item_text,
+        to_id=lambda item: item["id"],
+        to_metadata=lambda item: item
+    )
 
 def delete_all_data(index):
     """
@@ -0,0 +1,144 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Rough Gemini tokenizer ratio for English text; counting locally avoids a count_tokens round trip
+CHARS_PER_TOKEN = 4
+
+# Token budget per prompt section; a section over budget is truncated, never the whole prompt or the user's message
+DEFAULT_BUDGETS = {
+    'examples': 200,
+    'context': 150,
+    'history': int(os.getenv("PROMPT_HISTORY_TOKENS", "600")),
+    'state': 200,
+    'query': 300,
+    'candidates': int(os.getenv("PROMPT_CANDIDATE_TOKENS", "800")),
+    'instructions': 600,
+}
+
+# Tokens a section keeps however far over budget the user's message is; instructions carry the
+# [RECOMMENDED_FOODS:...] format line and are never lent out
+MIN_BUDGETS = {
+    'candidates': 200,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def fit_blocks(blocks: Iterable[str], budget: int, keep: str = 'first') -> Tuple[List[str], int]:
+    """Whole blocks that fit in budget tokens and how many were dropped.
+
+    keep='first' keeps blocks from the start (ranked lists), keep='last'
+    from the end (history, where the latest exchanges matter most).
+    """
+    blocks = list(blocks)
+    ordered = blocks if keep == 'first' else list(reversed(blocks))
+    kept, used = [], 0
+    for block in ordered:
+        cost = estimate_tokens(block) + 1  # plus the joining newline
+        if used + cost > budget:
+            break
+        kept.append(block)
+        used += cost
+    if keep != 'first':
+        kept.reverse()
+    return kept, len(blocks) - len(kept)
+
+
+def fit_text(text: str, budget: int) -> str:
+    """text cut at the last whole line within budget tokens (characters if a single line is too long)"""
+    if estimate_tokens(text) <= budget:
+        return text
+    lines, _ = fit_blocks(text.split("\n"), budget)
+    return "\n".join(lines) if lines else text[:budget * CHARS_PER_TOKEN]
+
+
+class PromptBuilder:
+    """Assembles a prompt from named sections, each held to its own token budget.
+
+    Sections are emitted in the order they were added (or at position) and
+    fitted when build() runs. A required section (the user's own message) is
+    never truncated; when it is over budget, the excess is taken from the
+    other sections' budgets in SHRINK_ORDER, down to each one's MIN_BUDGETS
+    floor. After build(), token_counts holds
+    the estimated tokens per section name and in total.
+    """
+
+    SHRINK_ORDER = ('examples', 'history', 'context', 'state', 'candidates')
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.sections: List[Dict[str, Any]] = []
+        self.dropped: Dict[str, int] = {}
+        self.borrowed: Dict[str, int] = {}
+        self.token_counts: Dict[str, int] = {}
+
+    def _add(self, position: Optional[int], **section: Any) -> 'PromptBuilder':
+        self.sections.insert(len(self.sections) if position is None else position, section)
+        return self
+
+    def add_text(self, name: str, text: str, position: Optional[int] = None,
+                 required: bool = False) -> 'PromptBuilder':
+        return self._add(position, name=name, text=text, required=required)
+
+    def add_blocks(self, name: str, blocks: Iterable[str], header: str = '', keep: str = 'first',
+                   empty: str = '', position: Optional[int] = None) -> 'PromptBuilder':
+        """A section of whole blocks (food lines, exchanges) truncated to its budget"""
+        return self._add(position, name=name, blocks=list(blocks), header=header, keep=keep, empty=empty)
+
+    def _fitted_budgets(self) -> Dict[str, int]:
+        """Budgets after lending the other sections' tokens to required sections that need them"""
+        budgets = dict(self.budgets)
+        over = sum(max(estimate_tokens(section['text']) - budgets[section['name']], 0)
+                   for section in self.sections if section.get('required'))
+        present = {section['name'] for section in self.sections if not section.get('required')}
+        self.borrowed = {}
+        for name in self.SHRINK_ORDER:
+            if over <= 0:
+                break
+            if name not in present:
+                continue
+            taken = min(max(budgets[name] - MIN_BUDGETS.get(name, 0), 0), over)
+            if not taken:
+                continue
+            budgets[name] -= taken
+            over -= taken
+            self.borrowed[name] = taken
+        if self.borrowed:
+            print(f"Prompt: user message over its budget; took {self.borrowed} tokens from other sections")
+        return budgets
+
+    def _fit(self, section: Dict[str, Any], budgets: Dict[str, int]) -> str:
+        name = section['name']
+        if section.get('required'):
+            return section['text']
+        if 'text' in section:
+            return fit_text(section['text'], budgets[name])
+        header = section['header']
+        kept, dropped = fit_blocks(section['blocks'], max(budgets[name] - estimate_tokens(header), 0),
+                                   section['keep'])
+        if dropped:
+            self.dropped[name] = self.dropped.get(name, 0) + dropped
+        body = "\n".join(kept) or section['empty']
+        return f"{header}\n{body}" if header else body
+
+    def build(self, separator: str = "\n\n") -> str:
+        budgets = self._fitted_budgets()
+        self.dropped = {}
+        self.token_counts = {}
+        parts = []
+        for section in self.sections:
+            text = self._fit(section, budgets)
+            self.token_counts[section['name']] = self.token_counts.get(section['name'], 0) + estimate_tokens(text)
+            if text:
+                parts.append(text)
+        prompt = separator.join(parts)
+        self.token_counts['total'] = estimate_tokens(prompt)
+        return prompt
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {'tokens': dict(self.token_counts), 'dropped': dict(self.dropped)}
+        if self.borrowed:
+            stats['borrowed'] = dict(self.borrowed)
+        return stats
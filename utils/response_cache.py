@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.embedding_cache import normalize_text
+
+
+class SemanticResponseCache:
+    """LRU + TTL cache of stateless responses, looked up by exact prompt then by embedding similarity.
+
+    Entries are tagged with the catalog version they were computed against; a
+    lookup with a different version clears the cache, since cached food ids may
+    no longer exist.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._catalog_version = None
+        self._lock = threading.Lock()
+        self.stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _check_version(self, catalog_version: Any) -> None:
+        if catalog_version != self._catalog_version:
+            if self._entries:
+                self.stats['invalidations'] += 1
+            self._entries.clear()
+            self._catalog_version = catalog_version
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry['created'] < cutoff]:
+            del self._entries[key]
+
+    def get(self, prompt: str, catalog_version: Any) -> Optional[Dict[str, Any]]:
+        """Exact lookup on the normalized prompt"""
+        key = normalize_text(prompt)
+        with self._lock:
+            self._check_version(catalog_version)
+            entry = self._entries.get(key)
+            if entry is None or entry['created'] < time.time() - self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            self.stats['exact_hits'] += 1
+            return entry['payload']
+
+    def get_similar(self, embedding: List[float], catalog_version: Any) -> Optional[Dict[str, Any]]:
+        """Nearest cached prompt by cosine similarity, if it clears the threshold"""
+        with self._lock:
+            self._check_version(catalog_version)
+            self._expire()
+            if not self._entries:
+                self.stats['misses'] += 1
+                return None
+            keys = list(self._entries)
+            matrix = np.stack([self._entries[key]['embedding'] for key in keys])
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= (np.linalg.norm(query) or 1.0)
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(keys[best])
+            self.stats['semantic_hits'] += 1
+            return self._entries[keys[best]]['payload']
+
+    def put(self, prompt: str, embedding: List[float], payload: Dict[str, Any], catalog_version: Any) -> None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            self._check_version(catalog_version)
+            key = normalize_text(prompt)
+            self._entries[key] = {'payload': payload, 'embedding': vector, 'created': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['exact_hits'] + stats['semantic_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['exact_hits'] + stats['semantic_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+def catalog_version(index_name: str) -> Optional[tuple]:
+    """Changes whenever the index is written: its version stamp, sync manifest or local index table"""
+    from utils.ingest import CATALOG_VERSION_DIR, catalog_version_path
+    from utils.local_index import LOCAL_INDEX_DIR
+    paths = (catalog_version_path(index_name),
+             os.path.join(CATALOG_VERSION_DIR, f"{index_name}.json"),
+             os.path.join(LOCAL_INDEX_DIR, f"{index_name}.current"))
+    version = []
+    for path in paths:
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            version.append(None)
+    return tuple(version) if any(version) else None
@@ -0,0 +1,74 @@
+import json
+import re
+
+TRAILER_TAG = '[RECOMMENDED_FOODS'
+
+# Inline markup the final response never shows
+HIDDEN_PATTERNS = [
+    re.compile(r'<[^>]+>'),
+    re.compile(r'\[ID:\d+\]'),
+    re.compile(r'\[FOOD RECOMMENDATION\]'),
+    re.compile(r'\(ID:\s*\d+\)'),
+]
+
+# Unfinished markup that may still become hidden text or the trailer, matched against the tail of the stream
+PARTIAL_PATTERNS = [
+    re.compile(r'<(/?\w[^<>]*)?'),
+    re.compile(r'\[(I(D(:\d*)?)?)?'),
+    re.compile(r'\((I(D(:\s*\d*)?)?)?'),
+]
+PARTIAL_LITERALS = (TRAILER_TAG, '[FOOD RECOMMENDATION]')
+# Longest unfinished markup held back; an opener further back is plain text
+MAX_HELD_CHARS = 64
+
+
+class ResponseStreamFilter:
+    """Turns raw generation chunks into display-safe text deltas.
+
+    Anything from the [RECOMMENDED_FOODS:...] trailer onwards is withheld, as is
+    a tail that could still grow into hidden markup, so a delta never contains
+    half of a hidden tag. Text is cleaned once, when it is emitted, so later
+    chunks never change what was already sent.
+    """
+
+    def __init__(self):
+        self.raw = ''
+        self.consumed = 0  # raw characters already emitted or dropped
+        self.done = False
+
+    @staticmethod
+    def _held_from(text: str) -> int:
+        """Index where a possibly unfinished hidden tag starts, or len(text)"""
+        for start in range(max(len(text) - MAX_HELD_CHARS, 0), len(text)):
+            if text[start] not in '[(<':
+                continue
+            tail = text[start:]
+            if (any(pattern.fullmatch(tail) for pattern in PARTIAL_PATTERNS)
+                    or any(literal.startswith(tail) for literal in PARTIAL_LITERALS)):
+                return start
+        return len(text)
+
+    def feed(self, chunk: str) -> str:
+        """Add a raw chunk and return the newly displayable text"""
+        self.raw += chunk or ''
+        if self.done:
+            return ''
+        text = self.raw
+        trailer_at = text.find(TRAILER_TAG, self.consumed)
+        if trailer_at != -1:
+            text = text[:trailer_at]
+            self.done = True
+        else:
+            text = text[:self._held_from(text)]
+        if len(text) <= self.consumed:
+            return ''
+        delta = text[self.consumed:]
+        self.consumed = len(text)
+        for pattern in HIDDEN_PATTERNS:
+            delta = pattern.sub('', delta)
+        return delta
+
+
+def ndjson_event(event_type: str, **payload) -> str:
+    """Serialize one streaming event as a newline-delimited JSON line"""
+    return json.dumps({'type': event_type, **payload}) + '\n'
@@ -0,0 +1,273 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'conversation_state.sqlite3')
+
+
+class MemoryStateStore:
+    """Process-local backend; state is lost on restart and not shared between workers"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            return self._data.get(key)
+
+    def version(self, key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry else None
+
+    def save(self, key: str, state: Dict[str, Any], expected_version: Optional[int]) -> Optional[int]:
+        with self._lock:
+            entry = self._data.get(key)
+            if (entry[0] if entry else None) != expected_version:
+                return None
+            version = (expected_version or 0) + 1
+            self._data[key] = (version, json.loads(json.dumps(state, default=str)))
+            return version
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteStateStore:
+    """Host-local backend shared by every worker through a WAL-mode SQLite file"""
+
+    def __init__(self, path: str = None):
+        self.path = path or DEFAULT_STATE_PATH
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_state ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, state TEXT NOT NULL, updated_at REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, key: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        row = self._connection().execute(
+            "SELECT version, state FROM conversation_state WHERE key = ?", (key,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def version(self, key: str) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT version FROM conversation_state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, key: str, state: Dict[str, Any], expected_version: Optional[int]) -> Optional[int]:
+        conn = self._connection()
+        with conn:
+            if expected_version is None:
+                cursor = conn.execute(
+                    "INSERT INTO conversation_state (key, version, state, updated_at) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(key) DO NOTHING",
+                    (key, json.dumps(state, default=str), time.time())
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE conversation_state SET version = version + 1, state = ?, updated_at = ? "
+                    "WHERE key = ? AND version = ?",
+                    (json.dumps(state, default=str), time.time(), key, expected_version)
+                )
+        return (expected_version or 0) + 1 if cursor.rowcount == 1 else None
+
+    def delete(self, key: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM conversation_state WHERE key = ?", (key,))
+
+
+# Compare-and-set: bump the version and store the state only if the version is still ARGV[1] ('' = absent)
+_REDIS_SAVE = """
+local current = redis.call('HGET', KEYS[1], 'version')
+if (current or '') ~= ARGV[1] then
+    return false
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('HSET', KEYS[1], 'state', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return version
+"""
+
+
+class RedisStateStore:
+    """Backend shared across hosts; needs the optional `redis` package"""
+
+    def __init__(self, url: str, prefix: str = 'nutrimood:conversation:', ttl: int = 86400):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CONVERSATION_STORE=redis requires the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._save = self.client.register_script(_REDIS_SAVE)
+
+    def load(self, key: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        version, state = self.client.hmget(self.prefix + key, 'version', 'state')
+        return (int(version), json.loads(state)) if state is not None else None
+
+    def version(self, key: str) -> Optional[int]:
+        version = self.client.hget(self.prefix + key, 'version')
+        return int(version) if version is not None else None
+
+    def save(self, key: str, state: Dict[str, Any], expected_version: Optional[int]) -> Optional[int]:
+        version = self._save(
+            keys=[self.prefix + key],
+            args=['' if expected_version is None else expected_version, json.dumps(state, default=str), self.ttl]
+        )
+        return int(version) if version is not None else None
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+
+def make_state_store(kind: str = None, url: str = None):
+    """Build the backend named by CONVERSATION_STORE (sqlite, redis or memory)"""
+    kind = (kind or os.getenv("CONVERSATION_STORE", "sqlite")).lower()
+    url = url or os.getenv("CONVERSATION_STORE_URL")
+    if kind == 'redis':
+        return RedisStateStore(url or 'redis://localhost:6379/0')
+    if kind == 'memory':
+        return MemoryStateStore()
+    if kind == 'sqlite':
+        return SQLiteStateStore(url)
+    raise ValueError(f"Unknown conversation store: {kind}")
+
+
+_DISCARDED = object()
+
+
+class ConversationStore:
+    """Per-worker hot LRU of live conversation objects in front of a shared state backend.
+
+    A hot entry is reused only while its version matches the backend, so a turn
+    served by another worker or host is picked up on the next access. Entries
+    idle for longer than idle_ttl, or beyond max_hot, are dropped from memory
+    but stay in the backend. Updates are compare-and-set against the version a
+    conversation object was loaded at, so concurrent turns never overwrite each
+    other and a discarded conversation is never written back.
+    """
+
+    def __init__(self, backend, factory: Callable[[], Any], loader: Callable[[Dict[str, Any]], Any],
+                 max_hot: int = 256, idle_ttl: float = 1800):
+        self.backend = backend
+        self.factory = factory
+        self.loader = loader
+        self.max_hot = max_hot
+        self.idle_ttl = idle_ttl
+        self._hot: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Stored version each live conversation object reflects; _DISCARDED once discard() dropped it
+        self._versions: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+        self.stats = {'hot_hits': 0, 'loads': 0, 'creates': 0, 'evictions': 0, 'conflicts': 0, 'dropped': 0}
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.idle_ttl
+        for key in [key for key, entry in self._hot.items() if entry['last_access'] < cutoff]:
+            del self._hot[key]
+            self.stats['evictions'] += 1
+        while len(self._hot) > self.max_hot:
+            self._hot.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get(self, key: str) -> Any:
+        """Return the live conversation object for key, loading or creating it as needed"""
+        backend_version = self.backend.version(key)
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None and entry['version'] == backend_version:
+                entry['last_access'] = time.time()
+                self._hot.move_to_end(key)
+                self.stats['hot_hits'] += 1
+                return entry['manager']
+
+        loaded = self.backend.load(key)
+        if loaded is not None:
+            version, state = loaded
+            manager = self.loader(state)
+            stat = 'loads'
+        else:
+            version, manager = None, self.factory()
+            stat = 'creates'
+
+        with self._lock:
+            self.stats[stat] += 1
+            self._install(key, manager, version)
+        return manager
+
+    def _install(self, key: str, manager: Any, version: Optional[int]) -> None:
+        self._hot[key] = {'manager': manager, 'version': version, 'last_access': time.time()}
+        self._hot.move_to_end(key)
+        self._versions[manager] = version
+        self._evict()
+
+    def update(self, key: str, manager: Any, change: Callable[[Any], None], max_attempts: int = 5) -> bool:
+        """Apply change to manager and persist the result with compare-and-set.
+
+        When another worker saved first, the stored state is reloaded and change
+        re-applied on top of it. Returns False if the conversation was discarded
+        since manager was loaded, or every attempt lost the race.
+        """
+        with self._lock:
+            expected = self._versions.get(manager, _DISCARDED)
+            if expected is _DISCARDED:
+                self.stats['dropped'] += 1
+                return False
+
+        for _ in range(max_attempts):
+            change(manager)
+            version = self.backend.save(key, manager.to_dict(), expected)
+            if version is not None:
+                with self._lock:
+                    if self._versions.get(manager) is not _DISCARDED:
+                        self._install(key, manager, version)
+                return True
+
+            with self._lock:
+                self.stats['conflicts'] += 1
+            loaded = self.backend.load(key)
+            if loaded is None and expected is not None:
+                # Deleted since it was loaded: the conversation was discarded on another worker
+                break
+            if loaded is None:
+                expected, manager = None, self.factory()
+            else:
+                expected, state = loaded
+                manager = self.loader(state)
+
+        with self._lock:
+            self.stats['dropped'] += 1
+        print(f"Warning: conversation update for {key} dropped after a concurrent save or discard")
+        return False
+
+    def discard(self, key: str) -> None:
+        self.backend.delete(key)
+        with self._lock:
+            entry = self._hot.pop(key, None)
+            if entry is not None:
+                self._versions[entry['manager']] = _DISCARDED
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, hot=len(self._hot))
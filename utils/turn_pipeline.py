@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from utils.catalog import food_names
+
+DEFAULT_INTENT = {
+    'is_followup': False,
+    'followup_type': None,
+    'intent': 'general_query',
+    'context_references': [],
+    'referenced_items': []
+}
+
+# Follow-up types that refer back to the last recommended items
+ITEM_FOLLOWUP_TYPES = ['clarification', 'modification', 'comparison']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers: int = 8) -> ThreadPoolExecutor:
+    """Shared pool for turn stages, created lazily so it is never inherited across a fork"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='turn-stage')
+    return _executor
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class TurnPipeline:
+    """Dependency graph of turn stages; each stage starts as soon as its dependencies finish.
+
+    A stage function is called with the results of its dependencies as keyword
+    arguments named after those stages.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add_stage(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> 'TurnPipeline':
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            # Dependencies must be declared first, which also keeps the graph acyclic
+            raise ValueError(f"Stage '{name}' depends on undeclared stages: {missing}")
+        self.stages[name] = Stage(name, fn, deps)
+        return self
+
+    def _timed(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return stage.fn(**kwargs)
+        finally:
+            self.timings[stage.name] = time.perf_counter() - start
+
+    def run(self, executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, Any]:
+        """Run every stage and return a dict of stage name -> result"""
+        executor = executor or get_executor()
+        results: Dict[str, Any] = {}
+        pending = dict(self.stages)
+        running = {}
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    kwargs = {dep: results[dep] for dep in stage.deps}
+                    running[executor.submit(self._timed, stage, kwargs)] = name
+                    del pending[name]
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+
+        return results
+
+
+def build_followup_query(conversation_manager, user_input: str, intent_analysis: Dict[str, Any]) -> str:
+    """Combine the user input with conversation state terms for a follow-up search"""
+    state = conversation_manager.conversation_state
+    context_terms: List[str] = []
+
+    # Add last recommendations to context if this is a follow-up about specific items
+    if intent_analysis.get('followup_type') in ITEM_FOLLOWUP_TYPES:
+        context_terms.extend([name for name in food_names(state.get('last_recommendations', [])) if name])
+
+    for key in ['last_meal_type', 'last_dietary', 'last_price_range', 'last_cuisine']:
+        if state.get(key):
+            context_terms.append(str(state[key]))
+
+    # Add referenced items from intent analysis
+    if intent_analysis.get('referenced_items'):
+        context_terms.extend(str(item) for item in intent_analysis['referenced_items'])
+
+    return f"{user_input} {' '.join(context_terms)}".strip()
+
+
+def build_chat_pipeline(conversation_manager, user_input: str, *, embed: Callable[[str], List[float]],
+                        get_index: Callable[[], Any], get_context: Optional[Callable[[], Dict[str, Any]]] = None,
+                        top_k: int = 20,
+                        fuse: Optional[Callable[..., List[Dict[str, Any]]]] = None,
+                        get_candidates: Optional[Callable[[], Optional[Set[str]]]] = None,
+                        id_key: str = 'id') -> TurnPipeline:
+    """Build the /chat turn graph.
+
+    Intent analysis, the raw-query embedding with a speculative vector query, and
+    the weather/holiday context all run concurrently. The follow-up query is only
+    re-embedded and re-queried when it differs from the raw input. When fuse is
+    given, each vector result list is merged with lexical matches for its query.
+    When get_candidates returns a set of ids, both searches are restricted to it
+    through an $in metadata filter on id_key.
+    """
+    def analyze_intent():
+        try:
+            return conversation_manager.analyze_user_intent(user_input)
+        except Exception as e:
+            print(f"Error analyzing intent: {str(e)}")
+            return dict(DEFAULT_INTENT)
+
+    def fetch_context():
+        return get_context() if get_context else None
+
+    def fetch_candidates():
+        try:
+            return get_candidates() if get_candidates else None
+        except Exception as e:
+            print(f"Error filtering candidates: {str(e)}")
+            return None
+
+    def query(index, vector, text, candidates):
+        kwargs = {}
+        if candidates is not None:
+            kwargs['filter'] = {id_key: {'$in': sorted(candidates)}}
+        try:
+            results = index.query(vector=vector, top_k=top_k, include_metadata=True, **kwargs)
+            foods = [match['metadata'] for match in results['matches']]
+        except Exception as e:
+            print(f"Error querying Pinecone: {str(e)}")
+            foods = []
+        if candidates is not None:
+            foods = [food for food in foods if str(food.get(id_key)) in candidates]
+        if not fuse:
+            return foods
+        return fuse(text, foods, allowed_ids=candidates) if candidates is not None else fuse(text, foods)
+
+    def retrieve(intent, index, candidates, speculative_foods):
+        if not intent.get('is_followup'):
+            return speculative_foods
+        try:
+            enhanced_query = build_followup_query(conversation_manager, user_input, intent)
+        except Exception as e:
+            print(f"Error updating preferences: {str(e)}")
+            return speculative_foods
+        if enhanced_query == user_input.strip():
+            return speculative_foods
+        return query(index, embed(enhanced_query), enhanced_query, candidates)
+
+    pipeline = TurnPipeline()
+    pipeline.add_stage('intent', analyze_intent)
+    pipeline.add_stage('context', fetch_context)
+    pipeline.add_stage('index', get_index)
+    pipeline.add_stage('candidates', fetch_candidates)
+    pipeline.add_stage('raw_embedding', lambda: embed(user_input))
+    pipeline.add_stage('speculative_foods',
+                       lambda index, candidates, raw_embedding: query(index, raw_embedding, user_input, candidates),
+                       deps=['index', 'candidates', 'raw_embedding'])
+    pipeline.add_stage('retrieved_foods', retrieve, deps=['intent', 'index', 'candidates', 'speculative_foods'])
+    return pipeline
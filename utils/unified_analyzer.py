@@ -0,0 +1,116 @@
+from typing import Any, Dict
+
+# Analyzer modes for ConversationManager
+LEGACY_MODE = 'legacy'
+UNIFIED_MODE = 'unified'
+ANALYZER_MODES = (LEGACY_MODE, UNIFIED_MODE)
+
+FOLLOWUP_TYPES = ("clarification", "modification", "comparison", "continuation", "preference", "reference", "pronoun")
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+PRICE_RANGES = ("low", "medium", "high")
+TIMES_OF_DAY = ("morning", "afternoon", "evening", "night")
+MOODS = ("casual", "formal", "quick", "relaxed")
+OCCASIONS = ("regular", "special", "celebration")
+
+# Merged schema: section -> field -> type, where a tuple lists the allowed values
+UNIFIED_SCHEMA: Dict[str, Dict[str, Any]] = {
+    'intent': {
+        'is_followup': bool,
+        'followup_type': FOLLOWUP_TYPES,
+        'context_references': list,
+        'intent': str,
+        'referenced_items': list,
+        'sentiment': ("positive", "negative", "neutral"),
+        'urgency': ("high", "medium", "low"),
+        'confidence': float,
+    },
+    'preferences': {
+        'dietary_restrictions': list,
+        'price_range': PRICE_RANGES,
+        'meal_type': MEAL_TYPES,
+        'cuisine_preferences': list,
+        'spice_level': ("mild", "medium", "spicy"),
+        'time_preference': TIMES_OF_DAY,
+        'occasion': OCCASIONS,
+        'mood': MOODS,
+    },
+    'context': {
+        'meal_type': MEAL_TYPES,
+        'dietary': ("vegetarian", "vegan", "non-vegetarian"),
+        'price_range': PRICE_RANGES,
+        'cuisine': list,
+        'time_of_day': TIMES_OF_DAY,
+        'mood': MOODS,
+        'occasion': OCCASIONS,
+    },
+}
+
+INTENT_DEFAULTS = {
+    'is_followup': False,
+    'followup_type': None,
+    'context_references': [],
+    'intent': 'unknown',
+    'referenced_items': [],
+    'sentiment': 'neutral',
+    'urgency': 'medium',
+    'confidence': 0.0,
+}
+
+
+def describe_schema() -> str:
+    """Render the merged schema as prompt instructions"""
+    lines = []
+    for section, fields in UNIFIED_SCHEMA.items():
+        lines.append(f'- "{section}": object with')
+        for name, kind in fields.items():
+            if isinstance(kind, tuple):
+                choices = ', '.join(f'"{choice}"' for choice in kind)
+                lines.append(f"    - {name}: one of [{choices}] or null")
+            elif kind is list:
+                lines.append(f"    - {name}: list of strings")
+            elif kind is bool:
+                lines.append(f"    - {name}: boolean")
+            elif kind is float:
+                lines.append(f"    - {name}: number between 0 and 1")
+            else:
+                lines.append(f"    - {name}: short string")
+    return "\n".join(lines)
+
+
+def _coerce(value: Any, kind: Any) -> Any:
+    if isinstance(kind, tuple):
+        if isinstance(value, str) and value.strip().lower() in kind:
+            return value.strip().lower()
+        return None
+    if kind is list:
+        if value is None:
+            return []
+        if isinstance(value, (list, tuple)):
+            return [str(item) for item in value if item not in (None, '')]
+        return [str(value)]
+    if kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() == 'true'
+        return bool(value)
+    if kind is float:
+        try:
+            return min(max(float(value), 0.0), 1.0)
+        except (TypeError, ValueError):
+            return 0.0
+    return str(value) if value is not None else None
+
+
+def validate_unified_analysis(raw: Any) -> Dict[str, Dict[str, Any]]:
+    """Validate a model response against UNIFIED_SCHEMA, dropping unknown fields and bad values"""
+    if not isinstance(raw, dict):
+        raise ValueError("Unified analysis must be a JSON object")
+    analysis = {}
+    for section, fields in UNIFIED_SCHEMA.items():
+        data = raw.get(section)
+        if not isinstance(data, dict):
+            data = {}
+        analysis[section] = {name: _coerce(data.get(name), kind) for name, kind in fields.items()}
+    for name, default in INTENT_DEFAULTS.items():
+        if analysis['intent'][name] is None:
+            analysis['intent'][name] = default
+    return analysis
@@ -0,0 +1,34 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "pinecone" (default) or "local" for the in-process NumPy index
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+DEFAULT_INDEX_NAME = "niloufer-menu"
+PROD_INDEX_NAME = "niloufer-prod-data"
+APP_INDEX_NAMES = [DEFAULT_INDEX_NAME, PROD_INDEX_NAME]
+
+
+def get_vector_index(index_name=None):
+    """Return an index for the configured backend; both expose query/upsert/delete"""
+    if index_name is None:
+        index_name = DEFAULT_INDEX_NAME
+    if VECTOR_BACKEND == "local":
+        from utils.local_index import get_local_index
+        return get_local_index(index_name)
+    # Imported lazily so the local backend runs without Pinecone credentials
+    from utils.pinecone_helper import get_new_index
+    return get_new_index(index_name=index_name)
+
+
+def warm_vector_indexes(index_names=None):
+    """Resolve the app's indexes up front so the first request skips the control plane"""
+    index_names = index_names or APP_INDEX_NAMES
+    if VECTOR_BACKEND == "local":
+        from utils.local_index import get_local_index
+        for index_name in index_names:
+            get_local_index(index_name)
+        return
+    from utils.pinecone_helper import index_registry
+    index_registry.warm(index_names)
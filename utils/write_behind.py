@@ -0,0 +1,132 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class WriteBehindQueue:
+    """Bounded in-process queue whose single writer thread hands records to write_batch in batches.
+
+    A batch is written once batch_size records are waiting or flush_interval
+    seconds after its first record arrived. When the queue is full, or after
+    shutdown, submit() writes the record synchronously instead of dropping it.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Any]], None], max_size: int = 1000,
+                 batch_size: int = 50, flush_interval: float = 0.5, put_timeout: float = 0.05):
+        self.write_batch = write_batch
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_flight = 0
+        self.stats = {'submitted': 0, 'written': 0, 'batches': 0, 'failed': 0,
+                      'inline': 0, 'max_depth': 0, 'last_batch_seconds': 0.0}
+
+    def _get_queue(self) -> queue.Queue:
+        # Thread and queue are created per process so a preloaded app never forks with them
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='write-behind', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def _write(self, records: List[Any]) -> None:
+        start = time.time()
+        try:
+            self.write_batch(records)
+            outcome = 'written'
+        except Exception as e:
+            if len(records) > 1:
+                # Retry one at a time so a single bad record does not take the batch with it
+                for record in records:
+                    self._write([record])
+                return
+            outcome = 'failed'
+            print(f"Error writing queued record: {str(e)}")
+        with self._lock:
+            self.stats[outcome] += len(records)
+            self.stats['batches'] += 1
+            self.stats['last_batch_seconds'] = round(time.time() - start, 4)
+
+    def _run(self, pending: queue.Queue) -> None:
+        while True:
+            record = pending.get()
+            if record is None:
+                pending.task_done()
+                return
+            batch = [record]
+            deadline = time.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = pending.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            with self._lock:
+                self._in_flight = len(batch)
+            self._write(batch)
+            with self._lock:
+                self._in_flight = 0
+            for _ in range(len(batch) + (1 if stop else 0)):
+                pending.task_done()
+            if stop:
+                return
+
+    def submit(self, record: Any) -> bool:
+        """Queue record for the writer thread; False when it had to be written inline"""
+        with self._lock:
+            self.stats['submitted'] += 1
+            closed = self._closed
+        if not closed:
+            pending = self._get_queue()
+            try:
+                pending.put(record, timeout=self.put_timeout)
+                with self._lock:
+                    self.stats['max_depth'] = max(self.stats['max_depth'], pending.qsize())
+                return True
+            except queue.Full:
+                pass
+        # Full or shutting down: apply back-pressure by writing on the caller's thread
+        with self._lock:
+            self.stats['inline'] += 1
+        self._write([record])
+        return False
+
+    def depth(self) -> int:
+        """Records queued or being written"""
+        with self._lock:
+            pending = self._queue if self._pid == os.getpid() else None
+            in_flight = self._in_flight
+        return (pending.qsize() if pending is not None else 0) + in_flight
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting background writes and flush what is queued"""
+        with self._lock:
+            self._closed = True
+            pending = self._queue if self._pid == os.getpid() else None
+            thread = self._thread
+        if pending is None:
+            return True
+        pending.put(None)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['depth'] = self.depth()
+        return stats